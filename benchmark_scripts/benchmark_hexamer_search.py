@@ -0,0 +1,56 @@
+"""
+Time PAS hexamer search of single windows, i.e. scan.scan_plus and
+scan.scan_minus, with str.rfind and with the scanner, for tables of an
+increasing number of motifs.
+
+usage, with kleat installed:
+
+    python benchmark_scripts/benchmark_hexamer_search.py [num_windows]
+"""
+
+import random
+import sys
+import timeit
+from itertools import product
+
+from kleat.hexamer import scan as SC
+from kleat.misc import settings as S
+
+
+def gen_windows(num_windows, window=50, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice('ACGT') for _ in range(window)) for _ in range(num_windows)]
+
+
+def gen_hexamers(num_hexamers):
+    """the default candidates, then other A/T-rich hexamers"""
+    hexamers = [_[0] for _ in S.CANDIDATE_HEXAMERS]
+    for bases in product('ATCG', repeat=6):
+        hmr = ''.join(bases)
+        if hmr not in hexamers:
+            hexamers.append(hmr)
+    return [(hmr, num_hexamers - k) for k, hmr in enumerate(hexamers[:num_hexamers])]
+
+
+def time_it(func, windows, table):
+    secs = min(timeit.repeat(
+        lambda: [func(_, 100, table) for _ in windows], number=1, repeat=5))
+    return secs / len(windows) * 1e6
+
+
+def main():
+    num_windows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    windows = gen_windows(num_windows)
+    print('num_hexamers\tstrand\tfind_us\tscan_us')
+    for num_hexamers in [16, 24, 32, 48, 64]:
+        hexamers = gen_hexamers(num_hexamers)
+        find_table = SC.compile_hexamer_table(hexamers, max_find_hexamers=len(hexamers))
+        scan_table = SC.compile_hexamer_table(hexamers, max_find_hexamers=0)
+        for strand, func in [('+', SC.scan_plus), ('-', SC.scan_minus)]:
+            print('{0}\t{1}\t{2:.2f}\t{3:.2f}'.format(
+                num_hexamers, strand,
+                time_it(func, windows, find_table), time_it(func, windows, scan_table)))
+
+
+if __name__ == '__main__':
+    main()
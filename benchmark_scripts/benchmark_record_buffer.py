@@ -0,0 +1,92 @@
+"""
+Time writing clv records to the tsv of a work unit, i.e. appending them to a
+record_buffer.ClvRecordBuffer, against building a ClvRecord per record and
+writing it with csv.writer, with a list of fields built with getattr as
+before or as is.
+
+usage, with kleat installed:
+
+    python benchmark_scripts/benchmark_record_buffer.py [num_records]
+"""
+
+import csv
+import sys
+import tempfile
+import timeit
+
+from kleat.misc import settings as S
+from kleat.misc.record_buffer import ClvRecordBuffer
+
+
+def gen_record(clv):
+    return S.ClvRecord(
+        'chr1', '+', clv,
+        'AATAAA', 16, clv - 20,
+        'AATAAA', 16, clv - 20,
+        evidence_type='link',
+        contig_id_at_pos='c{0}@3'.format(clv),
+        contig_len=300,
+        contig_mapq=60,
+        contig_is_hardclipped=False,
+        num_suffix_reads=0,
+        max_suffix_read_tail_len=0,
+        suffix_contig_tail_len=0,
+        num_suffix_contigs=0,
+        num_bridge_reads=0,
+        max_bridge_read_tail_len=0,
+        num_bridge_contigs=0,
+        num_link_reads=clv % 7,
+        num_link_contigs=1,
+        num_blank_contigs=0,
+        reads_subsampled=False,
+    )
+
+
+def write_with_getattr(num_records, opf):
+    csvwriter = csv.writer(opf, delimiter='\t')
+    for clv in range(num_records):
+        rec = gen_record(clv)
+        csvwriter.writerow([getattr(rec, _) for _ in S.HEADER])
+
+
+def write_with_writerow(num_records, opf):
+    csvwriter = csv.writer(opf, delimiter='\t')
+    for clv in range(num_records):
+        csvwriter.writerow(gen_record(clv))
+
+
+def write_with_record_buffer(num_records, opf):
+    buf = ClvRecordBuffer(opf)
+    for clv in range(num_records):
+        buf.append(
+            'chr1', '+', clv,
+            ('AATAAA', 16, clv - 20),
+            ('AATAAA', 16, clv - 20),
+            evidence_type='link',
+            contig_id_at_pos='c{0}@3'.format(clv),
+            contig_is_hardclipped=False,
+            contig_len=300,
+            contig_mapq=60,
+            num_link_reads=clv % 7,
+            num_link_contigs=1,
+        )
+        buf.maybe_flush()
+    buf.flush()
+
+
+def time_it(func, num_records, repeat=5):
+    def run():
+        with tempfile.TemporaryFile('wt') as opf:
+            func(num_records, opf)
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for func in [write_with_getattr, write_with_writerow, write_with_record_buffer]:
+        print('{0}: {1:.3f}s for {2} records'.format(
+            func.__name__, time_it(func, num_records), num_records))
+
+
+if __name__ == '__main__':
+    main()
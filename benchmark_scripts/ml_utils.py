@@ -4,44 +4,51 @@ import numpy as np
 import pandas as pd
 
 from kleat.post import cluster_clv_parallel
-from kleat.misc.settings import CANDIDATE_HEXAMERS_WITH_NA
+from kleat.hexamer.table import compile_hexamer_file, gen_hexamer_dummy_cols
 
 
-CTG_HEX_DUMMY_COLS = ['ctg_{0}'.format(_[0]) for _ in CANDIDATE_HEXAMERS_WITH_NA]
-REF_HEX_DUMMY_COLS = ['ref_{0}'.format(_[0]) for _ in CANDIDATE_HEXAMERS_WITH_NA]
+# features besides the PAS hexamer dummy columns, see gen_karbor_feature_cols
+KARBOR_BASE_FEATURE_COLS = [
+    'signed_dist_to_aclv',
+    # 'abs_dist_to_aclv',
 
-KARBOR_FEATURE_COLS = (
-    [
-        'signed_dist_to_aclv',
-        # 'abs_dist_to_aclv',
+    'any_contig_is_hardclipped',
 
-        'any_contig_is_hardclipped',
+    'contig_max_len',
+    'contig_max_mapq',
 
-        'contig_max_len',
-        'contig_max_mapq',
+    'num_contigs_suffix',
+    'num_contigs_bridge',
+    'num_contigs_link',
+    'num_contigs_blank',
 
-        'num_contigs_suffix',
-        'num_contigs_bridge',
-        'num_contigs_link',
-        'num_contigs_blank',
+    'num_total_contigs',
 
-        'num_total_contigs',
+    'num_reads_suffix',
+    'num_reads_bridge',
+    'num_reads_link',
 
-        'num_reads_suffix',
-        'num_reads_bridge',
-        'num_reads_link',
+    'max_read_tail_len_suffix',
+    'max_read_tail_len_bridge',
 
-        'max_read_tail_len_suffix',
-        'max_read_tail_len_bridge',
+    'max_contig_tail_len_suffix',
 
-        'max_contig_tail_len_suffix',
+    'ctg_hex_dist',
+    # 'ref_hex_dist',
+]
 
-        'ctg_hex_dist',
-        # 'ref_hex_dist',
-    ]
-    + CTG_HEX_DUMMY_COLS        # PAS hexamer shown on contig
-    # + REF_HEX_DUMMY_COLS        # PAS hexamer shown on reference genome
-)
+
+def gen_karbor_feature_cols(hexamer_table_file=None):
+    """
+    :param hexamer_table_file: the file passed to kleat --hexamer-table, None
+    for the default table
+    """
+    table = compile_hexamer_file(hexamer_table_file)
+    return (
+        KARBOR_BASE_FEATURE_COLS
+        + gen_hexamer_dummy_cols('ctg', table)      # PAS hexamer shown on contig
+        # + gen_hexamer_dummy_cols('ref', table)    # PAS hexamer shown on reference genome
+    )
 
 
 def map_clvs(df_pred, df_ref):
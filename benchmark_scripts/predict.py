@@ -11,7 +11,7 @@ import pandas as pd
 from sklearn.tree import DecisionTreeClassifier, export_graphviz
 
 from kleat.misc.utils import backup_file
-from ml_utils import load_polya_seq_df, map_clvs, compare, KARBOR_FEATURE_COLS
+from ml_utils import load_polya_seq_df, map_clvs, compare, gen_karbor_feature_cols
 import train_arbor as TA
 from cluster import cluster_clv_sites
 
@@ -43,6 +43,12 @@ def get_args():
         help='output for recording testing results in csv'
     )
 
+    parser.add_argument(
+        '--hexamer-table', type=str, default=None,
+        help=('the PAS hexamer table file passed to kleat --hexamer-table, '
+              'which decides the hexamer feature columns')
+    )
+
     # arguments below are often good in default
     parser.add_argument(
         '--map-cutoff', type=int, default=50,
@@ -60,6 +66,7 @@ def get_args():
 
 def main():
     args = get_args()
+    feature_cols = gen_karbor_feature_cols(args.hexamer_table)
 
     with open(args.classifier_pkl, 'rb') as inf:
         clf = pickle.load(inf)
@@ -73,7 +80,8 @@ def main():
         for test_sample_id in args.test_sample_ids:
             df_te = TA.load_df(test_sample_id)
             df_ref = load_polya_seq_df(test_sample_id)
-            row_results = TA.run_test(test_sample_id, df_te, df_ref, clf, args.map_cutoff)
+            row_results = TA.run_test(
+                test_sample_id, df_te, df_ref, clf, args.map_cutoff, feature_cols)
 
             csvwriter.writerow(row_results)
 
@@ -3,7 +3,7 @@ import sys
 import logging
 
 import pandas as pd
-import kleat.misc.settings as S
+from kleat.hexamer.table import get_hexamer_names, compile_hexamer_file
 from kleat.misc.utils import timeit
 
 logging.basicConfig(
@@ -16,14 +16,19 @@ def gen_outfile(infile):
                         '{0}.ml_ready.pkl'.format(base))
 
 
-def convert_to_ml_ready_df(adf):
+def convert_to_ml_ready_df(adf, table=None):
+    """
+    :param table: a scan.HexamerTable, see compile_hexamer_file, None for the
+    default one
+    """
     adf['abs_dist_to_aclv'] = adf['signed_dist_to_aclv'].abs()
 
-    used_hexamers = [_[0] for _ in S.CANDIDATE_HEXAMERS] + ['NA']
-    ctg_dum_hxm = pd.get_dummies(adf.ctg_hex, columns=used_hexamers)
+    # one column per hexamer of the table, even if not seen in adf
+    used_hexamers = pd.CategoricalDtype(get_hexamer_names(table))
+    ctg_dum_hxm = pd.get_dummies(adf.ctg_hex.astype(used_hexamers))
     ctg_dum_hxm.columns = ['ctg_' + _ for _ in ctg_dum_hxm.columns.values]
 
-    ref_dum_hxm = pd.get_dummies(adf.ref_hex, columns=used_hexamers)
+    ref_dum_hxm = pd.get_dummies(adf.ref_hex.astype(used_hexamers))
     ref_dum_hxm.columns = ['ref_' + _ for _ in ref_dum_hxm.columns.values]
 
     bdf = pd.concat([adf, ctg_dum_hxm, ref_dum_hxm], axis=1)
@@ -32,11 +37,13 @@ def convert_to_ml_ready_df(adf):
 
 if __name__ == "__main__":
     infile = sys.argv[1]
+    # optional, the hexamer table file passed to kleat --hexamer-table
+    table = compile_hexamer_file(sys.argv[2] if len(sys.argv) > 2 else None)
     outfile = gen_outfile(infile)
 
     logging.info('reading {0}'.format(infile))
     adf = pd.read_pickle(infile)
 
-    bdf = convert_to_ml_ready_df(adf)
+    bdf = convert_to_ml_ready_df(adf, table)
     logging.info('writing {0}'.format(outfile))
     timeit(bdf.to_pickle)(outfile.replace('.fea', '.pkl'))
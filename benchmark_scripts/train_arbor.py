@@ -10,7 +10,7 @@ import pandas as pd
 from sklearn.tree import DecisionTreeClassifier, export_graphviz
 from sklearn.ensemble import GradientBoostingClassifier
 
-from ml_utils import load_polya_seq_df, map_clvs, compare, KARBOR_FEATURE_COLS
+from ml_utils import load_polya_seq_df, map_clvs, compare, gen_karbor_feature_cols
 from kleat.misc.cluster import cluster_clv_sites
 from kleat.misc.utils import backup_file
 
@@ -38,8 +38,8 @@ def map_to_ref(df, df_ref, map_cutoff):
     return df
 
 
-def prepare_args(df_tr_mapped, max_depth_list, clf_type):
-    Xs = df_tr_mapped[KARBOR_FEATURE_COLS]
+def prepare_args(df_tr_mapped, max_depth_list, clf_type, feature_cols):
+    Xs = df_tr_mapped[feature_cols]
     ys = df_tr_mapped.is_tp.values
     res = []
     for d in max_depth_list:
@@ -63,8 +63,8 @@ def train_it_wrapper(args):
     return train_it(*args)
 
 
-def predict(df_te, clf):
-    Xs_te = df_te[KARBOR_FEATURE_COLS]
+def predict(df_te, clf, feature_cols):
+    Xs_te = df_te[feature_cols]
     df_te['predicted'] = clf.predict(Xs_te)
 
     # dedup here may not be necessary
@@ -94,12 +94,12 @@ def cluster_clv(df, cutoff=20):
     return out
 
 
-def run_test(test_sample_id, df_te, df_ref, clf, map_cutoff):
+def run_test(test_sample_id, df_te, df_ref, clf, map_cutoff, feature_cols):
     """args as list, otherwise this function can't be passed
     multiprocessing.Pool"""
     logging.info(f'testing on {test_sample_id} with {clf}')
 
-    df_predicted = predict(df_te, clf)
+    df_predicted = predict(df_te, clf, feature_cols)
     df_clustered = cluster_clv(df_predicted)
 
     recall, precision, f1 = compare(df_clustered, df_ref, map_cutoff)
@@ -110,7 +110,7 @@ def run_test_wrapper(args):
     return run_test(*args)
 
 
-def run_test_in_parallel(clf_list, test_sample_ids, map_cutoff, num_cpus):
+def run_test_in_parallel(clf_list, test_sample_ids, map_cutoff, num_cpus, feature_cols):
     all_results = []
     for test_sample_id in test_sample_ids:
         df_te = load_df(test_sample_id)
@@ -119,7 +119,7 @@ def run_test_in_parallel(clf_list, test_sample_ids, map_cutoff, num_cpus):
         args_list_for_test = []
         for clf in clf_list:
             args_list_for_test.append(
-                (test_sample_id, df_te, df_ref, clf, map_cutoff)
+                (test_sample_id, df_te, df_ref, clf, map_cutoff, feature_cols)
             )
 
         with multiprocessing.Pool(num_cpus) as p:
@@ -197,6 +197,12 @@ def get_args():
         help='if specified, only training is conducted, no testing would be run'
     )
 
+    parser.add_argument(
+        '--hexamer-table', type=str, default=None,
+        help=('the PAS hexamer table file passed to kleat --hexamer-table, '
+              'which decides the hexamer feature columns')
+    )
+
     # arguments below are often good in default
     parser.add_argument(
         '--map-cutoff', type=int, default=50,
@@ -219,6 +225,7 @@ def get_args():
 def main():
     args = get_args()
     test_sample_ids = args.test_sample_ids
+    feature_cols = gen_karbor_feature_cols(args.hexamer_table)
 
     if args.trained_classifier is None:
         train_sample_id = args.train_sample_id
@@ -231,7 +238,7 @@ def main():
         beg, end, step = args.max_depths
         max_depth_list = range(beg, end, step)
         logging.info(f'max_depth list trees: {max_depth_list}')
-        train_args = prepare_args(df_tr_mapped, max_depth_list, clf_type)
+        train_args = prepare_args(df_tr_mapped, max_depth_list, clf_type, feature_cols)
 
         logging.info('prepare for TRAINing ...')
         with multiprocessing.Pool(args.num_cpus) as p:
@@ -250,7 +257,7 @@ def main():
                 clf_dot, clf_png = gen_tree_vis_outputs(args.output, clf_type, depth)
                 backup_file(clf_dot, clf_png)
                 export_graphviz(clf_dd[depth], clf_dot, args.vis_tree_max_depth,
-                                feature_names=KARBOR_FEATURE_COLS)
+                                feature_names=feature_cols)
                 try:
                     subprocess.call(f'dot -Tpng {clf_dot} -o {clf_png}'.split())
                 except FileNotFoundError as err:
@@ -273,7 +280,8 @@ def main():
             )
 
             test_results = run_test_in_parallel(
-                clf_list, test_sample_ids, args.map_cutoff, args.num_cpus)
+                clf_list, test_sample_ids, args.map_cutoff, args.num_cpus,
+                feature_cols)
 
             for row in test_results:
                 csvwriter.writerow(row)
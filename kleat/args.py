@@ -1,16 +1,48 @@
 import argparse
 
+from kleat.evidence.registry import parse_evidence_types
+from kleat.misc.strandedness import UNSTRANDED, STRANDEDNESS_CHOICES
+
+
+def evidence_types(names):
+    """argparse type of --evidence, see registry.parse_evidence_types"""
+    try:
+        return parse_evidence_types(names)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def get_prepare_reference_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='kleat prepare-reference',
+        description=('convert a reference genome FASTA file into a packed '
+                     '2-bit file with an N mask, which can be passed to '
+                     'kleat -f in place of the FASTA file'))
+    parser.add_argument(
+        '-f', '--reference-genome', type=str, required=True,
+        help='input reference genome FASTA file'
+    )
+    parser.add_argument(
+        '-o', '--output', type=str, default=None,
+        help=('output 2-bit file, default: <reference-genome>.k2bit. Note '
+              'it is not the UCSC .2bit format')
+    )
+    return parser.parse_args(argv)
+
 
 def get_args():
     parser = argparse.ArgumentParser(
         description='KLEAT: cleavage site detection via de novo assembly')
     parser.add_argument(
         '-c', '--contigs-to-genome', type=str, required=True,
-        help='input contig-to-genome alignment BAM file'
+        help=('input contig-to-genome alignment BAM file, or a '
+              'coordinate-sorted read-to-genome alignment BAM file with '
+              '--long-reads')
     )
     parser.add_argument(
-        '-r', '--reads-to-contigs', type=str, required=True,
-        help='input read-to-contig alignment BAM file'
+        '-r', '--reads-to-contigs', type=str, default=None,
+        help=('input read-to-contig alignment BAM file, required unless '
+              '--long-reads is specified')
     )
     parser.add_argument(
         '-f', '--reference-genome', type=str, required=True,
@@ -19,7 +51,9 @@ def get_args():
               'both contig and reference genome, which is useful for '
               'checking mutations that may affect PAS hexmaer.  '
               'Note this fasta file needs to be consistent with the one '
-              'used for generating the read-to-contig BAM alignments')
+              'used for generating the read-to-contig BAM alignments. A 2-bit '
+              'file from `kleat prepare-reference` is accepted, too, which '
+              'is shared by all workers via mmap')
     )
     parser.add_argument(
         '-a', '--karbor-clv-annotation', type=str, required=True,
@@ -61,6 +95,194 @@ def get_args():
               '(boundry between BAM_CMATCH and BAM_CREF_SKIP)')
     )
 
+    parser.add_argument(
+        '--read-flag-mask', type=lambda x: int(x, 0), default=0,
+        help=('drop reads in the read-to-contig alignment with any of these '
+              'flag bits set, e.g. 0xF00 drops secondary, QC-fail, duplicate '
+              'and supplementary reads. The check is done before any read '
+              'sequence is decoded')
+    )
+
+    parser.add_argument(
+        '--min-read-mapq', type=int, default=0,
+        help=('drop mapped reads with MAPQ lower than this in the '
+              'read-to-contig alignment, unmapped reads are kept as they '
+              'may support link evidence')
+    )
+
+    parser.add_argument(
+        '--min-read-aligned-len', type=int, default=0,
+        help=('drop mapped reads with fewer aligned bases than this in the '
+              'read-to-contig alignment')
+    )
+
+    parser.add_argument(
+        '--contig-flag-mask', type=lambda x: int(x, 0), default=0,
+        help=('drop contigs in the contig-to-genome alignment with any of '
+              'these flag bits set, e.g. 0x900 drops secondary and '
+              'supplementary alignments')
+    )
+
+    parser.add_argument(
+        '--min-contig-mapq', type=int, default=0,
+        help='drop contigs with MAPQ lower than this'
+    )
+
+    parser.add_argument(
+        '--min-contig-aligned-len', type=int, default=0,
+        help='drop contigs with fewer aligned bases than this'
+    )
+
+    parser.add_argument(
+        '--max-contig-clip-fraction', type=float, default=1,
+        help=('drop contigs with a larger fraction of soft/hard clipped bases '
+              'than this. Note the polyA tail of a suffix contig is clipped, '
+              'too. Contig filters are applied before any read or hexamer '
+              'work, trading recall for throughput')
+    )
+
+    parser.add_argument(
+        '--max-reads-per-contig', type=int, default=0,
+        help=('read budget per contig for bridge and link evidence. Past the '
+              'budget, read counts are estimated from a reservoir sample of '
+              'this size (seeded by contig name, so results are '
+              'reproducible), and the clv records are flagged by '
+              'reads_subsampled, a column only output with either budget. '
+              '0 means no budget')
+    )
+
+    parser.add_argument(
+        '--max-seconds-per-contig', type=float, default=0,
+        help=('stop consuming reads of a contig for bridge and link evidence '
+              'after this many seconds, counts then only represent the reads '
+              'seen and are flagged, too. The clock is checked before the '
+              'first read and then every 1024 reads. 0 means no time limit')
+    )
+
+    parser.add_argument(
+        '--evidence', type=evidence_types, default='suffix,bridge,link,blank',
+        help=('comma-separated evidence types to collect. Reads aligned to a '
+              'contig are only loaded if bridge or link is selected, and '
+              'blank only excludes clvs supported by the other selected '
+              'types')
+    )
+
+    parser.add_argument(
+        '--library-strandedness', type=str, default=UNSTRANDED,
+        choices=STRANDEDNESS_CHOICES,
+        help=('for stranded libraries assembled in a strand-aware way, '
+              '"forward" means contig sequences are in the orientation of '
+              'transcripts, and "reverse" means they are reverse '
+              'complemented. clv candidates on the other strand are pruned '
+              'before any hexamer search')
+    )
+
+    parser.add_argument(
+        '--mate-index', action='store_true',
+        help=('index polyA/T reads that are placed on another contig than '
+              'their mates per seqname, so '
+              'that link evidence can also be counted from the mapped mate. '
+              'Costs one extra pass over the reads of each seqname')
+    )
+
+    parser.add_argument(
+        '--io-threads', type=int, default=0,
+        help=('total threads for decoding BAM files, split evenly across '
+              'the -p workers on top of them. With at least one thread per '
+              'worker, reads of upcoming contigs are fetched from the '
+              'read-to-contig BAM by a background thread into a bounded '
+              'queue, overlapping BGZF decompression with evidence '
+              'analysis. Further threads per worker are used by htslib for '
+              'decompression. 0 means decoding on the worker itself')
+    )
+
+    parser.add_argument(
+        '--r2c-locality-order', action='store_true',
+        help=('process contigs of each seqname in the order of their reads '
+              'in the read-to-contig BAM instead of genome order, so that '
+              'disk access is close to sequential. Results are re-sorted '
+              'into the original order, holding a seqname\'s clv records in '
+              'memory until it is done')
+    )
+
+    parser.add_argument(
+        '--cache-chromosome', action='store_true',
+        help=('load the chromosome of each seqname into memory once per '
+              'worker, so that reference fetches for PAS hexamer search and '
+              'upstream windows are served as in-memory slices. Costs up to '
+              'the size of the largest chromosome per worker')
+    )
+
+    parser.add_argument(
+        '--long-reads', action='store_true',
+        help=('assembly-free mode for long reads, where -c is a '
+              'read-to-genome alignment BAM and each read with a polyA/T '
+              'tail is analyzed as a suffix contig. No read-to-contig '
+              'alignment is needed. Reads are streamed and aggregated per '
+              'clv on the fly, so memory stays bounded. Contig filters and '
+              '--library-strandedness apply to the reads, other contig and '
+              'read-to-contig options are ignored')
+    )
+
+    parser.add_argument(
+        '--hexamer-table', type=str, default=None,
+        help=('a file of PAS hexamer motifs and their strengths, one '
+              'whitespace-separated pair per line, replacing the built-in '
+              'candidate hexamers. Motifs may be degenerate IUPAC patterns '
+              '(e.g. AWTAAA), and strengths, the larger the stronger, are '
+              'reported as ctg_hex_id and ref_hex_id')
+    )
+
+    parser.add_argument(
+        '--hexamer-cache-size', type=int, default=0,
+        help=('if positive, each worker memoizes up to this many reference '
+              'PAS hexamer searches keyed by (seqname, strand, clv), and as '
+              'many contig window searches keyed by window content, across '
+              'contigs, in LRU caches. Hit rates are logged in the evidence '
+              'stats. 0 disables the caches')
+    )
+
+    parser.add_argument(
+        '--defer-ref-hexamers', action='store_true',
+        help=('search PAS hexamers on the reference genome after '
+              'aggregation (and clustering), once per unique (seqname, '
+              'strand, clv) in batches per chromosome, instead of in the '
+              'workers for every clv record. The ref_hex columns of the '
+              'pre-aggregation records are NA then')
+    )
+
+    parser.add_argument(
+        '--skip-identical-ref-hexamers', action='store_true',
+        help=('reuse the PAS hexamer searched in a contig\'s upstream window '
+              'for the reference genome, when the window lies in one '
+              'aligned block without mismatches per the cigar and the MD '
+              '(or NM:i:0) tag of the contig. Needs the MD/NM tags to have '
+              'been calculated against the genome passed to -f. The number '
+              'of reused windows is logged in the evidence stats')
+    )
+
+    parser.add_argument(
+        '--hexamer-profile-windows', type=int, nargs='+', default=None,
+        metavar='WINDOW',
+        help=('e.g. 30 40 50 60, add a PAS hexamer profile of the reference '
+              'genome per clv to the output, computed by scanning the '
+              'upstream window of the largest size once: ref_hex_mask, '
+              'where bit k is set if the k-th hexamer from the strongest is '
+              'found, ref_hex_nearest, the positions of found hexamers '
+              'closest to the clv, and the strongest hexamer of each window '
+              'in ref_hex_<window>, ref_hex_id_<window> and '
+              'ref_hex_pos_<window>')
+    )
+
+    parser.add_argument(
+        '--dedup-contigs', action='store_true',
+        help=('group contigs with identical alignments (same reference '
+              'start, end, strand, cigar and sequence) for each seqname, so '
+              'that contig-only work like PAS hexamer search is done once '
+              'per group. Reads are still counted per contig, and clv '
+              'records of a group are merged before aggregation')
+    )
+
     parser.add_argument(
         '--cluster-first-then-aggregate', action="store_true",
         help=('the default approach is '
@@ -80,4 +302,9 @@ def get_args():
         '--cluster-cutoff', type=int, default=20,
         help=('the cutoff for single-linkage clustering')
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.reads_to_contigs is None and not args.long_reads:
+        parser.error('-r/--reads-to-contigs is required unless --long-reads is specified')
+    if args.hexamer_profile_windows is not None and min(args.hexamer_profile_windows) < 6:
+        parser.error('--hexamer-profile-windows must be at least 6')
+    return args
@@ -1,58 +1,78 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
 
-from kleat.evidence.do_bridge import do_bridge
+import numpy as np
+
+from kleat.evidence.do_bridge import do_bridge, do_bridge_batch
+from kleat.evidence.read_batch import NO_TAIL
 from kleat.misc import apautils
-from kleat.misc.calc_genome_offset import calc_genome_offset
-import kleat.misc.settings as S
+from kleat.misc import clv_key as CK
+from kleat.misc.contig_geometry import (
+    get_is_hardclipped, get_genome_offset_map
+)
+from kleat.misc.calc_genome_offset import calc_genome_offset, calc_genome_offsets
 
 # for bridge PAS hexamer search needs done in a more customized way than just
 # using gen_contig_hexamer_tuple
-from kleat.hexamer.search import search
-from kleat.hexamer.hexamer import extract_seq, gen_reference_hexamer_tuple
+from kleat.hexamer.hexamer import (
+    extract_seq, search_contig_window, gen_contig_reference_hexamer_tuple
+)
 
 
-def write_evidence(dd_bridge, contig, ref_fa, csvwriter):
+def write_evidence(dd_bridge, contig, ref_fa, buf, reads_subsampled=False):
+    """
+    :param buf: a record_buffer.ClvRecordBuffer
+    :returns: a list of clv keys (ints) written, see clv_key
+    """
     res = []
-    for clv_key in dd_bridge['num_reads']:
-        clv_record = gen_clv_record(
-            contig, clv_key,
-            dd_bridge['num_reads'][clv_key],
-            dd_bridge['max_tail_len'][clv_key],
-            dd_bridge['hexamer_tuple'][clv_key],
-            ref_fa
+    for bdg_key in dd_bridge['num_reads']:
+        clv_key, ctg_clv = CK.decode_bridge_key(bdg_key)
+        _, strand, ref_clv = CK.decode_clv_key(clv_key)
+        append_clv_record(
+            buf,
+            contig, (contig.reference_name, strand, ref_clv, ctg_clv),
+            dd_bridge['num_reads'][bdg_key],
+            dd_bridge['max_tail_len'][bdg_key],
+            dd_bridge['hexamer_tuple'][bdg_key],
+            ref_fa,
+            reads_subsampled
         )
-        apautils.write_row(clv_record, csvwriter)
-        res.append(clv_record)
+        res.append(clv_key)
     return res
 
 
-def update_evidence(evid_tuple, evid_holder):
+def update_evidence(bdg_key, tail_len, hex_tuple, evid_holder, num_reads=1):
     """
     update the bridge evidence holder with extracted bridge evidence
 
-    :param evid_tuple: evidence tuple
+    :param bdg_key: a bridge key (int), see clv_key.encode_bridge_key
     :param evid_holder: A dict holder bridge evidence for a given contig
+    :param num_reads: number of reads supporting the bridge key, tail_len is
+    then the max tail length among them
     """
-    seqname, strand, ref_clv, ctg_clv, tail_len, hex_tuple = evid_tuple
-    clv_key = apautils.gen_clv_key_tuple_with_ctg_clv(seqname, strand, ref_clv, ctg_clv)
-    evid_holder['num_reads'][clv_key] += 1
-    evid_holder['max_tail_len'][clv_key] = max(
-        evid_holder['max_tail_len'][clv_key], tail_len)
+    evid_holder['num_reads'][bdg_key] += num_reads
+    evid_holder['max_tail_len'][bdg_key] = max(
+        evid_holder['max_tail_len'][bdg_key], tail_len)
     if hex_tuple is not None:
-        evid_holder['hexamer_tuple'][clv_key] = hex_tuple
+        evid_holder['hexamer_tuple'][bdg_key] = hex_tuple
 
 
 def is_a_bridge_read(read):
     return not read.is_unmapped and apautils.has_tail(read)
 
 
+def is_a_bridge_read_batch(batch, tail_sides):
+    """array-wise is_a_bridge_read for a ReadBatch"""
+    return ~batch.is_unmapped & (tail_sides != NO_TAIL)
+
+
 def init_evidence_holder():
     """
-    initialize holders for bridge and link evidence of a given contig
+    initialize holders for bridge and link evidence of a given contig, keyed
+    by bridge keys (ints) in the pipeline
     """
     return {
-        'num_reads': defaultdict(int),
-        'max_tail_len': defaultdict(int),
+        'num_reads': Counter(),
+        'max_tail_len': Counter(),
         'hexamer_tuple': defaultdict(lambda: None),  # TODO: maybe defaultdict(tuple)
     }
 
@@ -62,16 +82,104 @@ def gen_hex_tuple(contig, strand, ref_clv, ref_fa, ctg_clv, dd_bridge):
     seqname = contig.reference_name
     clv_key = apautils.gen_clv_key_tuple_with_ctg_clv(seqname, strand, ref_clv, ctg_clv)
     if dd_bridge['hexamer_tuple'][clv_key] is None:  # do search
-        hex_src_seq = extract_seq(contig, strand, ref_clv, ref_fa, ctg_clv)
+        return search_contig_hexamer(contig, strand, ref_clv, ref_fa, ctg_clv)
+
 
-        ctg_hex_tuple = search(strand, ref_clv, hex_src_seq)
-        if ctg_hex_tuple is None:
-            ctg_hex_tuple = ('NA', -1, -1)
-    else:
-        ctg_hex_tuple = None
+def search_contig_hexamer(contig, strand, ref_clv, ref_fa, ctg_clv):
+    hex_src_seq = extract_seq(contig, strand, ref_clv, ref_fa, ctg_clv)
+    ctg_hex_tuple = search_contig_window(strand, ref_clv, hex_src_seq)
+    if ctg_hex_tuple is None:
+        ctg_hex_tuple = ('NA', -1, -1)
     return ctg_hex_tuple
 
 
+def calc_ref_clv(contig, ctg_clv, tail_direction):
+    """
+    convert clv in contig coordinate to that in genome coordinate, return None
+    if the clv is on soft/hard clipped region
+    """
+    offset = calc_genome_offset(contig.cigartuples, ctg_clv, tail_direction, skip_check_size=3)
+
+    if offset < 0:             # meaning the clv is on soft/hard clipped region
+        return
+
+    return contig.reference_start + offset
+
+
+def calc_ref_clvs(contig, ctg_clvs, is_left_direction):
+    """
+    array-wise calc_ref_clv using the precomputed GenomeOffsetMap of the
+    contig, returns a tuple of (ref_clvs, is_valid)
+    """
+    offset_map = get_genome_offset_map(contig)
+    offsets = np.zeros(ctg_clvs.shape[0], dtype=np.int64)
+    for tail_direction, mask in [('left', is_left_direction),
+                                 ('right', ~is_left_direction)]:
+        if np.any(mask):
+            offsets[mask] = calc_genome_offsets(
+                offset_map, ctg_clvs[mask], tail_direction, skip_check_size=3)
+    # offset < 0 means the clv is on soft/hard clipped region
+    return contig.reference_start + offsets, offsets >= 0
+
+
+def group_bridge_reads(contig, batch, tail_sides, is_bridge):
+    """
+    array-wise do_bridge + calc_ref_clv for all bridge reads of a contig in a
+    ReadBatch.
+
+    Reads are grouped by their (ctg_clv, tail direction), and the genome
+    offsets of all groups are looked up in one batch from the contig's
+    GenomeOffsetMap. Groups are returned in the order of their first read to
+    keep the same order of clv keys in dd_bridge as the per-read approach
+
+    :returns: a list of (strand, ref_clv, ctg_clv, max_tail_len, num_reads)
+    """
+    is_valid, is_plus, ctg_clvs, tail_lens, is_left = do_bridge_batch(
+        contig, batch, tail_sides, is_bridge)
+    idx = np.flatnonzero(is_valid)
+    if idx.shape[0] == 0:
+        return []
+
+    codes = ctg_clvs[idx] * 2 + is_left[idx]
+    _, first_idx, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    counts = np.bincount(inverse)
+    max_tail_lens = np.zeros(first_idx.shape[0], dtype=np.int64)
+    np.maximum.at(max_tail_lens, inverse, tail_lens[idx])
+
+    grp_idx = idx[first_idx]
+    ref_clvs, is_valid_ref_clv = calc_ref_clvs(
+        contig, ctg_clvs[grp_idx], is_left[grp_idx])
+
+    groups = []
+    for grp in np.argsort(first_idx):
+        if not is_valid_ref_clv[grp]:
+            continue
+        k = grp_idx[grp]
+        groups.append((
+            '+' if is_plus[k] else '-',
+            int(ref_clvs[grp]),
+            int(ctg_clvs[k]),
+            int(max_tail_lens[grp]),
+            int(counts[grp]),
+        ))
+    return groups
+
+
+def analyze_bridge_groups(contig, groups, ref_fa, dd_bridge):
+    """
+    search PAS hexamer once per group returned by group_bridge_reads and
+    update dd_bridge
+    """
+    ref_id = contig.reference_id
+    for strand, ref_clv, ctg_clv, max_tail_len, num_reads in groups:
+        bdg_key = CK.encode_bridge_key(CK.encode_clv_key(ref_id, strand, ref_clv), ctg_clv)
+        if bdg_key in dd_bridge['hexamer_tuple']:
+            ctg_hex_tuple = None
+        else:
+            ctg_hex_tuple = search_contig_hexamer(contig, strand, ref_clv, ref_fa, ctg_clv)
+        update_evidence(bdg_key, max_tail_len, ctg_hex_tuple, dd_bridge, num_reads=num_reads)
+
+
 def analyze_bridge(contig, read, ref_fa, dd_bridge, bridge_skip_check_size):
     """
     :param dd_bridge: holds bridge_evidence for a given contig, here it's just
@@ -85,63 +193,49 @@ def analyze_bridge(contig, read, ref_fa, dd_bridge, bridge_skip_check_size):
 
     strand, ctg_clv, tail_len, tail_direction = bdg_support
 
-    offset = calc_genome_offset(contig.cigartuples, ctg_clv, tail_direction, skip_check_size=3)
-
-    if offset < 0:             # meaning the clv is on soft/hard clipped region
+    ref_clv = calc_ref_clv(contig, ctg_clv, tail_direction)
+    if ref_clv is None:
         return
 
-    ref_clv = contig.reference_start + offset
-
     ctg_hex_tuple = gen_hex_tuple(
         contig, strand, ref_clv, ref_fa, ctg_clv, dd_bridge)
 
     return seqname, strand, ref_clv, ctg_clv, tail_len, ctg_hex_tuple
 
 
-def gen_clv_record(contig, clv_key_tuple,
-                   num_bridge_reads, max_bridge_read_tail_len,
-                   ctg_hex_tuple, ref_fa):
+def append_clv_record(buf, contig, clv_key_tuple,
+                      num_bridge_reads, max_bridge_read_tail_len,
+                      ctg_hex_tuple, ref_fa, reads_subsampled=False):
     """
+    :param buf: a record_buffer.ClvRecordBuffer
     :param contig: bridge contig
     :clv_key_tuple: a tuple of (seqname, strand, cleavage_site_position)
     :param ref_fa: if provided, search PAS hexamer on reference genome, too
+    :param reads_subsampled: whether num_bridge_reads is estimated from a
+    sample of reads, see read_budget
     """
     seqname, strand, ref_clv, ctg_clv = clv_key_tuple
 
-    ctg_hex, ctg_hex_id, ctg_hex_pos = ctg_hex_tuple
-    ref_hex, ref_hex_id, ref_hex_pos = gen_reference_hexamer_tuple(
-        ref_fa, contig.reference_name, strand, ref_clv)
+    ref_hex_tuple = gen_contig_reference_hexamer_tuple(
+        contig, strand, ref_clv, ref_fa, ctg_clv, ctg_hex_tuple)
 
-    return S.ClvRecord(
+    buf.append(
         seqname,
         strand,
         ref_clv,
 
-        ctg_hex,
-        ctg_hex_id,
-        ctg_hex_pos,
-
-        ref_hex,
-        ref_hex_id,
-        ref_hex_pos,
+        ctg_hex_tuple,
+        ref_hex_tuple,
 
         evidence_type='bridge',
         contig_id_at_pos='{0}@{1}'.format(contig.query_name, ctg_clv),
+        contig_is_hardclipped=get_is_hardclipped(contig),
         contig_len=contig.infer_query_length(True),
         contig_mapq=contig.mapq,
-        contig_is_hardclipped=apautils.is_hardclipped(contig),
 
-        num_suffix_reads=0,
-        max_suffix_read_tail_len=0,
-        suffix_contig_tail_len=0,
-        num_suffix_contigs=0,
+        reads_subsampled=reads_subsampled,
 
         num_bridge_reads=num_bridge_reads,
         max_bridge_read_tail_len=max_bridge_read_tail_len,
         num_bridge_contigs=1,
-
-        num_link_reads=0,
-        num_link_contigs=0,
-
-        num_blank_contigs=0,
     )
@@ -1,21 +1,8 @@
-from kleat.misc import apautils
-import kleat.misc.settings as S
-
+import numpy as np
 
-def calc_hardclips(cigartuples):
-    """
-    calculate the number of bases hard clipped at both ends, given cigartuples
-    of a contig
-    """
-    first_idx, last_idx = 0, len(cigartuples) - 1
-    left_hc, right_hc = 0, 0    # hc: hardclip
-    for k, (key, val) in enumerate(cigartuples):
-        if key == S.BAM_CHARD_CLIP:
-            if k == first_idx:
-                left_hc += val
-            elif k == last_idx:
-                right_hc += val
-    return left_hc, right_hc
+from kleat.misc import apautils
+from kleat.evidence.read_batch import LEFT_TAIL
+from kleat.misc.contig_geometry import get_hardclips
 
 
 def do_fwd_ctg_lt_bdg(read, contig):
@@ -23,7 +10,7 @@ def do_fwd_ctg_lt_bdg(read, contig):
     fwd: forwad, ctg: contig, lt: left-tailed, bdg: bridge
     """
     ctg_len_with_hc = contig.infer_query_length(always=True)
-    left_hc, right_hc = calc_hardclips(contig.cigartuples)
+    left_hc, right_hc = get_hardclips(contig)
 
     pre_ctg_offset = read.reference_start
     if pre_ctg_offset < left_hc:
@@ -41,7 +28,7 @@ def do_fwd_ctg_lt_bdg(read, contig):
 def do_fwd_ctg_rt_bdg(read, contig):
     """rt: right-tailed"""
     ctg_len_with_hc = contig.infer_query_length(always=True)
-    left_hc, right_hc = calc_hardclips(contig.cigartuples)
+    left_hc, right_hc = get_hardclips(contig)
 
     pre_ctg_offset = read.reference_end - 1
     if pre_ctg_offset < left_hc:
@@ -57,7 +44,7 @@ def do_fwd_ctg_rt_bdg(read, contig):
 
 def do_rev_ctg_lt_bdg(read, contig):
     ctg_len_with_hc = contig.infer_query_length(always=True)
-    left_hc, right_hc = calc_hardclips(list(reversed(contig.cigartuples)))
+    left_hc, right_hc = get_hardclips(contig, reverse=True)
 
     pre_ctg_offset = read.reference_start
     if pre_ctg_offset < left_hc:
@@ -73,7 +60,7 @@ def do_rev_ctg_lt_bdg(read, contig):
 
 def do_rev_ctg_rt_bdg(read, contig):
     ctg_len_with_hc = contig.infer_query_length(always=True)
-    left_hc, right_hc = calc_hardclips(list(reversed(contig.cigartuples)))
+    left_hc, right_hc = get_hardclips(contig, reverse=True)
 
     pre_ctg_offset = read.reference_end - 1
     if pre_ctg_offset < left_hc:
@@ -123,3 +110,34 @@ def do_bridge(contig, read):
         return do_reverse_contig(contig, read)
     else:
         return do_forward_contig(contig, read)
+
+
+def do_bridge_batch(contig, batch, tail_sides, is_bridge):
+    """
+    array-wise do_bridge for all bridge reads of a contig in a ReadBatch
+
+    :param tail_sides: returned by read_batch.calc_tail_sides(batch)
+    :param is_bridge: boolean mask of bridge reads in the batch
+
+    :returns: a tuple of arrays (is_valid, is_plus, ctg_offset, tail_len,
+    is_left_direction). is_valid is False for non-bridge reads and reads whose
+    clv falls within the hardclipped regions, which do_bridge returns None for
+    """
+    ctg_len_with_hc = contig.infer_query_length(always=True)
+    left_hc, right_hc = get_hardclips(contig, reverse=contig.is_reverse)
+
+    read_lt = tail_sides == LEFT_TAIL
+    pre_ctg_offset = np.where(read_lt, batch.reference_start, batch.reference_end - 1)
+    is_valid = (is_bridge
+                & (pre_ctg_offset >= left_hc)
+                & (pre_ctg_offset < ctg_len_with_hc - right_hc))
+    tail_len = np.where(read_lt, batch.first_len, batch.last_len)
+
+    if contig.is_reverse:
+        ctg_offset = ctg_len_with_hc - pre_ctg_offset - 1 - right_hc
+        # the direction is reversed again to match the forward direction
+        is_plus, is_left_direction = read_lt, ~read_lt
+    else:
+        ctg_offset = pre_ctg_offset - left_hc
+        is_plus, is_left_direction = ~read_lt, read_lt
+    return is_valid, is_plus, ctg_offset, tail_len, is_left_direction
@@ -1,27 +1,36 @@
-from collections import defaultdict
+from collections import Counter
 
-from kleat.misc.settings import ClvRecord
-from kleat.misc import apautils
+import numpy as np
+
+from kleat.misc import clv_key as CK
+from kleat.evidence import read_batch
+from kleat.misc.contig_geometry import get_is_hardclipped
+from kleat.misc.contig_catalog import get_contig_clvs
+from kleat.misc.strandedness import is_on_strand
 from kleat.hexamer.hexamer import (
     gen_contig_hexamer_tuple,
-    gen_reference_hexamer_tuple
+    gen_contig_reference_hexamer_tuple
 )
 
 
-def write_evidence(dd_link, contig, ref_fa, csvwriter):
+def write_evidence(dd_link, contig, ref_fa, buf, reads_subsampled=False):
+    """
+    :param buf: a record_buffer.ClvRecordBuffer
+    :returns: a list of clv keys (ints) written, see clv_key
+    """
     res = []
     for clv_key in dd_link['num_reads']:
-        clv_record = gen_clv_record(
-            contig, clv_key, dd_link['num_reads'][clv_key], ref_fa)
-        apautils.write_row(clv_record, csvwriter)
-        res.append(clv_record)
+        _, strand, ref_clv = CK.decode_clv_key(clv_key)
+        append_clv_record(
+            buf, contig, (contig.reference_name, strand, ref_clv),
+            dd_link['num_reads'][clv_key], ref_fa, reads_subsampled)
+        res.append(clv_key)
     return res
 
 
-def update_evidence(evid_tuple, evid_holder):
-    seqname, strand, ref_clv = evid_tuple
-    clv_key = apautils.gen_clv_key_tuple(seqname, strand, ref_clv)
-    evid_holder['num_reads'][clv_key] += 1
+def update_evidence(clv_key, evid_holder, num_reads=1):
+    """:param clv_key: an int, see clv_key.encode_clv_key"""
+    evid_holder['num_reads'][clv_key] += num_reads
 
 
 def is_a_link_read(read):
@@ -36,9 +45,16 @@ def is_a_link_read(read):
             and set(read.query_sequence) in [{'A'}, {'T'}])
 
 
+def is_a_link_read_batch(batch):
+    """array-wise is_a_link_read for a ReadBatch"""
+    return (~batch.mate_is_unmapped
+            & (batch.reference_id == batch.next_reference_id)
+            & (read_batch.is_polyA(batch) | read_batch.is_polyT(batch)))
+
+
 def init_evidence_holder():
     return {
-        'num_reads': defaultdict(int)
+        'num_reads': Counter()
     }
 
 
@@ -76,6 +92,60 @@ def analyze_reverse_link(contig, read):
         raise ValueError('NOT a polyA/T read: {0}'.format(read))
 
 
+def calc_strand_and_ref_clv(contig, is_polyT):
+    """
+    the same as analyze_forward_link/analyze_reverse_link, but takes whether
+    the link read is polyT (otherwise polyA) instead of the read itself
+    """
+    clvs = get_contig_clvs(contig)
+    if contig.is_reverse != is_polyT:
+        return '-', clvs.minus_ref_clv
+    else:
+        return '+', clvs.plus_ref_clv
+
+
+def analyze_link_batch(contig, batch, is_link, dd_link, transcript_strand=None):
+    """
+    array-wise analyze_link + update_evidence for all link reads of a contig
+    in a ReadBatch. A link read supports one of at most two clvs depending on
+    whether it's polyT or polyA
+
+    :param transcript_strand: if known, link reads supporting a clv on the
+    other strand are skipped, see strandedness
+    :returns: number of clvs skipped
+    """
+    idx = np.flatnonzero(is_link)
+    return update_link_evidence(
+        contig, read_batch.is_polyT(batch)[idx], dd_link, transcript_strand)
+
+
+def update_link_evidence(contig, polyT, dd_link, transcript_strand=None):
+    """
+    :param polyT: a boolean array of whether each link read is polyT
+    (otherwise polyA), in the order of reads
+    :returns: number of clvs skipped for being on the other strand
+    """
+    polyT = np.asarray(polyT, dtype=bool)
+    if polyT.shape[0] == 0:
+        return 0
+
+    num_polyT = int(polyT.sum())
+    counts = {True: num_polyT, False: polyT.shape[0] - num_polyT}
+    # keep the order of the first read as the per-read approach
+    first_is_polyT = bool(polyT[0])
+    num_skipped = 0
+    for is_polyT in [first_is_polyT, not first_is_polyT]:
+        if counts[is_polyT] == 0:
+            continue
+        strand, ref_clv = calc_strand_and_ref_clv(contig, is_polyT)
+        if not is_on_strand(strand, transcript_strand):
+            num_skipped += 1
+            continue
+        update_evidence(CK.encode_clv_key(contig.reference_id, strand, ref_clv),
+                        dd_link, num_reads=counts[is_polyT])
+    return num_skipped
+
+
 def analyze_link(contig, polyA_or_T_read):
     """poly_read refers to the read with all A or T rather than its mate"""
     seqname = contig.reference_name
@@ -96,52 +166,42 @@ def calc_ctg_clv(strand, ctg_seq_len):
     return ctg_clv
 
 
-def gen_clv_record(contig, clv_key_tuple, num_link_reads, ref_fa):
+def append_clv_record(buf, contig, clv_key_tuple, num_link_reads, ref_fa,
+                      reads_subsampled=False):
     """
+    :param buf: a record_buffer.ClvRecordBuffer
     :param contig: link contig
     :clv_key_tuple: a tuple of (seqname, strand, cleavage_site_position)
     :param ref_fa: if provided, search PAS hexamer on reference genome, too
+    :param reads_subsampled: whether num_link_reads is estimated from a
+    sample of reads, see read_budget
     """
     seqname, strand, ref_clv = clv_key_tuple
-    ctg_seq_len = contig.infer_query_length(always=True)
-    ctg_clv = calc_ctg_clv(strand, ctg_seq_len)
+    clvs = get_contig_clvs(contig)
+    ctg_clv = clvs.plus_ctg_clv if strand == '+' else clvs.minus_ctg_clv
 
-    ctg_hex, ctg_hex_id, ctg_hex_pos = gen_contig_hexamer_tuple(
+    ctg_hex_tuple = gen_contig_hexamer_tuple(
         contig, strand, ref_clv, ref_fa, ctg_clv)
 
-    ref_hex, ref_hex_id, ref_hex_pos = gen_reference_hexamer_tuple(
-        ref_fa, contig.reference_name, strand, ref_clv)
+    ref_hex_tuple = gen_contig_reference_hexamer_tuple(
+        contig, strand, ref_clv, ref_fa, ctg_clv, ctg_hex_tuple)
 
-    return ClvRecord(
+    buf.append(
         seqname,
         strand,
         ref_clv,
 
-        ctg_hex,
-        ctg_hex_id,
-        ctg_hex_pos,
-
-        ref_hex,
-        ref_hex_id,
-        ref_hex_pos,
+        ctg_hex_tuple,
+        ref_hex_tuple,
 
         evidence_type='link',
         contig_id_at_pos='{0}@{1}'.format(contig.query_name, ctg_clv),
+        contig_is_hardclipped=get_is_hardclipped(contig),
         contig_len=contig.query_length,
         contig_mapq=contig.mapq,
-        contig_is_hardclipped=apautils.is_hardclipped(contig),
 
-        num_suffix_reads=0,
-        max_suffix_read_tail_len=0,
-        suffix_contig_tail_len=0,
-        num_suffix_contigs=0,
-
-        num_bridge_reads=0,
-        max_bridge_read_tail_len=0,
-        num_bridge_contigs=0,
+        reads_subsampled=reads_subsampled,
 
         num_link_reads=num_link_reads,
         num_link_contigs=1,
-
-        num_blank_contigs=0,
     )
@@ -0,0 +1,87 @@
+"""
+Mate index for link evidence.
+
+link.is_a_link_read_batch only sees polyA/T reads placed on the contig
+together with their mates. A polyA/T read placed on another contig can still
+support a link clv of the contig its mate is aligned to, but finding it with
+pysam's mate() is a random BAM access per read.
+
+Instead, polyA/T reads not placed with their mates are indexed by
+(query_name, is_read1) in one pass over the reads aligned to the contigs of a
+work unit. Mates are then looked up in O(1) per pair. Note polyA/T reads
+placed on contigs of other work units are not indexed.
+
+Unplaced reads (i.e. under '*') are not indexed either: aligners place an
+unmapped read next to its mapped mate, so the mates of unplaced reads are
+unmapped, too, and never looked up, see gen_mate_candidates, while fetching
+them would cost a pass over all unplaced reads of the r2c BAM per work unit.
+"""
+
+from collections import namedtuple
+
+
+MateInfo = namedtuple('MateInfo', [
+    'reference_id',
+    'reference_start',
+    'is_polyT',                 # otherwise polyA, in sequencing orientation
+])
+
+
+def is_placed_with_mate(read):
+    return read.reference_id != -1 and read.reference_id == read.next_reference_id
+
+
+def build_mate_index(aligned_reads):
+    """
+    :param aligned_reads: an iterable of pysam.libcalignedsegment.AlignedSegment
+    :returns: a dict of (query_name, is_read1) => MateInfo
+    """
+    index = {}
+    for read in aligned_reads:
+        # reads placed with their mates are handled by link.is_a_link_read_batch,
+        # and checked first as it's cheaper than decoding the sequence
+        if is_placed_with_mate(read):
+            continue
+        seq = read.query_sequence
+        if not seq or seq[0] not in 'AT' or seq.count(seq[0]) != len(seq):
+            continue
+        # SEQ of a read aligned in reverse is reverse-complemented, so flip
+        # it back to the orientation the read was sequenced in, which is what
+        # link.is_a_link_read sees of unmapped mates
+        index[(read.query_name, read.is_read1)] = MateInfo(
+            read.reference_id, read.reference_start,
+            (seq[0] == 'T') != read.is_reverse)
+    return index
+
+
+def gen_work_unit_reads(r2c_bam, contig_names):
+    """reads aligned to the contigs of a work unit"""
+    for contig_name in contig_names:
+        for read in r2c_bam.fetch(contig_name):
+            yield read
+
+
+def lookup_mates(batch, is_candidate, mate_index):
+    """
+    :param batch: a ReadBatch loaded with_names
+    :param is_candidate: a boolean array of reads whose mates are looked up
+    :returns: a list of is_polyT of polyA/T mates found, in the order of reads
+    """
+    res = []
+    for k in is_candidate.nonzero()[0]:
+        mate = mate_index.get((batch.query_name[k], not batch.is_read1[k]))
+        if mate is not None and mate.reference_id != batch.reference_id[k]:
+            res.append(mate.is_polyT)
+    return res
+
+
+def gen_mate_candidates(batch, exclude):
+    """
+    mapped reads whose mates are not placed on the same contig
+
+    :param exclude: a boolean array, e.g. reads that are already bridge or
+    link reads themselves
+    """
+    return (~batch.is_unmapped
+            & (batch.next_reference_id != batch.reference_id)
+            & ~exclude)
@@ -0,0 +1,168 @@
+"""
+Batch layer for classifying reads aligned to a contig.
+
+The per-read fields needed by bridge, link and suffix classification are
+pulled into NumPy arrays in a single pass over the reads. Homopolymer tails are
+detected by a byte-level scan over all read sequences concatenated, so the
+classification and clv offsets can be computed array-wise per contig instead
+of calling Python functions (and building set()s) for every read.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import kleat.misc.settings as S
+from kleat.misc.settings import NO_TAIL, LEFT_TAIL, RIGHT_TAIL
+
+
+ReadBatch = namedtuple('ReadBatch', [
+    'is_unmapped',
+    'reference_start',
+    'reference_end',        # -1 for unmapped reads
+
+    'first_op',             # -1 for reads without cigar
+    'first_len',
+    'last_op',
+    'last_len',
+
+    'seq_len',
+    'lead_T',               # length of the leading polyT run
+    'trail_A',              # length of the trailing polyA run
+
+    'mate_is_unmapped',
+    'reference_id',
+    'next_reference_id',
+
+    # only loaded with_names, otherwise None, lists instead of arrays as
+    # they're only used for dict lookups
+    'query_name',
+    'is_read1',
+])
+
+
+ORD_A, ORD_T = ord('A'), ord('T')
+
+
+def calc_homopolymer_runs(buf, offsets):
+    """
+    calculate the lengths of the leading polyT run and the trailing polyA run
+    of every sequence concatenated in buf
+
+    :param buf: uint8 array of all sequences concatenated
+    :param offsets: sequence i spans buf[offsets[i]:offsets[i + 1]]
+    """
+    begs, ends = offsets[:-1], offsets[1:]
+
+    # sentinel at the end so that every sequence finds a non-T position
+    non_T = np.append(np.flatnonzero(buf != ORD_T), buf.shape[0])
+    first_non_T = non_T[np.searchsorted(non_T, begs)]
+    lead_T = np.minimum(first_non_T, ends) - begs
+
+    # sentinel at the beginning so that every sequence finds a non-A position
+    non_A = np.insert(np.flatnonzero(buf != ORD_A), 0, -1)
+    last_non_A = non_A[np.searchsorted(non_A, ends) - 1]
+    trail_A = ends - np.maximum(last_non_A + 1, begs)
+    return lead_T, trail_A
+
+
+def load_read_batch(aligned_reads, with_names=False):
+    """
+    :param aligned_reads: an iterable of pysam.libcalignedsegment.AlignedSegment,
+    e.g. a pysam.libcalignmentfile.IteratorRowRegion instance
+    :param with_names: whether to load query_name and is_read1, e.g. for
+    looking up mates in a mate_index
+    """
+    cols = [[] for _ in range(10)]
+    (is_unmapped, ref_beg, ref_end,
+     first_op, first_len, last_op, last_len,
+     mate_is_unmapped, ref_id, next_ref_id) = cols
+    seqs = []
+    qnames, is_read1 = ([], []) if with_names else (None, None)
+    for read in aligned_reads:
+        cgts = read.cigartuples
+        if cgts:
+            first_cigar, last_cigar = cgts[0], cgts[-1]
+        else:
+            first_cigar = last_cigar = (-1, 0)
+        r_end = read.reference_end
+
+        is_unmapped.append(read.is_unmapped)
+        ref_beg.append(read.reference_start)
+        ref_end.append(-1 if r_end is None else r_end)
+        first_op.append(first_cigar[0])
+        first_len.append(first_cigar[1])
+        last_op.append(last_cigar[0])
+        last_len.append(last_cigar[1])
+        mate_is_unmapped.append(read.mate_is_unmapped)
+        ref_id.append(read.reference_id)
+        next_ref_id.append(read.next_reference_id)
+        seqs.append(read.query_sequence or '')
+        if with_names:
+            qnames.append(read.query_name)
+            is_read1.append(read.is_read1)
+
+    seq_lens = np.array([len(_) for _ in seqs], dtype=np.int64)
+    offsets = np.zeros(seq_lens.shape[0] + 1, dtype=np.int64)
+    np.cumsum(seq_lens, out=offsets[1:])
+    buf = np.frombuffer(''.join(seqs).encode('ascii'), dtype=np.uint8)
+    lead_T, trail_A = calc_homopolymer_runs(buf, offsets)
+
+    return ReadBatch(
+        is_unmapped=np.array(is_unmapped, dtype=bool),
+        reference_start=np.array(ref_beg, dtype=np.int64),
+        reference_end=np.array(ref_end, dtype=np.int64),
+
+        first_op=np.array(first_op, dtype=np.int64),
+        first_len=np.array(first_len, dtype=np.int64),
+        last_op=np.array(last_op, dtype=np.int64),
+        last_len=np.array(last_len, dtype=np.int64),
+
+        seq_len=seq_lens,
+        lead_T=lead_T,
+        trail_A=trail_A,
+
+        mate_is_unmapped=np.array(mate_is_unmapped, dtype=bool),
+        reference_id=np.array(ref_id, dtype=np.int64),
+        next_reference_id=np.array(next_ref_id, dtype=np.int64),
+
+        query_name=qnames,
+        is_read1=is_read1,
+    )
+
+
+def match_leading_T(batch, n):
+    """array-wise set(seq[0:n]) == {'T'}, n follows Python slicing semantics"""
+    size = np.where(n >= 0, np.minimum(n, batch.seq_len),
+                    np.maximum(batch.seq_len + n, 0))
+    return (size > 0) & (batch.lead_T >= size)
+
+
+def match_trailing_A(batch, n):
+    """array-wise set(seq[-n:]) == {'A'}, n follows Python slicing semantics"""
+    size = np.where(n > 0, np.minimum(n, batch.seq_len),
+                    np.where(n == 0, batch.seq_len,
+                             np.maximum(batch.seq_len + n, 0)))
+    return (size > 0) & (batch.trail_A >= size)
+
+
+def calc_tail_sides(batch):
+    """
+    array-wise apautils.has_tail, returns NO_TAIL, LEFT_TAIL or RIGHT_TAIL for
+    each read
+    """
+    left = ((batch.first_op == S.BAM_CSOFT_CLIP)
+            & (batch.first_len > 0)
+            & (batch.lead_T >= batch.first_len))
+    right = ((batch.last_op == S.BAM_CSOFT_CLIP)
+             & (batch.last_len > 0)
+             & (batch.trail_A >= batch.last_len))
+    return np.where(left, LEFT_TAIL, np.where(right, RIGHT_TAIL, NO_TAIL))
+
+
+def is_polyT(batch):
+    return (batch.seq_len > 0) & (batch.lead_T == batch.seq_len)
+
+
+def is_polyA(batch):
+    return (batch.seq_len > 0) & (batch.trail_A == batch.seq_len)
@@ -0,0 +1,73 @@
+"""
+Per-contig read budget for bridge and link evidence.
+
+A few contigs (e.g. over mitochondrial or histone genes) can have hundreds of
+thousands of aligned reads. Past the budget, reads are kept in a reservoir
+sample (algorithm R) seeded by the contig name, so results are reproducible
+between runs, and read counts are scaled by num_seen / num_sampled. With a
+time limit, reads are no longer consumed once it's hit, so the scaled counts
+only represent the reads seen by then. Either way, clv records of the contig
+are flagged by reads_subsampled.
+"""
+
+import time
+import zlib
+import random
+from collections import namedtuple
+
+
+ReadBudget = namedtuple('ReadBudget', [
+    'max_reads',                # 0 means no limit
+    'max_seconds',              # 0 means no limit
+])
+
+
+# how often the clock is checked while consuming reads
+TIME_CHECK_INTERVAL = 1024
+
+
+def gen_read_budget(max_reads=0, max_seconds=0):
+    """return None if there is no budget"""
+    if max_reads <= 0 and max_seconds <= 0:
+        return None
+    return ReadBudget(max_reads, max_seconds)
+
+
+def gen_seed(contig_name):
+    return zlib.crc32(contig_name.encode())
+
+
+def sample_reads(aligned_reads, read_budget, seed):
+    """
+    :param aligned_reads: an iterable of pysam.libcalignedsegment.AlignedSegment
+    :returns: a tuple of (sampled reads, num_seen, is_timed_out). The
+    sampled reads are all reads seen if the budget is never exceeded
+    """
+    max_reads, max_seconds = read_budget
+    if max_reads <= 0:
+        max_reads = float('inf')
+    deadline = time.monotonic() + max_seconds if max_seconds > 0 else None
+
+    rng = random.Random(seed)
+    sampled = []
+    num_seen = 0
+    for read in aligned_reads:
+        # checked before the first read, too, so contigs with fewer reads
+        # than TIME_CHECK_INTERVAL are time-limited as well
+        if (deadline is not None and num_seen % TIME_CHECK_INTERVAL == 0
+                and time.monotonic() > deadline):
+            return sampled, num_seen, True
+        if len(sampled) < max_reads:
+            sampled.append(read)
+        else:
+            k = rng.randrange(num_seen + 1)
+            if k < max_reads:
+                sampled[k] = read
+        num_seen += 1
+    return sampled, num_seen, False
+
+
+def scale_counts(dd, scale):
+    """scale read counts in an evidence holder in place"""
+    for key in dd:
+        dd[key] = int(round(dd[key] * scale))
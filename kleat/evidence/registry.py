@@ -0,0 +1,113 @@
+"""
+Registry of evidence types.
+
+Each evidence type registers an analyser, which writes its clv records of a
+contig and returns their clv keys, together with the data it needs. The data
+needs of the selected evidence types decide what is fetched per contig, e.g.
+reads aligned to a contig are only loaded if bridge or link is selected.
+Evidence types are run in the order of registration, which is also the order
+their records are written in.
+
+The built-in evidence types are declared here, so they can be parsed, e.g.
+for kleat.args, without importing kleat.proc, which registers their analysers.
+"""
+
+import time
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+
+
+CONTIG_ONLY = 'contig_only'     # only the contig alignment and sequence
+CLV_READS = 'clv_reads'         # reads overlapping the clv of a contig
+ALL_READS = 'all_reads'         # all reads aligned to a contig
+
+
+EvidenceType = namedtuple('EvidenceType', [
+    'name',
+    'data_needs',
+    'analyse',                  # func(contig, ctx) -> list of clv keys
+])
+
+
+EVIDENCE_TYPES = OrderedDict()
+
+
+def declare(name, data_needs):
+    """declare an evidence type, whose analyser is registered later"""
+    EVIDENCE_TYPES[name] = EvidenceType(name, data_needs, None)
+
+
+declare('suffix', CLV_READS)
+declare('bridge', ALL_READS)
+declare('link', ALL_READS)
+declare('blank', CONTIG_ONLY)
+
+
+def register(name, data_needs=None):
+    """
+    decorator to register an analyser
+
+    :param data_needs: None to keep those of an already declared evidence type
+    """
+    def decorator(analyse):
+        if data_needs is None:
+            this_needs = EVIDENCE_TYPES[name].data_needs
+        else:
+            this_needs = data_needs
+        EVIDENCE_TYPES[name] = EvidenceType(name, this_needs, analyse)
+        return analyse
+    return decorator
+
+
+def parse_evidence_types(names=None):
+    """
+    :param names: comma-separated names of evidence types, None for all
+    :returns: a tuple of names in the order of registration
+    """
+    if names is None:
+        return tuple(EVIDENCE_TYPES)
+    selected = {_.strip() for _ in names.split(',') if _.strip()}
+    unknown = selected - set(EVIDENCE_TYPES)
+    if unknown:
+        raise ValueError('unknown evidence type(s): {0}, choose from {1}'.format(
+            ', '.join(sorted(unknown)), ', '.join(EVIDENCE_TYPES)))
+    return tuple(_ for _ in EVIDENCE_TYPES if _ in selected)
+
+
+def needs(evidence_types, data_need):
+    return any(EVIDENCE_TYPES[_].data_needs == data_need for _ in evidence_types)
+
+
+@contextmanager
+def timed(stats, name):
+    """add seconds spent in the block to stats['seconds_<name>']"""
+    if stats is None:
+        yield
+        return
+    beg = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats['seconds_{0}'.format(name)] += time.perf_counter() - beg
+
+
+def format_stats(stats):
+    """
+    :param stats: a collections.Counter of seconds_* and records_*, and
+    cache_hits_* and cache_misses_* reported as hit rates, see hexamer.memo
+    """
+    parts = []
+    for key in sorted(stats):
+        if key.startswith('seconds_'):
+            parts.append('{0}: {1:.2f}s'.format(key[len('seconds_'):], stats[key]))
+        elif key.startswith('cache_misses_'):
+            continue
+        elif key.startswith('cache_hits_'):
+            name = key[len('cache_hits_'):]
+            hits = stats[key]
+            total = hits + stats['cache_misses_{0}'.format(name)]
+            parts.append('{0} cache hit rate: {1}/{2} ({3:.1%})'.format(
+                name, hits, total, hits / total if total else 0))
+        else:
+            parts.append('{0}: {1}'.format(key, stats[key]))
+    return ', '.join(parts)
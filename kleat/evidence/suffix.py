@@ -3,11 +3,17 @@ Utilities for analyzing suffix-specific evidence. Contigs here are always
 assumed to be suffix contigs
 """
 
+import numpy as np
+
+from kleat.evidence import read_batch
 from kleat.misc import apautils
-from kleat.misc.settings import ClvRecord
+from kleat.misc.contig_geometry import (
+    get_tail_side, get_is_hardclipped
+)
+from kleat.misc.contig_catalog import get_contig_clvs
 from kleat.hexamer.hexamer import (
     gen_contig_hexamer_tuple,
-    gen_reference_hexamer_tuple
+    gen_contig_reference_hexamer_tuple
 )
 
 
@@ -42,51 +48,79 @@ def calc_strand(tail_side):
 def is_a_suffix_read(read, contig, ctg_clv):
     """
     :param read: read
-    :param contig: a suffix contig
+    :param contig: a suffix contig, preferably a ContigGeometry so that its
+                   tail side isn't recomputed for every read
     :param tail_len: the tail length of the suffix_contig
 
     if it's a suffix read, return suffix_read_tail_len, else return None
     """
     set_A, set_T = {'A'}, {'T'}
+    tail_side = get_tail_side(contig)
     if not contig.is_reverse:
-        if apautils.left_tail(contig):
+        if tail_side == 'left':
             tail_len = ctg_clv - read.reference_start
             if set(read.query_sequence[0:tail_len]) == set_T:
                 return tail_len
-        elif apautils.right_tail(contig):
+        elif tail_side == 'right':
             tail_len = read.reference_end - ctg_clv - 1
             if set(read.query_sequence[-tail_len:]) == set_A:
                 return tail_len
     else:
         n_ctg_clv = contig.infer_query_length(always=True) - ctg_clv - 1
-        if apautils.left_tail(contig):
+        if tail_side == 'left':
             tail_len = read.reference_end - n_ctg_clv - 1
             if set(read.query_sequence[-tail_len:]) == set_A:
                 return tail_len
-        elif apautils.right_tail(contig):
+        elif tail_side == 'right':
             tail_len = n_ctg_clv - read.reference_start
             if set(read.query_sequence[0:tail_len]) == set_T:
                 return tail_len
 
 
+def is_a_suffix_read_batch(batch, contig, ctg_clv):
+    """
+    array-wise is_a_suffix_read for a ReadBatch
+
+    :returns: a tuple of (is_suffix, tail_len) arrays, tail_len is only
+    meaningful where is_suffix is True
+    """
+    tail_side = get_tail_side(contig)
+    if not contig.is_reverse:
+        if tail_side == 'left':
+            tail_len = ctg_clv - batch.reference_start
+            return read_batch.match_leading_T(batch, tail_len), tail_len
+        elif tail_side == 'right':
+            tail_len = batch.reference_end - ctg_clv - 1
+            return read_batch.match_trailing_A(batch, tail_len), tail_len
+    else:
+        n_ctg_clv = contig.infer_query_length(always=True) - ctg_clv - 1
+        if tail_side == 'left':
+            tail_len = batch.reference_end - n_ctg_clv - 1
+            return read_batch.match_trailing_A(batch, tail_len), tail_len
+        elif tail_side == 'right':
+            tail_len = n_ctg_clv - batch.reference_start
+            return read_batch.match_leading_T(batch, tail_len), tail_len
+    num_reads = batch.seq_len.shape[0]
+    return np.zeros(num_reads, dtype=bool), np.zeros(num_reads, dtype=np.int64)
+
+
 def analyze_suffix_reads(r2c_bam, contig, ctg_clv):
     """
     :param contig: suffix contig
     """
-    num_suffix_reads, max_tail_len = 0, 0
     if not contig.is_reverse:
         reads = r2c_bam.fetch(contig.query_name, ctg_clv, ctg_clv + 1)
     else:
         rev_ctg_clv = contig.infer_query_length(always=True) - ctg_clv - 1
         reads = r2c_bam.fetch(contig.query_name, rev_ctg_clv, rev_ctg_clv + 1)
 
-    for read in reads:
-        if read.is_unmapped:
-            continue
-        tail_len = is_a_suffix_read(read, contig, ctg_clv)
-        if tail_len is not None:
-            max_tail_len = max(max_tail_len, tail_len)
-            num_suffix_reads += 1
+    batch = read_batch.load_read_batch(reads)
+    is_suffix, tail_lens = is_a_suffix_read_batch(batch, contig, ctg_clv)
+    is_suffix &= ~batch.is_unmapped
+
+    num_suffix_reads, max_tail_len = int(is_suffix.sum()), 0
+    if num_suffix_reads > 0:
+        max_tail_len = max(max_tail_len, int(tail_lens[is_suffix].max()))
     return num_suffix_reads, max_tail_len
 
 
@@ -98,59 +132,50 @@ def calc_ctg_clv(strand, ctg_seq_len, ctg_tail_len):
     return ctg_clv
 
 
-def gen_clv_record(contig, r2c_bam, tail_side, ref_fa):
+def append_clv_record(buf, contig, r2c_bam, tail_side, ref_fa):
     """
+    :param buf: a record_buffer.ClvRecordBuffer
     :param contig: suffix contig
     :param r2c_bam: pysam instance of read2genome alignment BAM
     :param tail_side (TODO, rename to tail_direction): 'left' or 'right'
     :param ref_fa: pysam instance of reference genome fasta. if provided,
                    will also search PAS hexamer on reference genome.
+    :returns: a tuple of (strand, ref_clv) of the record appended
     """
-    strand = calc_strand(tail_side)
-    ref_clv = calc_ref_clv(contig, tail_side)
-    ctg_tail_len = apautils.calc_tail_length(contig, tail_side)
-    ctg_seq_len = contig.infer_query_length(always=True)
-    ctg_clv = calc_ctg_clv(strand, ctg_seq_len, ctg_tail_len)
+    clvs = get_contig_clvs(contig)
+    strand = clvs.suffix_strand
+    if strand != calc_strand(tail_side):
+        raise ValueError('inconsistent tail_side "{0}" for {1}'.format(tail_side, contig))
+    ref_clv = clvs.suffix_ref_clv
+    ctg_tail_len = clvs.suffix_ctg_tail_len
+    ctg_clv = clvs.suffix_ctg_clv
 
     num_suffix_reads, max_suffix_read_tail_len = analyze_suffix_reads(
         r2c_bam, contig, ctg_clv)
 
-    ctg_hex, ctg_hex_id, ctg_hex_pos = gen_contig_hexamer_tuple(
+    ctg_hex_tuple = gen_contig_hexamer_tuple(
         contig, strand, ref_clv, ref_fa, ctg_clv)
 
-    ref_hex, ref_hex_id, ref_hex_pos = gen_reference_hexamer_tuple(
-        ref_fa, contig.reference_name, strand, ref_clv)
+    ref_hex_tuple = gen_contig_reference_hexamer_tuple(
+        contig, strand, ref_clv, ref_fa, ctg_clv, ctg_hex_tuple)
 
-    return ClvRecord(
+    buf.append(
         contig.reference_name,
         strand,
         ref_clv,
 
-        ctg_hex,
-        ctg_hex_id,
-        ctg_hex_pos,
-
-        ref_hex,
-        ref_hex_id,
-        ref_hex_pos,
+        ctg_hex_tuple,
+        ref_hex_tuple,
 
         evidence_type='suffix',
         contig_id_at_pos='{0}@{1}'.format(contig.query_name, ctg_clv),
+        contig_is_hardclipped=get_is_hardclipped(contig),
         contig_len=contig.query_length,
         contig_mapq=contig.mapq,
-        contig_is_hardclipped=apautils.is_hardclipped(contig),
 
         num_suffix_reads=num_suffix_reads,
         max_suffix_read_tail_len=max_suffix_read_tail_len,
         suffix_contig_tail_len=ctg_tail_len,
         num_suffix_contigs=1,
-
-        num_bridge_reads=0,
-        max_bridge_read_tail_len=0,
-        num_bridge_contigs=0,
-
-        num_link_reads=0,
-        num_link_contigs=0,
-
-        num_blank_contigs=0,
     )
+    return strand, ref_clv
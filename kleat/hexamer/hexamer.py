@@ -1,6 +1,41 @@
-from kleat.hexamer.search import search, search_ref_genome
+from kleat.hexamer.search import search, search_ref_genome, gen_coords
+from kleat.hexamer.scan import scan_batch, scan_profile_batch
+from kleat.hexamer.memo import get_cache, count
 from kleat.misc import apautils
-from kleat.hexamer import xseq_plus, xseq_minus
+from kleat.misc.contig_geometry import (
+    ContigGeometry, get_identical_spans, get_ref_hexamer_cache
+)
+from kleat.misc.ref_identity import is_ref_identical
+from kleat.hexamer import xseq, xseq_plus, xseq_minus
+
+
+NA_HEX_TUPLE = 'NA', -1, -1     # hex, hex_id, hex_pos
+
+# if True, reference hexamers are left to post.add_ref_hexamers, i.e. searched
+# once per site after aggregation, see defer_ref_hexamers
+_ref_hexamers_deferred = False
+
+
+def defer_ref_hexamers(deferred=True):
+    """
+    if deferred, reference hexamer tuples are NA_HEX_TUPLE in this process
+    """
+    global _ref_hexamers_deferred
+    _ref_hexamers_deferred = deferred
+
+
+def is_ref_hexamers_deferred():
+    return _ref_hexamers_deferred
+
+
+# if True, contig hexamer tuples are reused as reference ones when the
+# upstream window is alignment-identical, see reuse_identical_windows
+_identical_windows_reused = False
+
+
+def reuse_identical_windows(reused=True):
+    global _identical_windows_reused
+    _identical_windows_reused = reused
 
 
 # TODO: remove default value for window
@@ -12,6 +47,11 @@ def extract_seq(contig, strand, ref_clv, ref_fa, ctg_clv, window=50):
                     contig and reference genome
     :param ctg_clv: the position of clv in contig coordinate.
     """
+    if isinstance(contig, ContigGeometry):
+        # may have been extracted together with other windows of the contig
+        query = (strand, ctg_clv, ref_clv)
+        return xseq.extract_contig_windows(contig, ref_fa, [query], window)[0]
+
     seqname = contig.reference_name
 
     # TODO: this can be done in one step, but needs update a lot of tests
@@ -31,6 +71,14 @@ def extract_seq(contig, strand, ref_clv, ref_fa, ctg_clv, window=50):
         raise ValueError('unknown strand: "{0}"'.format(strand))
 
 
+def search_contig_window(strand, ref_clv, seq):
+    """search, memoized by window content if hexamer caches are enabled"""
+    cache = get_cache('ctg_hexamer')
+    if cache is None:
+        return search(strand, ref_clv, seq)
+    return cache.get((strand, ref_clv, seq), search, strand, ref_clv, seq)
+
+
 def gen_contig_hexamer_tuple(contig, strand, ref_clv, ref_fa, ctg_clv):
     """
     search PAS hexamer in contig, this ONLY works for suffix and link as the
@@ -40,7 +88,7 @@ def gen_contig_hexamer_tuple(contig, strand, ref_clv, ref_fa, ctg_clv):
     # designed to search reference genome sequence, rev_comp is taken care of
     # within the function
     ctg_seq = extract_seq(contig, strand, ref_clv, ref_fa, ctg_clv)
-    ctg_hex_tuple = search(strand, ref_clv, ctg_seq)
+    ctg_hex_tuple = search_contig_window(strand, ref_clv, ctg_seq)
 
     if ctg_hex_tuple is not None:
         return ctg_hex_tuple
@@ -48,12 +96,98 @@ def gen_contig_hexamer_tuple(contig, strand, ref_clv, ref_fa, ctg_clv):
         return 'NA', -1, -1     # ctg_hex, ctg_hex_id, ctg_hex_pos
 
 
-def gen_reference_hexamer_tuple(ref_fa, chrom_name, strand, ref_clv):
-    """search PAS hexamer in reference genome"""
-    na_tuple = 'NA', -1, -1     # ref_hex, ref_hex_id, ref_hex_pos
+def gen_reference_hexamer_tuple(ref_fa, chrom_name, strand, ref_clv, cache=None):
+    """
+    search PAS hexamer in reference genome
+
+    :param cache: if provided, a dict of already searched results keyed by
+    (chrom_name, strand, ref_clv), see get_ref_hexamer_cache. It's superseded
+    by the per-worker cache if hexamer caches are enabled, see memo
+    """
+    if _ref_hexamers_deferred:
+        return NA_HEX_TUPLE
+    key = (chrom_name, strand, ref_clv)
+    worker_cache = get_cache('ref_hexamer')
+    if worker_cache is not None:
+        return worker_cache.get(key, search_reference_hexamer, ref_fa, *key)
+    if cache is not None:
+        if key not in cache:
+            cache[key] = search_reference_hexamer(ref_fa, *key)
+        return cache[key]
+    return search_reference_hexamer(ref_fa, *key)
+
+
+def gen_contig_reference_hexamer_tuple(contig, strand, ref_clv, ref_fa, ctg_clv,
+                                       ctg_hex_tuple):
+    """
+    gen_reference_hexamer_tuple for a clv of a contig, whose upstream window
+    has been searched into ctg_hex_tuple. If enabled by
+    reuse_identical_windows, and the window of the contig is identical to
+    that of the reference genome per its cigar and MD/NM tags, ctg_hex_tuple
+    is the answer, too
+    """
+    if _identical_windows_reused and not _ref_hexamers_deferred:
+        beg, end = gen_coords(ref_clv, strand)
+        spans = get_identical_spans(contig)
+        if is_ref_identical(spans, strand, beg, end, ref_clv, ctg_clv):
+            count('ref_hexamers_from_identical_windows')
+            return ctg_hex_tuple
+    return gen_reference_hexamer_tuple(
+        ref_fa, contig.reference_name, strand, ref_clv,
+        cache=get_ref_hexamer_cache(contig))
+
+
+def search_reference_hexamer(ref_fa, chrom_name, strand, ref_clv):
     ref_hex_tuple = search_ref_genome(ref_fa, chrom_name, ref_clv, strand)
 
     if ref_hex_tuple is None:
-        return na_tuple
+        return NA_HEX_TUPLE
     else:
         return ref_hex_tuple
+
+
+def fetch_ref_windows(ref_fa, seqname, sites, window=50):
+    """
+    fetch upstream windows of sites of the same seqname, nearby windows are
+    fetched together
+
+    :param sites: a list of (strand, clv)
+    :returns: a tuple of (seqs, strands, coords) to be scanned, see
+    scan.scan_batch
+    """
+    seq_len = ref_fa.get_reference_length(seqname)
+    coords = [gen_coords(clv, strand, window) for strand, clv in sites]
+    pieces = []
+    for beg, end in coords:
+        if 0 <= beg and end <= seq_len:
+            pieces.append([(beg, end)])
+        else:
+            # e.g. around the ends of chrM
+            pieces.append([apautils.fetch_seq(ref_fa, seqname, beg, end)])
+    pieces = xseq.resolve_deferred_pieces(pieces, ref_fa, seqname)
+
+    seqs = [''.join(_) for _ in pieces]
+    strands = [_[0] for _ in sites]
+    # the same coordinates as passed to plus_search and minus_search
+    scan_coords = [end - 1 if strand == '+' else beg
+                   for strand, (beg, end) in zip(strands, coords)]
+    return seqs, strands, scan_coords
+
+
+def search_ref_hexamers(ref_fa, seqname, sites, window=50):
+    """
+    batched search_ref_genome for sites of the same seqname
+
+    :param sites: a list of (strand, clv)
+    :returns: a list of hexamer tuples, one per site
+    """
+    return [NA_HEX_TUPLE if _ is None else _
+            for _ in scan_batch(*fetch_ref_windows(ref_fa, seqname, sites, window))]
+
+
+def search_ref_hexamer_profiles(ref_fa, seqname, sites, window=50):
+    """
+    like search_ref_hexamers, but all hexamers found in the windows are
+    returned as scan.HexamerProfile, one per site
+    """
+    return scan_profile_batch(*fetch_ref_windows(ref_fa, seqname, sites, window))
@@ -0,0 +1,80 @@
+"""
+Per-worker memoization of PAS hexamer searches.
+
+Many contigs and bridge reads support the same (seqname, strand, ref_clv), and
+redundant contigs yield identical upstream windows, while the caches of
+ContigGeometry only live as long as a contig. Here, bounded LRU caches live
+as long as the worker process:
+
+* reference hexamer tuples keyed by site, i.e. (seqname, strand, ref_clv)
+* contig hexamer tuples keyed by window content, i.e. (strand, ref_clv,
+  sequence), as positions of the result depend on ref_clv, too
+
+Caches are disabled unless init_hexamer_caches is called with a positive
+size, e.g. in the initializer of a multiprocessing.Pool.
+
+Other per-worker counters of hexamer search shortcuts are kept here, too, and
+are reported together with the cache counters, see add_hexamer_stats.
+"""
+
+from collections import OrderedDict, Counter
+
+
+class LRUCache(object):
+    """a bounded dict evicting the least recently used key, with counters"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, func, *args):
+        """:returns: the cached value of key, or func(*args), which is cached"""
+        try:
+            val = self.data[key]
+        except KeyError:
+            self.misses += 1
+            val = self.data[key] = func(*args)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+            return val
+        self.hits += 1
+        self.data.move_to_end(key)
+        return val
+
+
+# name => LRUCache, only in this process
+CACHES = {}
+
+COUNTERS = Counter()
+
+
+def init_hexamer_caches(maxsize=0):
+    """:param maxsize: of each cache, 0 to disable caching"""
+    CACHES.clear()
+    if maxsize > 0:
+        CACHES['ref_hexamer'] = LRUCache(maxsize)
+        CACHES['ctg_hexamer'] = LRUCache(maxsize)
+
+
+def get_cache(name):
+    """:returns: an LRUCache, or None if caching is disabled"""
+    return CACHES.get(name)
+
+
+def count(name):
+    COUNTERS[name] += 1
+
+
+def add_hexamer_stats(stats):
+    """
+    add cache hits and misses since the last call to stats as
+    cache_hits_<name> and cache_misses_<name>, see registry.format_stats,
+    and other counters as they are
+    """
+    for name, cache in CACHES.items():
+        stats['cache_hits_{0}'.format(name)] += cache.hits
+        stats['cache_misses_{0}'.format(name)] += cache.misses
+        cache.hits = cache.misses = 0
+    stats.update(COUNTERS)
+    COUNTERS.clear()
@@ -0,0 +1,349 @@
+"""
+Single-pass PAS hexamer scanner.
+
+Instead of one rfind per candidate hexamer, a window is encoded once into
+2-bit codes and scanned with a rolling 12-bit code of the last 6 bases, which
+indexes a 4096-entry table of hexamer ranks (the position in the candidate
+list, i.e. 0 is the strongest). The minus strand uses a second table indexed
+by the same forward codes, whose entries are the ranks of their reverse
+complements, so no reverse complemented string is built. The cost of a scan
+doesn't depend on the number of candidate hexamers.
+
+Results are the same as searching candidates one by one with rfind: the
+strongest hexamer, and of its occurrences, the one closest to the clv, i.e.
+the rightmost on the plus strand and the leftmost on the minus strand.
+
+Candidates may be degenerate IUPAC motifs, which are expanded into all the
+hexamers they match when the table is compiled.
+
+For a single window, the Python loop of the scan is only faster than one
+str.rfind per candidate with many candidates, so tables of at most
+MAX_FIND_HEXAMERS plain (non-degenerate) motifs, e.g. the default one, are
+searched with str.rfind on the plus strand, and str.find of reverse
+complemented candidates on the minus strand. Batches of windows are always
+scanned, see scan_batch.
+"""
+
+from collections import namedtuple
+from itertools import product
+
+import numpy as np
+
+import kleat.misc.settings as S
+
+
+INVALID = 4                     # code of non-ACGT bases, e.g. N
+KMER_MASK = 4095                # 12 bits for 6 bases
+
+MAX_FIND_HEXAMERS = 24
+
+CODE_TABLE = bytearray([INVALID] * 256)
+for _code, _base in enumerate('ACGT'):
+    CODE_TABLE[ord(_base)] = _code
+    CODE_TABLE[ord(_base.lower())] = _code
+CODE_TABLE = bytes(CODE_TABLE)
+
+
+IUPAC_CODES = {
+    'A': 'A', 'C': 'C', 'G': 'G', 'T': 'T', 'U': 'T',
+    'R': 'AG', 'Y': 'CT', 'S': 'CG', 'W': 'AT', 'K': 'GT', 'M': 'AC',
+    'B': 'CGT', 'D': 'AGT', 'H': 'ACT', 'V': 'ACG',
+    'N': 'ACGT',
+}
+
+
+HexamerTable = namedtuple('HexamerTable', [
+    'hexamers',                 # (hexamer, hexamer id) in the order of ranks
+    'plus_ranks',               # a list of 4096 ranks, len(hexamers) if none
+    'minus_ranks',
+    'plus_rank_array',          # the same as numpy arrays, for scan_batch
+    'minus_rank_array',
+    'find_hexamers',            # (hexamer, reverse complement) in the order
+                                # of ranks, None if the table is scanned
+])
+
+
+HexamerProfile = namedtuple('HexamerProfile', [
+    'mask',                     # bit k is set if the hexamer of rank k is found
+    'nearest',                  # positions of found hexamers closest to the
+                                # clv, in the order of ranks
+])
+
+
+def encode_kmer(kmer):
+    code = 0
+    for base in kmer.encode().translate(CODE_TABLE):
+        if base == INVALID:
+            raise ValueError('only ACGT are supported in {0}'.format(kmer))
+        code = (code << 2) | base
+    return code
+
+
+def reverse_complement_code(code, k=6):
+    res = 0
+    for _ in range(k):
+        res = (res << 2) | (3 - (code & 3))
+        code >>= 2
+    return res
+
+
+def expand_iupac(motif):
+    """:returns: a list of hexamers matched by a (degenerate) motif"""
+    if len(motif) != 6:
+        raise ValueError('{0} is not a hexamer'.format(motif))
+    try:
+        choices = [IUPAC_CODES[_] for _ in motif.upper()]
+    except KeyError:
+        raise ValueError('unknown IUPAC code in {0}'.format(motif))
+    return [''.join(_) for _ in product(*choices)]
+
+
+def decode_kmer(code, k=6):
+    return ''.join('ACGT'[(code >> (2 * _)) & 3] for _ in reversed(range(k)))
+
+
+def compile_hexamer_table(hexamers=None, max_find_hexamers=MAX_FIND_HEXAMERS):
+    """
+    :param hexamers: a list of (motif, hexamer id) from the strongest to the
+    weakest, default to S.CANDIDATE_HEXAMERS. A hexamer matched by multiple
+    motifs takes the rank of the strongest one
+    :param max_find_hexamers: tables with more motifs than this, or with
+    degenerate ones, are scanned, see scan_plus and scan_minus
+    """
+    if hexamers is None:
+        hexamers = S.CANDIDATE_HEXAMERS
+    no_match = len(hexamers)
+    plus_ranks = [no_match] * (KMER_MASK + 1)
+    minus_ranks = [no_match] * (KMER_MASK + 1)
+    find_hexamers = []
+    for rank, (motif, _) in enumerate(hexamers):
+        hmrs = expand_iupac(motif)
+        for hmr in hmrs:
+            code = encode_kmer(hmr)
+            rc_code = reverse_complement_code(code)
+            plus_ranks[code] = min(plus_ranks[code], rank)
+            minus_ranks[rc_code] = min(minus_ranks[rc_code], rank)
+        if len(hmrs) == 1:
+            find_hexamers.append((hmrs[0], decode_kmer(rc_code)))
+    if len(find_hexamers) < no_match or no_match > max_find_hexamers:
+        find_hexamers = None
+    return HexamerTable(list(hexamers), plus_ranks, minus_ranks,
+                        np.array(plus_ranks), np.array(minus_ranks), find_hexamers)
+
+
+DEFAULT_TABLE = compile_hexamer_table()
+
+# the table used by default in this process, see set_hexamer_table
+_hexamer_table = DEFAULT_TABLE
+
+
+def set_hexamer_table(table):
+    global _hexamer_table
+    _hexamer_table = table
+
+
+def get_hexamer_table():
+    return _hexamer_table
+
+
+def scan_best(seq, ranks, no_match, keep_last):
+    """
+    :param keep_last: if True, the last of the best hexamers is kept,
+    otherwise the first
+    :returns: a tuple of (rank, index of the last base) of the best hexamer
+    """
+    best, best_idx = no_match, -1
+    code, valid_from = 0, 5
+    bases = seq.encode().translate(CODE_TABLE)
+    # the loop is duplicated to keep the tie breaking out of it
+    if keep_last:
+        for idx, base in enumerate(bases):
+            if base == INVALID:
+                valid_from = idx + 6
+                continue
+            code = ((code << 2) | base) & KMER_MASK
+            if idx >= valid_from and ranks[code] <= best:
+                best, best_idx = ranks[code], idx
+    else:
+        for idx, base in enumerate(bases):
+            if base == INVALID:
+                valid_from = idx + 6
+                continue
+            code = ((code << 2) | base) & KMER_MASK
+            if idx >= valid_from and ranks[code] < best:
+                best, best_idx = ranks[code], idx
+    return best, best_idx
+
+
+def find_plus(seq, right_coord, table):
+    seq = seq.upper()
+    left_coord = right_coord - len(seq) + 1
+    for (hmr, _), (motif, hid) in zip(table.find_hexamers, table.hexamers):
+        idx = seq.rfind(hmr)
+        if idx > -1:
+            return motif, hid, idx + left_coord
+
+
+def find_minus(seq, left_coord, table):
+    seq = seq.upper()
+    for (_, rc_hmr), (motif, hid) in zip(table.find_hexamers, table.hexamers):
+        idx = seq.find(rc_hmr)
+        if idx > -1:
+            return motif, hid, left_coord + idx + 5
+
+
+def scan_plus(seq, right_coord, table=None):
+    """same as search.plus_search"""
+    if table is None:
+        table = _hexamer_table
+    if table.find_hexamers is not None:
+        return find_plus(seq, right_coord, table)
+    rank, idx = scan_best(seq, table.plus_ranks, len(table.hexamers), keep_last=True)
+    if rank < len(table.hexamers):
+        hmr, hid = table.hexamers[rank]
+        return hmr, hid, right_coord - len(seq) + 1 + idx - 5
+
+
+def scan_minus(seq, left_coord, table=None):
+    """same as search.minus_search"""
+    if table is None:
+        table = _hexamer_table
+    if table.find_hexamers is not None:
+        return find_minus(seq, left_coord, table)
+    rank, idx = scan_best(seq, table.minus_ranks, len(table.hexamers), keep_last=False)
+    if rank < len(table.hexamers):
+        hmr, hid = table.hexamers[rank]
+        return hmr, hid, left_coord + idx
+
+
+def calc_batch_ranks(seqs, strands, table):
+    """
+    ranks of all hexamer positions of many windows, concatenated
+
+    :returns: a tuple of (ranks, starts, is_minus_seq), where starts are the
+    indexes of the first hexamer positions of windows in ranks
+    """
+    for strand in strands:
+        if strand not in ('+', '-'):
+            raise ValueError('unknown strand: {0}'.format(strand))
+    seq_lens = np.array([len(_) for _ in seqs], dtype=np.int64)
+    # windows are separated by an invalid base, and padded so that every
+    # window has at least one hexamer position
+    buf = ('N'.join(seqs) + 'N' * 6).encode().translate(CODE_TABLE)
+    codes = np.frombuffer(buf, dtype=np.uint8).astype(np.int64)
+    num_kmers = len(codes) - 5
+    starts = np.concatenate([[0], np.cumsum(seq_lens + 1)[:-1]])
+
+    is_invalid = codes == INVALID
+    codes[is_invalid] = 0
+    kmers = np.zeros(num_kmers, dtype=np.int64)
+    for k in range(6):
+        kmers = (kmers << 2) | codes[k: k + num_kmers]
+    num_invalid = np.concatenate([[0], np.cumsum(is_invalid)])
+    has_invalid = num_invalid[6:] > num_invalid[:-6]
+
+    seg_sizes = np.diff(np.append(starts, num_kmers))
+    is_minus_seq = np.array([_ == '-' for _ in strands])
+    is_minus = np.repeat(is_minus_seq, seg_sizes)
+    ranks = np.where(is_minus, table.minus_rank_array[kmers], table.plus_rank_array[kmers])
+    ranks[has_invalid] = len(table.hexamers)
+    return ranks, starts, is_minus_seq
+
+
+def calc_hexamer_pos(strand, coord, seq_len, idx):
+    """
+    :param idx: index of the first base of a hexamer in the window
+    :returns: the same position as returned by scan_plus or scan_minus
+    """
+    if strand == '+':
+        return coord - seq_len + 1 + idx
+    return coord + idx + 5
+
+
+def scan_batch(seqs, strands, coords, table=None):
+    """
+    scan many windows at once with numpy
+
+    :param coords: the right_coord of scan_plus or the left_coord of
+    scan_minus, depending on the strand of each window
+    :returns: a list of results of scan_plus or scan_minus, one per window
+    """
+    if table is None:
+        table = _hexamer_table
+    if not seqs:
+        return []
+    no_match = len(table.hexamers)
+    ranks, starts, is_minus_seq = calc_batch_ranks(seqs, strands, table)
+    num_kmers = len(ranks)
+    is_minus = np.repeat(is_minus_seq, np.diff(np.append(starts, num_kmers)))
+
+    # ties are broken by the rightmost hexamer on the plus strand and the
+    # leftmost one on the minus strand
+    idxes = np.arange(num_kmers)
+    scale = num_kmers + 1
+    keys = ranks * scale + np.where(is_minus, idxes, num_kmers - idxes)
+    best_keys = np.minimum.reduceat(keys, starts)
+    best_ranks = best_keys // scale
+    best_idxes = best_keys % scale
+    best_idxes = np.where(is_minus_seq, best_idxes, num_kmers - best_idxes) - starts
+
+    res = []
+    for strand, coord, seq, rank, idx in zip(
+            strands, coords, seqs, best_ranks.tolist(), best_idxes.tolist()):
+        if rank >= no_match:
+            res.append(None)
+            continue
+        hmr, hid = table.hexamers[rank]
+        res.append((hmr, hid, calc_hexamer_pos(strand, coord, len(seq), idx)))
+    return res
+
+
+def scan_profile_batch(seqs, strands, coords, table=None):
+    """
+    scan many windows at once for all hexamers found in them, see scan_batch
+    for the parameters
+
+    :returns: a list of HexamerProfile, one per window
+    """
+    if table is None:
+        table = _hexamer_table
+    if not seqs:
+        return []
+    ranks, starts, _ = calc_batch_ranks(seqs, strands, table)
+    found = np.flatnonzero(ranks < len(table.hexamers))
+    segs = np.searchsorted(starts, found, side='right') - 1
+
+    nearest = [{} for _ in seqs]
+    for idx, seg, rank in zip(found.tolist(), segs.tolist(), ranks[found].tolist()):
+        pos = calc_hexamer_pos(strands[seg], coords[seg], len(seqs[seg]), idx - starts[seg])
+        # the closest to the clv, i.e. the rightmost on the plus strand and
+        # the leftmost on the minus strand, found last and first, respectively
+        if strands[seg] == '+' or rank not in nearest[seg]:
+            nearest[seg][rank] = pos
+
+    res = []
+    for dd in nearest:
+        found_ranks = sorted(dd)
+        res.append(HexamerProfile(
+            sum(1 << _ for _ in found_ranks), tuple(dd[_] for _ in found_ranks)))
+    return res
+
+
+def best_in_window(profile, strand, clv, window, table=None):
+    """
+    derive the strongest hexamer of a window no larger than that of a
+    profile, i.e. the result of search.search with the window
+
+    :param profile: a HexamerProfile of the upstream window of clv
+    """
+    if table is None:
+        table = _hexamer_table
+    ranks = [k for k in range(len(table.hexamers)) if profile.mask >> k & 1]
+    for rank, pos in zip(ranks, profile.nearest):
+        if strand == '+':
+            is_inside = pos >= clv - window + 1
+        else:
+            is_inside = pos <= clv + window - 1
+        if is_inside:
+            hmr, hid = table.hexamers[rank]
+            return hmr, hid, pos
@@ -7,9 +7,8 @@ of a reference genome
 """
 
 
-import kleat.misc.settings as S
-from kleat.misc.apautils import reverse_complement
 from kleat.misc import apautils
+from kleat.hexamer.scan import scan_plus, scan_minus, scan_batch
 
 
 def gen_coords(clv, strand, window=50):
@@ -33,23 +32,14 @@ def plus_search(seq, right_coord):
     """
     :param right_coord: the coordinate of the rightmost base in `seq`
     """
-    seq = seq.upper()
-    left_coord = right_coord - len(seq) + 1
-    for (hmr, hid) in S.CANDIDATE_HEXAMERS:
-        idx = seq.rfind(hmr)
-        if idx > -1:
-            return hmr, hid, idx + left_coord
+    return scan_plus(seq, right_coord)
 
 
 def minus_search(seq, left_coord):
     """
     :param left_coord: the coordinate of the leftmost base in `seq`
     """
-    seq = reverse_complement(seq.upper())
-    for (hmr, hid) in S.CANDIDATE_HEXAMERS:
-        idx = seq.rfind(hmr)
-        if idx > -1:
-            return hmr, hid, len(seq) - idx + left_coord - 1
+    return scan_minus(seq, left_coord)
 
 
 def search_hexamer(region, strand, beg, end):
@@ -79,6 +69,25 @@ def search(strand, clv, seq, window=50):
     return res
 
 
+def search_batch(queries, window=50):
+    """
+    search for a list of (strand, clv, seq) queries, e.g. upstream windows of
+    many reads, identical queries are only searched once
+
+    return: a list of results of search, one per query
+    """
+    uniq = list(dict.fromkeys(queries))
+    strands, coords, seqs = [], [], []
+    for strand, clv, seq in uniq:
+        beg, end = gen_coords(clv, strand, window)
+        strands.append(strand)
+        # the same coordinates as passed to plus_search and minus_search
+        coords.append(end - 1 if strand == '+' else beg)
+        seqs.append(seq)
+    found = dict(zip(uniq, scan_batch(seqs, strands, coords)))
+    return [found[_] for _ in queries]
+
+
 def search_ref_genome(refseq, chrom, clv, strand, window=50):
     """
     Different from search, this function search hexamer on reference genome
@@ -0,0 +1,81 @@
+"""
+Configurable PAS hexamer table.
+
+A hexamer table file has one motif per line, followed by its strength, e.g.
+
+    # motif  strength
+    AATAAA   16
+    ATTAAA   15
+    AWTAAA   10
+
+Motifs may be degenerate IUPAC patterns. The strength is reported as the
+hexamer id (ctg_hex_id and ref_hex_id), the larger the stronger, so it must
+be non-negative as -1 is reserved for no hexamer found. Motifs of the same
+strength are preferred in the order of the file.
+
+The table is compiled once per process, see scan.compile_hexamer_table, and
+the ML dummy columns are generated from the same table, see
+gen_hexamer_dummy_cols.
+"""
+
+from kleat.hexamer.scan import compile_hexamer_table, set_hexamer_table, get_hexamer_table
+
+
+NA_HEXAMER = 'NA'
+
+
+def read_hexamer_file(path):
+    """:returns: a list of (motif, strength) from the strongest to the weakest"""
+    hexamers = []
+    with open(path) as inf:
+        for k, line in enumerate(inf):
+            fields = line.split('#')[0].split()
+            if not fields:
+                continue
+            if len(fields) != 2:
+                raise ValueError('line {0} of {1}: expected a motif and its strength'.format(
+                    k + 1, path))
+            motif, strength = fields[0].upper(), int(fields[1])
+            if strength < 0:
+                raise ValueError('line {0} of {1}: strength must be non-negative'.format(
+                    k + 1, path))
+            hexamers.append((motif, strength))
+    if not hexamers:
+        raise ValueError('no hexamer found in {0}'.format(path))
+    # sorted is stable, so motifs of the same strength keep the file order
+    return sorted(hexamers, key=lambda _: -_[1])
+
+
+def compile_hexamer_file(path=None):
+    """
+    compile the table in a file without using it for hexamer search, e.g. to
+    generate its ML dummy columns
+
+    :param path: None for the default table of S.CANDIDATE_HEXAMERS
+    """
+    hexamers = None if path is None else read_hexamer_file(path)
+    return compile_hexamer_table(hexamers)
+
+
+def load_hexamer_table(path=None):
+    """
+    compile the table in a file and use it for hexamer search in this
+    process, e.g. as the initializer of a multiprocessing.Pool
+
+    :param path: see compile_hexamer_file
+    """
+    table = compile_hexamer_file(path)
+    set_hexamer_table(table)
+    return table
+
+
+def get_hexamer_names(table=None):
+    """:returns: motifs of the table from the strongest to the weakest, then NA"""
+    if table is None:
+        table = get_hexamer_table()
+    return [_[0] for _ in table.hexamers] + [NA_HEXAMER]
+
+
+def gen_hexamer_dummy_cols(prefix, table=None):
+    """e.g. ctg_AATAAA, ..., ctg_NA for prefix ctg"""
+    return ['{0}_{1}'.format(prefix, _) for _ in get_hexamer_names(table)]
@@ -0,0 +1,153 @@
+from kleat.misc.apautils import fetch_seq
+from kleat.misc.calc_genome_offset import build_genome_offset_map
+from kleat.misc.cigar_engine import (
+    build_cigar_blocks, calc_window_ref_shifts, walk_plus, walk_minus
+)
+from kleat.misc.contig_catalog import get_contig_clvs
+from kleat.misc.contig_geometry import (
+    ContigGeometry, get_cigar_blocks, get_genome_offset_map
+)
+
+
+"""
+xseq: extract_seq for all clvs of a contig at once.
+
+Windows upstream of the clvs are planned as lists of slices by the shared
+cigar_engine, with one walk per strand for all clvs. Pieces of the reference
+genome (i.e. from BAM_CREF_SKIP) are deferred and fetched together afterwards.
+"""
+
+
+# deferred reference pieces within this distance are fetched in one go
+MAX_FETCH_GAP = 1000
+
+
+def extract_windows(cigartuples, ctg_seq, seqname, queries, ref_fa, window,
+                    blocks=None, offset_map=None, batch_fetch=True):
+    """
+    :param queries: a list of (strand, ctg_clv, ref_clv) tuples
+    :param batch_fetch: if False, every piece of the reference genome is
+    fetched when it's reached in the walk, same as before
+    :returns: a list of upstream sequences, one per query
+    """
+    for strand, _, _ in queries:
+        if strand not in ('+', '-'):
+            raise ValueError('unknown strand: "{0}"'.format(strand))
+
+    if blocks is None:
+        blocks = build_cigar_blocks(cigartuples)
+    if offset_map is None:
+        offset_map = build_genome_offset_map(cigartuples)
+
+    if batch_fetch:
+        seq_len = ref_fa.get_reference_length(seqname)
+
+        def fetch_ref(beg, end):
+            if 0 <= beg and end <= seq_len:
+                return (beg, end), end - beg
+            # the reference sequence may end up shorter, fetch it now
+            seq = fetch_seq(ref_fa, seqname, beg, end)
+            return seq, len(seq)
+    else:
+        def fetch_ref(beg, end):
+            seq = fetch_seq(ref_fa, seqname, beg, end)
+            return seq, len(seq)
+
+    res = [None] * len(queries)
+    for strand, walk in [('+', walk_plus), ('-', walk_minus)]:
+        qidx = [k for k, q in enumerate(queries) if q[0] == strand]
+        if not qidx:
+            continue
+        ctg_clvs = [queries[k][1] for k in qidx]
+        ref_clvs = [queries[k][2] for k in qidx]
+        ref_shifts = calc_window_ref_shifts(
+            blocks, offset_map, strand, ctg_clvs, ref_clvs, len(ctg_seq)).tolist()
+        pieces = walk(blocks, ctg_seq, ctg_clvs, ref_clvs, ref_shifts, window, fetch_ref)
+        for k, pcs in zip(qidx, pieces):
+            res[k] = pcs
+
+    if batch_fetch:
+        res = resolve_deferred_pieces(res, ref_fa, seqname)
+
+    for k, (strand, _, _) in enumerate(queries):
+        if strand == '+':
+            res[k] = ''.join(reversed(res[k]))[-window:]
+        else:
+            res[k] = ''.join(res[k])[:window]
+    return res
+
+
+def resolve_deferred_pieces(pieces_list, ref_fa, seqname):
+    """
+    replace the deferred (beg, end) pieces with sequences, fetching nearby
+    pieces together
+    """
+    spans = sorted({p for pcs in pieces_list for p in pcs if not isinstance(p, str)})
+    if not spans:
+        return pieces_list
+
+    clusters = []               # [beg, end] of each fetch
+    for beg, end in spans:
+        if clusters and beg <= clusters[-1][1] + MAX_FETCH_GAP:
+            clusters[-1][1] = max(clusters[-1][1], end)
+        else:
+            clusters.append([beg, end])
+
+    cluster_seqs = [ref_fa.fetch(seqname, beg, end) for beg, end in clusters]
+
+    span_seq_dd = {}
+    cidx = 0
+    for beg, end in spans:
+        while beg >= clusters[cidx][1]:
+            cidx += 1
+        cbeg = clusters[cidx][0]
+        span_seq_dd[(beg, end)] = cluster_seqs[cidx][beg - cbeg: end - cbeg]
+
+    return [[p if isinstance(p, str) else span_seq_dd[p] for p in pcs]
+            for pcs in pieces_list]
+
+
+def gen_contig_window_queries(contig, with_ends, with_suffix=True):
+    """
+    queries of the upstream windows needed by suffix, link and blank evidence
+
+    :param with_ends: whether to include windows of both ends of the contig,
+    which are needed by link and blank
+    :param with_suffix: whether to include the window of the suffix clv
+    """
+    clvs = get_contig_clvs(contig)
+    queries = []
+    if with_suffix and clvs.suffix_strand is not None:
+        queries.append((clvs.suffix_strand, clvs.suffix_ctg_clv, clvs.suffix_ref_clv))
+    if with_ends:
+        queries.append(('+', clvs.plus_ctg_clv, clvs.plus_ref_clv))
+        queries.append(('-', clvs.minus_ctg_clv, clvs.minus_ref_clv))
+    return queries
+
+
+def extract_contig_windows(contig, ref_fa, queries, window=50):
+    """
+    extract upstream windows of a ContigGeometry, windows already extracted
+    are cached in the contig so each is only extracted once
+
+    :param queries: a list of (strand, ctg_clv, ref_clv) tuples
+    """
+    cache = contig.windows
+    missing = list(dict.fromkeys(
+        q for q in queries if q + (window,) not in cache))
+
+    if missing:
+        seqs = extract_windows(
+            contig.cigartuples, contig.seq_with_hc, contig.reference_name,
+            missing, ref_fa, window,
+            blocks=get_cigar_blocks(contig),
+            offset_map=get_genome_offset_map(contig))
+        for q, seq in zip(missing, seqs):
+            cache[q + (window,)] = seq
+    return [cache[q + (window,)] for q in queries]
+
+
+def prefetch_windows(contig, ref_fa, queries, window=50):
+    """extract all windows in one go before they're requested by extract_seq"""
+    if isinstance(contig, ContigGeometry) and queries:
+        extract_contig_windows(contig, ref_fa, queries, window)
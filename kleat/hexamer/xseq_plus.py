@@ -1,53 +1,11 @@
 import kleat.misc.settings as S
-from kleat.misc.apautils import fetch_seq
 from kleat.misc.calc_genome_offset import calc_genome_offset
+from kleat.hexamer import xseq
 
 
 """xseq: extract_seq"""
 
 
-def do_match(ctg_e, ref_e, cigar_val, ctg_seq, ctg_clv):
-    """
-    :param ctg_e: contig end index
-    :param ref_e: reference end index
-    :param ctg_clv: cleavage site in contig coordinate
-    """
-    ctg_b = ctg_e - cigar_val
-    ref_b = ref_e - cigar_val
-
-    if ctg_e > ctg_clv:
-        if ctg_b <= ctg_clv:
-            seq_to_add = ctg_seq[ctg_b: ctg_clv + 1]
-        else:
-            seq_to_add = ''
-    else:
-        seq_to_add = ctg_seq[ctg_b: ctg_e]
-
-    next_ctg_e = ctg_b
-    next_ref_e = ref_b
-    return next_ctg_e, next_ref_e, seq_to_add
-
-
-def do_skip(ref_e, cigar_val, ref_fa, seqname, ref_clv):
-    """
-    :param ref_e: reference end index
-    :param ref_fa: a pysam.libcalignmentfile.AlignmentFile instance for reference genome
-    :param ref_clv: cleavage site in reference genome coordinate
-    """
-    ref_b = ref_e - cigar_val
-
-    if ref_e >= ref_clv:
-        if ref_b < ref_clv:
-            seq_to_add = fetch_seq(ref_fa, seqname, ref_b, ref_clv + 1)
-        else:
-            seq_to_add = ''
-    else:
-        seq_to_add = fetch_seq(ref_fa, seqname, ref_b, ref_e)
-
-    next_ref_e = ref_b
-    return next_ref_e, seq_to_add
-
-
 def init_ctg_end(ctg_seq):
     return len(ctg_seq)
 
@@ -78,57 +36,11 @@ def init_ref_end(ref_clv, cigartuples, ctg_clv, ctg_seq):
 
 def extract(cigartuples, ctg_seq, seqname, strand, ctg_clv, ref_clv, ref_fa, window):
     """
-    scan from Right to Left,
-
-    compared to minus strand, initialize contig end (ce) and reference end (fe)
-    instead of cb and fb
+    scan from Right => Left, see cigar_engine.walk_plus for the rules of each cigar
 
-    use fe instead of re because re is a Python module for regex
+    every piece of the reference genome is fetched separately when reached,
+    use xseq.extract_windows to extract multiple windows with batched fetches
     """
-    # aka. ctg_e: contig ending
-    ce = init_ctg_end(ctg_seq)
-    # aka: ref_e: reference genome ending
-    fe = init_ref_end(ref_clv, cigartuples, ctg_clv, ctg_seq)
-
-    res_seq = ''
-    for idx, (key, val) in enumerate(reversed(cigartuples)):
-        if key == S.BAM_CSOFT_CLIP or key == S.BAM_CHARD_CLIP:
-            cb = ce - val
-            if ce > ctg_clv:
-                if cb <= ctg_clv:  # meaning clip spans the clv
-                    seq = ctg_seq[cb: ctg_clv + 1]
-                    res_seq = seq + res_seq
-                ce -= val
-                fe -= val
-            else:
-                seq = ctg_seq[ce - val: ce]
-                res_seq = seq + res_seq
-                ce -= val
-                fe -= val
-
-        elif key == S.BAM_CMATCH:
-            ce, fe, seq = do_match(ce, fe, val, ctg_seq, ctg_clv)
-            res_seq = seq + res_seq
-
-        elif key == S.BAM_CREF_SKIP:
-            fe, seq = do_skip(fe, val, ref_fa, seqname, ref_clv)
-            res_seq = seq + res_seq
-
-        elif key == S.BAM_CDEL:
-            fe -= val
-
-        elif key == S.BAM_CINS:
-            cb = ce - val
-            res_seq = ctg_seq[cb: ce] + res_seq
-            ce = cb
-
-        else:
-            err = ("cigar '{0}' hasn't been delta properly "
-                   "for '{1}' strand, please report".format(key, strand))
-            raise NotImplementedError(err)
-
-        if len(res_seq) >= window:
-            res_seq = res_seq[-window:]
-            break
-
-    return res_seq
+    return xseq.extract_windows(
+        cigartuples, ctg_seq, seqname, [(strand, ctg_clv, ref_clv)], ref_fa,
+        window, batch_fetch=False)[0]
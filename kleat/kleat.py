@@ -1,21 +1,35 @@
 #!/usr/bin/env python
 
 import os
+import sys
 import logging
 import multiprocessing
+from collections import Counter
 
 import pandas as pd
 
 from kleat import polya
-from kleat.args import get_args
+from kleat import longread
+from kleat.args import get_args, get_prepare_reference_args
 from kleat.post import (
     cluster_clv_parallel,
     aggregate_polya_evidence,
     add_annot_info,
+    add_ref_hexamers,
+    add_ref_hexamer_profiles,
+    gen_profile_cols,
     add_hex_dist,
     add_extra
 )
+from kleat.evidence.read_budget import gen_read_budget
+from kleat.evidence.registry import format_stats
+from kleat.hexamer.table import load_hexamer_table
+from kleat.hexamer.memo import init_hexamer_caches
+from kleat.hexamer.hexamer import defer_ref_hexamers, reuse_identical_windows
 from kleat.misc import utils as U
+from kleat.misc.filters import gen_read_filter, gen_contig_filter, format_counter
+from kleat.misc.prefetch import split_thread_budget
+from kleat.misc.twobit import convert_fasta
 from kleat.misc import settings as S
 
 logging.basicConfig(
@@ -47,7 +61,31 @@ def dump_output_df(out_df, output, output_format):
         raise ValueError('unknown output format: {0}'.format(output_format))
 
 
+def prepare_reference(argv=None):
+    args = get_prepare_reference_args(argv)
+    output = args.output
+    if output is None:
+        output = '{0}.k2bit'.format(args.reference_genome)
+    U.backup_file(output)
+    logger.info('Converting {0} to {1} ...'.format(args.reference_genome, output))
+    index = convert_fasta(args.reference_genome, output)
+    logger.info('Converted {0} sequences'.format(len(index)))
+
+
+def init_worker(hexamer_table_file, hexamer_cache_size, deferred_ref_hexamers,
+                identical_windows_reused):
+    """set up hexamer search once per pool worker"""
+    load_hexamer_table(hexamer_table_file)
+    init_hexamer_caches(hexamer_cache_size)
+    defer_ref_hexamers(deferred_ref_hexamers)
+    reuse_identical_windows(identical_windows_reused)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'prepare-reference':
+        prepare_reference(sys.argv[2:])
+        return
+
     args = get_args()
     c2g_bam_file = args.contigs_to_genome
     r2c_bam_file = args.reads_to_contigs
@@ -55,14 +93,54 @@ def main():
     output = gen_output(args.output, args.output_format.lower())
     U.backup_file(output)
 
-    args_list = polya.prepare_args_for_collect_polya_evidence(
-        args.num_cpus, output, c2g_bam_file,
-        r2c_bam_file, ref_fa_file, args.bridge_skip_check_size
-    )
+    contig_filter = gen_contig_filter(
+        args.contig_flag_mask, args.min_contig_mapq,
+        args.min_contig_aligned_len, args.max_contig_clip_fraction)
+    io_threads = split_thread_budget(args.io_threads, args.num_cpus)
+    if io_threads > 0:
+        logger.info('Using {0} io threads per worker'.format(io_threads))
+    read_budget = gen_read_budget(args.max_reads_per_contig, args.max_seconds_per_contig)
+    if args.hexamer_table is not None:
+        table = load_hexamer_table(args.hexamer_table)
+        logger.info('Using {0} PAS hexamer motifs from {1}'.format(
+            len(table.hexamers), args.hexamer_table))
+    if args.long_reads:
+        # c2g_bam_file is a read-to-genome alignment here
+        args_list = polya.prepare_args_for_collect_polya_evidence(
+            args.num_cpus, output, c2g_bam_file,
+            ref_fa_file, contig_filter, args.library_strandedness, io_threads,
+            args.cache_chromosome
+        )
+        collect_func = longread.collect_long_read_evidence_wrapper
+    else:
+        args_list = polya.prepare_args_for_collect_polya_evidence(
+            args.num_cpus, output, c2g_bam_file,
+            r2c_bam_file, ref_fa_file, args.bridge_skip_check_size,
+            args.dedup_contigs,
+            gen_read_filter(args.read_flag_mask, args.min_read_mapq, args.min_read_aligned_len),
+            contig_filter,
+            read_budget,
+            args.evidence,
+            args.library_strandedness,
+            args.mate_index,
+            io_threads,
+            args.r2c_locality_order,
+            args.cache_chromosome
+        )
+        collect_func = polya.collect_polya_evidence_wrapper
 
     logger.info('Processing contigs in parallel with {0} CPUs...'.format(args.num_cpus))
-    with multiprocessing.Pool(args.num_cpus) as p:
-        tmp_tsv_files = p.map(polya.collect_polya_evidence_wrapper, args_list)
+    with multiprocessing.Pool(args.num_cpus, initializer=init_worker,
+                              initargs=(args.hexamer_table, args.hexamer_cache_size,
+                                        args.defer_ref_hexamers,
+                                        args.skip_identical_ref_hexamers)) as p:
+        res = p.map(collect_func, args_list)
+    tmp_tsv_files = [_[0] for _ in res]
+    dropped = sum((_[1] for _ in res), Counter())
+    if dropped:
+        logger.info('Dropped by filters or budgets: {0}'.format(format_counter(dropped)))
+    stats = sum((_[2] for _ in res), Counter())
+    logger.info('Evidence stats: {0}'.format(format_stats(stats)))
 
     logger.info('Reading {0} files into a single pandas.DataFrame...'.format(len(tmp_tsv_files)))
     dfs = []
@@ -70,6 +148,9 @@ def main():
         _df = pd.read_csv(f, keep_default_na=False, sep='\t')
         dfs.append(_df)
     df_clv = pd.concat(dfs)
+    if read_budget is None:
+        # reads are never subsampled without a read budget
+        df_clv.drop(S.READ_BUDGET_COLS, axis=1, inplace=True)
     logger.info('df.shape: {0}'.format(df_clv.shape))
 
     # remove file in a separate loop in case exit none-zero and still have
@@ -94,6 +175,18 @@ def main():
     logger.info('Aggregating polya evidence for each (seqname, strand, clv)...')
     df_agg = aggregate_polya_evidence(df_clv, args.num_cpus)
 
+    if args.defer_ref_hexamers:
+        logger.info('Searching PAS hexamers on reference genome per clv...')
+        df_agg = add_ref_hexamers(df_agg, ref_fa_file)
+
+    output_header = S.OUTPUT_HEADER
+    if read_budget is not None:
+        output_header = output_header + S.OUTPUT_READ_BUDGET_COLS
+    if args.hexamer_profile_windows is not None:
+        logger.info('Profiling PAS hexamers on reference genome per clv...')
+        df_agg = add_ref_hexamer_profiles(df_agg, ref_fa_file, args.hexamer_profile_windows)
+        output_header = output_header + gen_profile_cols(args.hexamer_profile_windows)
+
     logger.info('Calculating closest annotated clv...')
     df_ant_dist = add_annot_info(df_agg, args.karbor_clv_annotation)
 
@@ -104,7 +197,7 @@ def main():
     logger.info('Writing to {0}...'.format(output))
     out_df = df_hex_dist.rename(columns=S.FORMAT_OUTPUT_HEADER_DD)
 
-    out_df = out_df[S.OUTPUT_HEADER]
+    out_df = out_df[output_header]
     out_df.sort_values(['seqname', 'strand', 'clv'], inplace=True)
     dump_output_df(out_df, output, args.output_format)
     logger.info('Completed writing to {0}...'.format(output))
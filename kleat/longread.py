@@ -0,0 +1,266 @@
+"""
+Assembly-free long-read mode.
+
+Long reads (e.g. Iso-Seq or nanopore cDNA) often span the whole 3'UTR
+including the polyA tail, so each read aligned to the genome is analyzed as
+if it were a suffix contig, without assembly or a read-to-contig alignment.
+
+To keep memory bounded for tens of millions of reads, the read-to-genome BAM
+is streamed in chunks. Upstream windows of the tailed reads in a chunk are
+searched for PAS hexamers in one batch, with identical windows searched once,
+and evidence is aggregated per clv on the map side. As the BAM is
+coordinate-sorted, clvs before the start of the last read of a chunk are
+final, so they are written out (with their reference hexamers searched in
+one batch) and dropped from memory.
+"""
+
+import csv
+import logging
+from collections import Counter
+from itertools import islice
+
+import pysam
+
+from kleat.misc.contig_geometry import (
+    ContigGeometry, get_cigar_blocks, get_genome_offset_map
+)
+from kleat.misc.contig_catalog import assign_contig_clvs
+from kleat.misc.strandedness import calc_transcript_strand, is_on_strand
+from kleat.misc.filters import filter_contigs, format_counter
+from kleat.misc.chrom_cache import open_reference
+from kleat.misc.record_buffer import ClvRecordBuffer
+from kleat.misc import clv_key as CK
+from kleat.misc import settings as S
+from kleat.hexamer.search import search_batch
+from kleat.hexamer.hexamer import (
+    NA_HEX_TUPLE, search_ref_hexamers, is_ref_hexamers_deferred
+)
+from kleat.hexamer.xseq import extract_windows
+
+logger = logging.getLogger(__name__)
+
+
+# number of reads loaded per chunk
+CHUNK_SIZE = 10000
+
+# size of upstream window searched for PAS hexamers
+WINDOW = 50
+
+
+class ClvTally(object):
+    """map-side aggregate of the tailed reads supporting one clv"""
+    __slots__ = (
+        'num_reads',
+        'max_tail_len',
+        'max_read_len',
+        'max_mapq',
+        'any_hardclipped',
+        'hex_tuple',            # the strongest PAS hexamer found in the reads
+        'read_id_at_pos',       # of the first read, as a representative
+    )
+
+    def __init__(self, read_id_at_pos):
+        self.num_reads = 0
+        self.max_tail_len = 0
+        self.max_read_len = 0
+        self.max_mapq = 0
+        self.any_hardclipped = False
+        self.hex_tuple = NA_HEX_TUPLE
+        self.read_id_at_pos = read_id_at_pos
+
+    def update(self, read, tail_len, hex_tuple):
+        self.num_reads += 1
+        self.max_tail_len = max(self.max_tail_len, tail_len)
+        self.max_read_len = max(self.max_read_len, read.query_length)
+        self.max_mapq = max(self.max_mapq, read.mapq)
+        self.any_hardclipped = self.any_hardclipped or read.is_hardclipped
+        # same as agg_polya_evidence_per, the first strongest one wins
+        if hex_tuple[1] > self.hex_tuple[1]:
+            self.hex_tuple = hex_tuple
+
+
+def gen_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def may_have_tail(read):
+    """checks cigar only, so that most reads are dropped before decoding sequence"""
+    if read.query_length == 0:  # e.g. secondary alignments without SEQ
+        return False
+    cgt = read.cigartuples
+    return cgt[0][0] == S.BAM_CSOFT_CLIP or cgt[-1][0] == S.BAM_CSOFT_CLIP
+
+
+def load_tailed_reads(reads):
+    """:returns: a list of ContigGeometry of reads with polyA/T tails"""
+    res = []
+    for read in reads:
+        if not may_have_tail(read):
+            continue
+        read = ContigGeometry(read)
+        if read.tail_side is not None:
+            res.append(read)
+    return res
+
+
+def extract_read_windows(reads, ref_fa, window=WINDOW):
+    """
+    :param reads: a list of ContigGeometry with clvs assigned
+    :returns: a list of upstream sequences, one per read
+    """
+    res = []
+    for read in reads:
+        clvs = read.clvs
+        res.extend(extract_windows(
+            read.cigartuples, read.seq_with_hc, read.reference_name,
+            [(clvs.suffix_strand, clvs.suffix_ctg_clv, clvs.suffix_ref_clv)],
+            ref_fa, window, blocks=get_cigar_blocks(read),
+            offset_map=get_genome_offset_map(read)))
+    return res
+
+
+def tally_chunk(reads, ref_fa, tallies, strandedness=None, counter=None,
+                window=WINDOW):
+    """
+    update tallies, a dict keyed by clv_key.encode_clv_key, with the tailed
+    reads of a chunk
+
+    :param reads: a list of ContigGeometry with clvs assigned
+    :param strandedness: if stranded, reads whose tails imply a clv on the
+    other strand are pruned
+    """
+    if strandedness is not None:
+        kept = []
+        for read in reads:
+            transcript_strand = calc_transcript_strand(read, strandedness)
+            if is_on_strand(read.clvs.suffix_strand, transcript_strand):
+                kept.append(read)
+            elif counter is not None:
+                counter['clvs_pruned_by_strand'] += 1
+        reads = kept
+
+    seqs = extract_read_windows(reads, ref_fa, window)
+    hex_tuples = search_batch(
+        [(_.clvs.suffix_strand, _.clvs.suffix_ref_clv, seq)
+         for _, seq in zip(reads, seqs)], window)
+
+    for read, hex_tuple in zip(reads, hex_tuples):
+        clvs = read.clvs
+        key = CK.encode_clv_key(read.reference_id, clvs.suffix_strand, clvs.suffix_ref_clv)
+        tally = tallies.get(key)
+        if tally is None:
+            tally = tallies[key] = ClvTally(
+                '{0}@{1}'.format(read.query_name, clvs.suffix_ctg_clv))
+        tally.update(read, clvs.suffix_ctg_tail_len,
+                     NA_HEX_TUPLE if hex_tuple is None else hex_tuple)
+
+
+def pop_final_tallies(tallies, before=None):
+    """
+    pop tallies of clvs before a position, or all of them if before is None
+
+    :returns: a list of (clv_key, ClvTally) sorted by clv_key
+    """
+    if before is None:
+        keys = list(tallies)
+    else:
+        keys = [_ for _ in tallies if CK.decode_clv_key(_)[2] < before]
+    return [(_, tallies.pop(_)) for _ in sorted(keys)]
+
+
+def write_tallies(final_tallies, seqname, ref_fa, buf, window=WINDOW):
+    """:param buf: a record_buffer.ClvRecordBuffer"""
+    sites = [CK.decode_clv_key(_)[1:] for _, __ in final_tallies]
+    if is_ref_hexamers_deferred():
+        ref_hex_tuples = [NA_HEX_TUPLE] * len(sites)
+    else:
+        ref_hex_tuples = search_ref_hexamers(ref_fa, seqname, sites, window)
+    for (strand, clv), (_, tally), ref_hex_tuple in zip(
+            sites, final_tallies, ref_hex_tuples):
+        append_clv_record(buf, seqname, strand, clv, tally, ref_hex_tuple)
+    buf.maybe_flush()
+
+
+def append_clv_record(buf, seqname, strand, clv, tally, ref_hex_tuple):
+    buf.append(
+        seqname,
+        strand,
+        clv,
+
+        tally.hex_tuple,
+        ref_hex_tuple,
+
+        evidence_type='suffix',
+        contig_id_at_pos=tally.read_id_at_pos,
+        contig_is_hardclipped=tally.any_hardclipped,
+        contig_len=tally.max_read_len,
+        contig_mapq=tally.max_mapq,
+
+        # each read is both a suffix contig and a suffix read of itself
+        num_suffix_reads=tally.num_reads,
+        max_suffix_read_tail_len=tally.max_tail_len,
+        suffix_contig_tail_len=tally.max_tail_len,
+        num_suffix_contigs=tally.num_reads,
+    )
+
+
+def collect_long_read_evidence(seqname, tmp_output_file, r2g_bam_file, ref_fa_file,
+                               read_filter=None, strandedness=None, io_threads=0,
+                               cache_chromosome=False, chunk_size=CHUNK_SIZE):
+    """
+    stream reads aligned to a seqname and collect suffix evidence from their
+    polyA/T tails
+
+    :param r2g_bam_file: a coordinate-sorted read-to-genome alignment BAM
+    :param read_filter: a filters.ContigFilter, as reads take the place of
+    contigs here
+    :param strandedness: see strandedness.STRANDEDNESS_CHOICES
+    :param io_threads: htslib decompression threads for r2g_bam
+    :param cache_chromosome: see chrom_cache
+    :returns: the tmp output file, a collections.Counter of dropped
+    alignments, and a collections.Counter of stats
+    """
+    logging.info('collecting long-read polyA evidence for {0} to {1} ...'.format(
+        seqname, tmp_output_file))
+
+    counter = Counter()
+    stats = Counter()
+    r2g_bam = pysam.AlignmentFile(r2g_bam_file, threads=max(io_threads, 1))
+    ref_fa = open_reference(ref_fa_file, cache_chromosome)
+
+    tallies = {}
+    with open(tmp_output_file, 'wt') as opf:
+        csv.writer(opf, delimiter='\t').writerow(S.HEADER)
+        buf = ClvRecordBuffer(opf)
+        reads = (_ for _ in r2g_bam.fetch(seqname) if not _.is_unmapped)
+        if read_filter is not None:
+            reads = filter_contigs(reads, read_filter, counter)
+        for chunk in gen_chunks(reads, chunk_size):
+            stats['reads_seen'] += len(chunk)
+            tailed = load_tailed_reads(chunk)
+            stats['reads_tailed'] += len(tailed)
+            if tailed:
+                assign_contig_clvs(tailed)
+                tally_chunk(tailed, ref_fa, tallies, strandedness, counter)
+            final = pop_final_tallies(tallies, chunk[-1].reference_start)
+            write_tallies(final, seqname, ref_fa, buf)
+            stats['records_suffix'] += len(final)
+        final = pop_final_tallies(tallies)
+        write_tallies(final, seqname, ref_fa, buf)
+        stats['records_suffix'] += len(final)
+        buf.flush()
+
+    if counter:
+        logging.info('dropped for {0}: {1}'.format(seqname, format_counter(counter)))
+    logging.info('collecting long-read polyA evidence for {0} to {1} is done'.format(
+        seqname, tmp_output_file))
+    return tmp_output_file, counter, stats
+
+
+def collect_long_read_evidence_wrapper(args):
+    return collect_long_read_evidence(*args)
@@ -81,6 +81,22 @@ def fetch_seq(pysam_fa, seqname, beg, end):
     return res
 
 
+def calc_hardclips(cigartuples):
+    """
+    calculate the number of bases hard clipped at both ends, given cigartuples
+    of a contig
+    """
+    first_idx, last_idx = 0, len(cigartuples) - 1
+    left_hc, right_hc = 0, 0    # hc: hardclip
+    for k, (key, val) in enumerate(cigartuples):
+        if key == S.BAM_CHARD_CLIP:
+            if k == first_idx:
+                left_hc += val
+            elif k == last_idx:
+                right_hc += val
+    return left_hc, right_hc
+
+
 def is_hardclipped(contig):
     for (key, val) in contig.cigartuples:
         if key == S.BAM_CHARD_CLIP:
@@ -182,7 +198,3 @@ def calc_tail_length(suffix_segment, tail_side=None):
                          '{1} CIGAR is not BAM_CSOFT_CLIP ({2})'.format(
                              tail_side, cigar_idx, S.BAM_CSOFT_CLIP))
     return the_cigar[1]
-
-
-def write_row(clv_record, csvwriter):
-    csvwriter.writerow([getattr(clv_record, _) for _ in S.HEADER])
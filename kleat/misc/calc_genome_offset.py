@@ -1,3 +1,7 @@
+from collections import namedtuple
+
+import numpy as np
+
 import kleat.misc.settings as S
 
 
@@ -148,3 +152,152 @@ def calc_genome_offset(cigartuples, ctg_clv, tail_side='left', skip_check_size=N
         ref_offset = ref_seq_len - ref_offset - 1
 
     return ref_offset
+
+
+"""
+Below is an indexed version of calc_genome_offset. As the CIGAR of a contig is
+fixed, the contig and genome coordinates of every CIGAR block are precomputed
+once into a block map, after which a ctg_clv is mapped to its genome offset by
+binary search instead of walking the whole CIGAR. The semantics (clips,
+skip_check_size and insertions) are the same as calc_offset.
+"""
+
+
+# ctg_after: contig position after each block (a leading clip contributes 0);
+# ref_before: genome offset before each block;
+# last_is_skip/last_skip_size: state of calc_offset before each block;
+# lead_clip: size of the leading soft/hard clip, subtracted from ctg_clv;
+# num_supported: number of leading blocks calc_offset could handle
+BlockMap = namedtuple('BlockMap', [
+    'ops', 'lens', 'ctg_after', 'ref_before', 'last_is_skip', 'last_skip_size',
+    'lead_clip', 'num_supported', 'ref_end',
+])
+
+
+# block maps of the cigartuples in both directions, the reversed one serves
+# tail_side == 'left'
+GenomeOffsetMap = namedtuple('GenomeOffsetMap', [
+    'fwd', 'rev', 'ctg_seq_len', 'ref_seq_len',
+])
+
+
+SUPPORTED_CIGARS = {
+    S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP, S.BAM_CMATCH,
+    S.BAM_CREF_SKIP, S.BAM_CDEL, S.BAM_CINS,
+}
+
+
+def build_block_map(cigartuples):
+    ops, lens, ctg_after, ref_before, last_is_skip, last_skip_size = (
+        [], [], [], [], [], [])
+    ctg_pos, ref_pos = 0, 0
+    is_skip, skip_size = False, 0
+    lead_clip = 0
+    num_supported = None
+    for idx, (key, val) in enumerate(cigartuples):
+        if num_supported is None and key not in SUPPORTED_CIGARS:
+            num_supported = idx
+
+        ops.append(key)
+        lens.append(val)
+        ref_before.append(ref_pos)
+        last_is_skip.append(is_skip)
+        last_skip_size.append(skip_size)
+
+        if idx == 0 and key in (S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP):
+            lead_clip = val
+        elif key in (S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP, S.BAM_CMATCH):
+            ctg_pos += val
+            ref_pos += val
+        elif key in (S.BAM_CREF_SKIP, S.BAM_CDEL):
+            ref_pos += val
+            skip_size = val
+        elif key == S.BAM_CINS:
+            ctg_pos += val
+        ctg_after.append(ctg_pos)
+        is_skip = key == S.BAM_CREF_SKIP
+
+    if num_supported is None:
+        num_supported = len(ops)
+
+    return BlockMap(
+        np.array(ops, dtype=np.int64),
+        np.array(lens, dtype=np.int64),
+        np.array(ctg_after, dtype=np.int64),
+        np.array(ref_before, dtype=np.int64),
+        np.array(last_is_skip, dtype=bool),
+        np.array(last_skip_size, dtype=np.int64),
+        lead_clip,
+        num_supported,
+        ref_pos,
+    )
+
+
+def query_block_map(block_map, ctg_clvs, skip_check_size):
+    """array-wise calc_offset using a precomputed block map"""
+    bm = block_map
+    ctg_clvs = np.asarray(ctg_clvs, dtype=np.int64) - bm.lead_clip
+
+    # calc_offset stops at the first block after which ctg_pos > ctg_clv
+    blk = np.searchsorted(bm.ctg_after, ctg_clvs, side='right')
+    num_blocks = bm.ops.shape[0]
+    if bm.num_supported < num_blocks and np.any(blk >= bm.num_supported):
+        key, val = (bm.ops[bm.num_supported], bm.lens[bm.num_supported])
+        err_msg = (' S.BAM_CEQUA, S.BAM_CDIFF & S.BAM_CPAD & BAM_CBACK '
+                   'cigar value are note implemented yet. Please report. '
+                   'Your cigar: ({0}, {1})\n'
+                   '{2}'.format(key, val, S.CIGAR_TABLE))
+        raise NotImplementedError(err_msg)
+
+    res = np.full(ctg_clvs.shape, bm.ref_end, dtype=np.int64)
+    within = blk < num_blocks
+    if not np.any(within):
+        return res
+
+    b = blk[within]
+    clvs = ctg_clvs[within]
+    ops, lens, ref_before = bm.ops[b], bm.lens[b], bm.ref_before[b]
+    is_skip_or_del = (ops == S.BAM_CREF_SKIP) | (ops == S.BAM_CDEL)
+    is_clip = (ops == S.BAM_CSOFT_CLIP) | (ops == S.BAM_CHARD_CLIP)
+    ctg_before = bm.ctg_after[b] - np.where(is_skip_or_del, 0, lens)
+
+    # BAM_CMATCH and non-leading clips, see do_match
+    next_ref_pos = ref_before + clvs - ctg_before
+    if skip_check_size is not None:
+        too_close = bm.last_is_skip[b] & (clvs - ctg_before < skip_check_size)
+        next_ref_pos = np.where(
+            too_close, ref_before - bm.last_skip_size[b] - 1, next_ref_pos)
+
+    is_lead_clip = (b == 0) & is_clip
+    out = np.where(
+        is_skip_or_del,
+        ref_before + lens,
+        np.where(ops == S.BAM_CINS, ref_before, next_ref_pos))
+    res[within] = np.where(is_lead_clip, ref_before, out)
+    return res
+
+
+def build_genome_offset_map(cigartuples):
+    cigartuples = tuple(cigartuples)
+    return GenomeOffsetMap(
+        build_block_map(cigartuples),
+        build_block_map(tuple(reversed(cigartuples))),
+        calc_contig_seq_len(cigartuples),
+        calc_genome_seq_len(cigartuples),
+    )
+
+
+def calc_genome_offsets(offset_map, ctg_clvs, tail_side='left', skip_check_size=None):
+    """
+    batch version of calc_genome_offset, maps an array of ctg_clvs to genome
+    offsets by binary search in a precomputed GenomeOffsetMap
+
+    :param offset_map: returned by build_genome_offset_map(cigartuples)
+    """
+    ctg_clvs = np.asarray(ctg_clvs, dtype=np.int64)
+    if tail_side == 'left':     # flip
+        ctg_clvs = offset_map.ctg_seq_len - ctg_clvs - 1
+        ref_offsets = query_block_map(offset_map.rev, ctg_clvs, skip_check_size)
+        # flip back
+        return offset_map.ref_seq_len - ref_offsets - 1
+    return query_block_map(offset_map.fwd, ctg_clvs, skip_check_size)
@@ -0,0 +1,51 @@
+"""
+Per-worker in-memory cache of the reference chromosome.
+
+Every reference hexamer search and every intron piece of an upstream window
+costs a get_reference_length and one or more small pysam.FastaFile.fetch
+calls. Since all contigs of a work unit are aligned to the same seqname, a
+ChromosomeCache loads the chromosome once and serves fetches as string
+slices, including the pieces of apautils.fetch_seq around the ends of
+circular DNA.
+"""
+
+import pysam
+
+from kleat.misc.twobit import TwoBitFile, is_twobit_file
+
+
+class ChromosomeCache(object):
+    """
+    Follows duck typing with the methods of pysam.FastaFile used by kleat,
+    i.e. fetch and get_reference_length. Only the last fetched chromosome is
+    kept in memory
+    """
+    def __init__(self, fasta_file):
+        self.fasta = open_reference(fasta_file)
+        # from the .fai (or the index of a 2-bit file), looked up once
+        self.lengths = dict(zip(self.fasta.references, self.fasta.lengths))
+        self.seqname = None
+        self.seq = None
+
+    def get_reference_length(self, reference):
+        return self.lengths[reference]
+
+    def fetch(self, reference, start=None, end=None):
+        if reference != self.seqname:
+            self.seq = self.fasta.fetch(reference)
+            self.seqname = reference
+        return self.seq[start:end]
+
+
+def open_reference(fasta_file, cache_chromosome=False):
+    """
+    :param fasta_file: a FASTA file, or a 2-bit file from
+    `kleat prepare-reference`
+    :param cache_chromosome: if True, return a ChromosomeCache, otherwise a
+    pysam.FastaFile or twobit.TwoBitFile
+    """
+    if cache_chromosome:
+        return ChromosomeCache(fasta_file)
+    if is_twobit_file(fasta_file):
+        return TwoBitFile(fasta_file)
+    return pysam.FastaFile(fasta_file)
@@ -0,0 +1,207 @@
+"""
+CIGAR coordinate engine shared by the hexamer window extraction (xseq) and
+visaln.
+
+The cigartuples of a contig are laid out once into CigarBlocks, where each
+block knows its [beg, end) in both contig and reference coordinates relative
+to the beginning of the contig. Clipped bases consume both coordinates, as if
+they were aligned, which is how xseq_plus and xseq_minus have been walking
+the cigar.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import kleat.misc.settings as S
+from kleat.misc.calc_genome_offset import GenomeOffsetMap, calc_genome_offsets
+
+
+CigarBlocks = namedtuple('CigarBlocks', [
+    'ops',
+    'lens',
+    'ctg_beg',
+    'ctg_end',
+    'ref_beg',
+    'ref_end',
+    'ctg_len',                  # total length in contig coordinate
+    'ref_len',                  # total length in reference coordinate
+    'num_supported',            # index of the first unsupported cigar
+])
+
+
+CLIP_CIGARS = {S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP}
+CTG_CIGARS = {S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP, S.BAM_CMATCH, S.BAM_CINS}
+REF_CIGARS = {S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP, S.BAM_CMATCH,
+              S.BAM_CREF_SKIP, S.BAM_CDEL}
+SUPPORTED_CIGARS = CTG_CIGARS | REF_CIGARS
+
+
+def build_cigar_blocks(cigartuples):
+    ops, lens, ctg_beg, ctg_end, ref_beg, ref_end = [], [], [], [], [], []
+    ctg_pos, ref_pos = 0, 0
+    num_supported = None
+    for idx, (key, val) in enumerate(cigartuples):
+        if num_supported is None and key not in SUPPORTED_CIGARS:
+            num_supported = idx
+        ops.append(key)
+        lens.append(val)
+        ctg_beg.append(ctg_pos)
+        ref_beg.append(ref_pos)
+        if key in CTG_CIGARS:
+            ctg_pos += val
+        if key in REF_CIGARS:
+            ref_pos += val
+        ctg_end.append(ctg_pos)
+        ref_end.append(ref_pos)
+
+    if num_supported is None:
+        num_supported = len(ops)
+
+    return CigarBlocks(
+        tuple(ops), tuple(lens), tuple(ctg_beg), tuple(ctg_end),
+        tuple(ref_beg), tuple(ref_end), ctg_pos, ref_pos, num_supported)
+
+
+def calc_genome_coords(blocks, ctg_poss, abs_start):
+    """
+    convert positions in contig coordinate to genome coordinate
+
+    :param abs_start: genome coordinate of the beginning of the contig,
+    including clipped bases
+    """
+    ctg_poss = np.asarray(ctg_poss, dtype=np.int64)
+    ctg_end = np.array(blocks.ctg_end, dtype=np.int64)
+    ref_end = np.array(blocks.ref_end, dtype=np.int64)
+    # the first block after which the contig position reaches the target
+    blk = np.searchsorted(ctg_end, ctg_poss, side='left')
+
+    num_blocks = len(blocks.ops)
+    if blocks.num_supported < num_blocks and np.any(blk >= blocks.num_supported):
+        key = blocks.ops[blocks.num_supported]
+        raise ValueError('unknown cigar key: {0}'.format(key))
+    if np.any(blk >= num_blocks):
+        raise ValueError('position is outside of the contig?')
+    return abs_start + ref_end[blk] - (ctg_end[blk] - ctg_poss)
+
+
+def calc_window_ref_shifts(blocks, offset_map, strand, ctg_clvs, ref_clvs, ctg_seq_len):
+    """
+    calculate the genome coordinates of the relative reference coordinate 0 of
+    the blocks for every clv, see init_ref_beg in xseq_minus and init_ref_end
+    in xseq_plus
+
+    :param ctg_seq_len: length of the contig sequence including clipped bases
+    """
+    ref_clvs = np.asarray(ref_clvs, dtype=np.int64)
+    ctg_clvs = np.asarray(ctg_clvs, dtype=np.int64)
+    num_blocks = len(blocks.ops)
+    if strand == '-':
+        offsets = calc_genome_offsets(offset_map, ctg_clvs, 'left')
+        if num_blocks > 0 and blocks.ops[0] in CLIP_CIGARS:
+            offsets += blocks.lens[0]
+        return ref_clvs - offsets
+
+    # calculate the offset from the right with reversed cigartuples
+    rev_map = GenomeOffsetMap(
+        offset_map.rev, offset_map.fwd,
+        offset_map.ctg_seq_len, offset_map.ref_seq_len)
+    offsets = calc_genome_offsets(rev_map, ctg_seq_len - ctg_clvs, 'left')
+    if num_blocks > 0 and blocks.ops[-1] in CLIP_CIGARS:
+        offsets += blocks.lens[-1]
+    return ref_clvs + offsets - blocks.ref_len
+
+
+def raise_unsupported_cigar(key, strand):
+    err = ("cigar '{0}' hasn't been delta properly "
+           "for '{1}' strand, please report".format(key, strand))
+    raise NotImplementedError(err)
+
+
+def walk_minus(blocks, ctg_seq, ctg_clvs, ref_clvs, ref_shifts, window, fetch_ref):
+    """
+    scan from Left => Right once for all clvs, collecting contig bases from
+    ctg_clv onwards, inserted bases and reference bases of BAM_CREF_SKIP from
+    ref_clv onwards until the window of a clv is filled
+
+    :param fetch_ref: called with (beg, end) in genome coordinate, returns a
+    (piece, piece_length) tuple
+    :returns: a list of pieces per clv, in the order of the window sequence
+    """
+    pieces = [[] for _ in ctg_clvs]
+    sizes = [0] * len(ctg_clvs)
+    active = list(range(len(ctg_clvs)))
+    for k, key in enumerate(blocks.ops):
+        if not active:
+            break
+        if key not in SUPPORTED_CIGARS:
+            raise_unsupported_cigar(key, '-')
+
+        cb, ce = blocks.ctg_beg[k], blocks.ctg_end[k]
+        for q in active:
+            if key == S.BAM_CMATCH or key in CLIP_CIGARS:
+                clv = ctg_clvs[q]
+                if ce > clv:
+                    seq = ctg_seq[max(cb, clv): ce]
+                    pieces[q].append(seq)
+                    sizes[q] += len(seq)
+            elif key == S.BAM_CREF_SKIP:
+                clv = ref_clvs[q]
+                fe = blocks.ref_end[k] + ref_shifts[q]
+                if fe > clv:
+                    fb = blocks.ref_beg[k] + ref_shifts[q]
+                    piece, size = fetch_ref(max(fb, clv), fe)
+                    pieces[q].append(piece)
+                    sizes[q] += size
+            elif key == S.BAM_CINS:
+                seq = ctg_seq[cb: ce]
+                pieces[q].append(seq)
+                sizes[q] += len(seq)
+        active = [q for q in active if sizes[q] < window]
+    return pieces
+
+
+def walk_plus(blocks, ctg_seq, ctg_clvs, ref_clvs, ref_shifts, window, fetch_ref):
+    """
+    scan from Right => Left once for all clvs, collecting contig bases up to
+    ctg_clv, inserted bases and reference bases of BAM_CREF_SKIP up to ref_clv
+    until the window of a clv is filled
+
+    :returns: a list of pieces per clv, in the REVERSED order of the window
+    sequence
+    """
+    # align the blocks to the right end of ctg_seq
+    ctg_shift = len(ctg_seq) - blocks.ctg_len
+
+    pieces = [[] for _ in ctg_clvs]
+    sizes = [0] * len(ctg_clvs)
+    active = list(range(len(ctg_clvs)))
+    for k in reversed(range(len(blocks.ops))):
+        if not active:
+            break
+        key = blocks.ops[k]
+        if key not in SUPPORTED_CIGARS:
+            raise_unsupported_cigar(key, '+')
+
+        cb, ce = blocks.ctg_beg[k] + ctg_shift, blocks.ctg_end[k] + ctg_shift
+        for q in active:
+            if key == S.BAM_CMATCH or key in CLIP_CIGARS:
+                clv = ctg_clvs[q]
+                if cb <= clv:
+                    seq = ctg_seq[cb: min(ce, clv + 1)]
+                    pieces[q].append(seq)
+                    sizes[q] += len(seq)
+            elif key == S.BAM_CREF_SKIP:
+                clv = ref_clvs[q]
+                fb = blocks.ref_beg[k] + ref_shifts[q]
+                if fb < clv:
+                    fe = blocks.ref_end[k] + ref_shifts[q]
+                    piece, size = fetch_ref(fb, clv + 1 if fe >= clv else fe)
+                    pieces[q].append(piece)
+                    sizes[q] += size
+            elif key == S.BAM_CINS:
+                seq = ctg_seq[cb: ce]
+                pieces[q].append(seq)
+                sizes[q] += len(seq)
+        active = [q for q in active if sizes[q] < window]
+    return pieces
@@ -0,0 +1,40 @@
+"""
+Integer-encoded clv keys.
+
+Evidence holders are keyed by ints packing (reference_id, strand, clv)
+instead of (seqname, strand, clv) tuples, which are cheaper to hash and
+compare. Bridge keys additionally pack the clv in contig coordinate. Seqnames
+are only materialized when clv records are generated for output.
+
+    clv key:    reference_id | clv (32 bits) | strand (1 bit)
+    bridge key: clv key | ctg_clv (32 bits)
+"""
+
+
+STRAND_TO_BIT = {'+': 0, '-': 1}
+BIT_TO_STRAND = ['+', '-']
+
+POS_BITS = 32
+POS_MASK = (1 << POS_BITS) - 1
+
+
+def encode_clv_key(reference_id, strand, clv):
+    return (((reference_id << POS_BITS) | clv) << 1) | STRAND_TO_BIT[strand]
+
+
+def decode_clv_key(clv_key):
+    """:returns: a tuple of (reference_id, strand, clv)"""
+    return clv_key >> (POS_BITS + 1), BIT_TO_STRAND[clv_key & 1], (clv_key >> 1) & POS_MASK
+
+
+def encode_clv_record_key(reference_id, clv_record):
+    return encode_clv_key(reference_id, clv_record.strand, clv_record.clv)
+
+
+def encode_bridge_key(clv_key, ctg_clv):
+    return (clv_key << POS_BITS) | ctg_clv
+
+
+def decode_bridge_key(bridge_key):
+    """:returns: a tuple of (clv_key, ctg_clv)"""
+    return bridge_key >> POS_BITS, bridge_key & POS_MASK
@@ -0,0 +1,164 @@
+"""
+Columnar catalog of the contigs in a work unit (i.e. all contigs aligned to a
+seqname).
+
+Suffix ref_clv, link clvs and blank clv candidates are pure functions of a
+contig's reference start/end, orientation and first/last cigar ops, so they
+are computed for all contigs of a work unit in one vectorized step, leaving
+per-contig Python work to the read-dependent parts only.
+
+To bound the memory of a worker, a work unit is streamed in chunks of
+contigs, see gen_contig_chunks, and a catalog is built per chunk.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from kleat.misc.settings import NO_TAIL, LEFT_TAIL, RIGHT_TAIL
+from kleat.misc.contig_geometry import ContigGeometry, get_tail_side
+
+
+ContigCatalog = namedtuple('ContigCatalog', [
+    'names',                    # list of contig names, indexed by name_ids
+    'name_ids',
+    'reference_start',
+    'reference_end',
+    'is_reverse',
+    'ctg_len_with_hc',
+    'tail_side',                # NO_TAIL, LEFT_TAIL or RIGHT_TAIL
+
+    'first_op',
+    'first_len',
+    'last_op',
+    'last_len',
+])
+
+
+# clvs of a contig derived from the catalog. suffix_* fields are only
+# meaningful for suffix contigs, otherwise suffix_strand is None. plus_* and
+# minus_* fields are the clvs at the 3' and 5' end of the contig wst. the
+# reference genome, shared by link and blank evidence
+ContigClvs = namedtuple('ContigClvs', [
+    'suffix_strand',
+    'suffix_ref_clv',
+    'suffix_ctg_tail_len',
+    'suffix_ctg_clv',
+
+    'plus_ref_clv',
+    'plus_ctg_clv',
+    'minus_ref_clv',
+    'minus_ctg_clv',
+])
+
+
+# number of contigs per chunk, see gen_contig_chunks
+CHUNK_SIZE = 1000
+
+
+TAIL_SIDE_CODE_DD = {None: NO_TAIL, 'left': LEFT_TAIL, 'right': RIGHT_TAIL}
+
+
+def gen_contig_chunks(contigs, chunk_size=CHUNK_SIZE):
+    """
+    yield lists of ContigGeometry of about chunk_size contigs. A chunk only
+    ends where reference_start changes, so contigs with identical alignments
+    (see contig_dedup) from a coordinate-sorted BAM fall in the same chunk
+
+    :param contigs: an iterable of pysam AlignedSegment
+    """
+    chunk = []
+    for contig in contigs:
+        if len(chunk) >= chunk_size and contig.reference_start != chunk[-1].reference_start:
+            yield chunk
+            chunk = []
+        chunk.append(ContigGeometry(contig))
+    if chunk:
+        yield chunk
+
+
+def build_contig_catalog(contigs):
+    """
+    :param contigs: a list of ContigGeometry (or pysam AlignedSegment)
+    instances of a work unit
+    """
+    names = [_.query_name for _ in contigs]
+    cgts = [_.cigartuples for _ in contigs]
+    return ContigCatalog(
+        names=names,
+        name_ids=np.arange(len(names), dtype=np.int64),
+        reference_start=np.array([_.reference_start for _ in contigs], dtype=np.int64),
+        reference_end=np.array([_.reference_end for _ in contigs], dtype=np.int64),
+        is_reverse=np.array([_.is_reverse for _ in contigs], dtype=bool),
+        ctg_len_with_hc=np.array(
+            [_.infer_query_length(always=True) for _ in contigs], dtype=np.int64),
+        tail_side=np.array(
+            [TAIL_SIDE_CODE_DD[get_tail_side(_)] for _ in contigs], dtype=np.int64),
+
+        first_op=np.array([_[0][0] for _ in cgts], dtype=np.int64),
+        first_len=np.array([_[0][1] for _ in cgts], dtype=np.int64),
+        last_op=np.array([_[-1][0] for _ in cgts], dtype=np.int64),
+        last_len=np.array([_[-1][1] for _ in cgts], dtype=np.int64),
+    )
+
+
+def calc_contig_clvs(catalog):
+    """
+    calculate clvs of all contigs in the catalog array-wise, returns a dict of
+    arrays keyed by ContigClvs fields
+    """
+    is_left = catalog.tail_side == LEFT_TAIL
+    is_right = catalog.tail_side == RIGHT_TAIL
+    plus_ref_clv = catalog.reference_end - 1
+    minus_ref_clv = catalog.reference_start
+    plus_ctg_clv = catalog.ctg_len_with_hc - 1
+
+    # same as suffix.calc_strand, suffix.calc_ref_clv,
+    # apautils.calc_tail_length and suffix.calc_ctg_clv
+    suffix_ctg_tail_len = np.where(
+        is_left, catalog.first_len, np.where(is_right, catalog.last_len, 0))
+    return {
+        'suffix_strand': np.where(is_left, '-', np.where(is_right, '+', '')),
+        'suffix_ref_clv': np.where(is_left, minus_ref_clv, plus_ref_clv),
+        'suffix_ctg_tail_len': suffix_ctg_tail_len,
+        'suffix_ctg_clv': np.where(
+            is_left, suffix_ctg_tail_len, plus_ctg_clv - suffix_ctg_tail_len),
+
+        # same as link.calc_ctg_clv
+        'plus_ref_clv': plus_ref_clv,
+        'plus_ctg_clv': plus_ctg_clv,
+        'minus_ref_clv': minus_ref_clv,
+        'minus_ctg_clv': np.zeros_like(minus_ref_clv),
+    }
+
+
+def gen_contig_clvs(catalog):
+    """yield a ContigClvs per contig in the catalog"""
+    clvs_dd = calc_contig_clvs(catalog)
+    cols = [clvs_dd[_].tolist() for _ in ContigClvs._fields]
+    for row in zip(*cols):
+        clvs = ContigClvs(*row)
+        if clvs.suffix_strand == '':
+            clvs = clvs._replace(suffix_strand=None)
+        yield clvs
+
+
+def assign_contig_clvs(contigs):
+    """
+    build a catalog for contigs of a work unit and assign each ContigGeometry
+    its ContigClvs
+    """
+    catalog = build_contig_catalog(contigs)
+    for contig, clvs in zip(contigs, gen_contig_clvs(catalog)):
+        contig.clvs = clvs
+    return catalog
+
+
+def get_contig_clvs(contig):
+    """
+    use the ContigClvs assigned from the catalog when available, otherwise
+    calculate it for this contig alone
+    """
+    if isinstance(contig, ContigGeometry) and contig.clvs is not None:
+        return contig.clvs
+    return next(gen_contig_clvs(build_contig_catalog([contig])))
@@ -0,0 +1,83 @@
+"""
+Deduplication of contigs with identical alignments in a work unit.
+
+Redundant assemblies often produce many contigs with the same placement on
+the genome. Contigs are grouped by their alignment signature, and members of
+a group share the caches of contig-only work (upstream windows, reference
+hexamers, clvs), so such work is done once per group. Reads are still
+analyzed per contig, and the clv records of a group are folded in the same
+way as aggregate_polya_evidence would do.
+"""
+
+from collections import OrderedDict
+
+import kleat.misc.settings as S
+
+
+def gen_alignment_signature(contig):
+    """
+    besides reference start, end, strand and cigar, the sequence is included
+    as contig PAS hexamers are searched on it
+    """
+    return (
+        contig.reference_start,
+        contig.reference_end,
+        contig.is_reverse,
+        tuple(contig.cigartuples),
+        contig.seq_with_hc,
+    )
+
+
+def group_contigs_by_alignment(contigs):
+    """
+    :param contigs: a list of ContigGeometry instances
+    :returns: a list of groups (lists of contigs) in the order of their first
+    contig
+    """
+    groups = OrderedDict()
+    for contig in contigs:
+        groups.setdefault(gen_alignment_signature(contig), []).append(contig)
+    return list(groups.values())
+
+
+def share_contig_caches(group):
+    """let all contigs in a group use the caches of the first one"""
+    rep = group[0]
+    for contig in group[1:]:
+        contig.clvs = rep.clvs
+        contig.offset_map = rep.offset_map
+        contig.cigar_blocks = rep.cigar_blocks
+        contig.windows = rep.windows
+        contig.ref_hexamers = rep.ref_hexamers
+
+
+HEADER_IDX_DD = {col: idx for idx, col in enumerate(S.HEADER)}
+FOLD_KEY_IDXES = [HEADER_IDX_DD[_] for _ in ['seqname', 'strand', 'clv', 'evidence_type']]
+
+
+def fold_clv_rows(rows):
+    """
+    fold rows (lists of values in the order of S.HEADER) of the same
+    (seqname, strand, clv, evidence_type), following the rules in
+    post.agg_polya_evidence_per. All other columns are taken from the first
+    row as they only depend on the contig alignment
+    """
+    folded = OrderedDict()
+    for row in rows:
+        key = tuple(row[_] for _ in FOLD_KEY_IDXES)
+        if key not in folded:
+            folded[key] = list(row)
+            continue
+        res = folded[key]
+        for col in S.COLS_TO_SUM:
+            idx = HEADER_IDX_DD[col]
+            res[idx] += row[idx]
+        for col in S.COLS_TO_MAX:
+            idx = HEADER_IDX_DD[col]
+            res[idx] = max(res[idx], row[idx])
+        for col in S.COLS_TO_ANY:
+            idx = HEADER_IDX_DD[col]
+            res[idx] = res[idx] or row[idx]
+        idx = HEADER_IDX_DD['contig_id_at_pos']
+        res[idx] = '{0}|{1}'.format(res[idx], row[idx])
+    return list(folded.values())
@@ -0,0 +1,160 @@
+"""
+Per-contig cache of alignment geometry and sequence.
+
+pysam recomputes (or re-decodes) properties like cigartuples, query_sequence
+and infer_query_length on every access, and the evidence modules query them
+for every read aligned to a contig. A ContigGeometry is built once per contig
+in polya.collect_polya_evidence and passed to the evidence modules in place of the
+pysam contig.
+"""
+
+from kleat.misc import apautils
+from kleat.misc.calc_genome_offset import build_genome_offset_map
+from kleat.misc.cigar_engine import build_cigar_blocks
+from kleat.misc.ref_identity import build_identical_spans
+
+
+class ContigGeometry(object):
+    """
+    Follows duck typing with the attributes of
+    pysam.libcalignedsegment.AlignedSegment used by the evidence modules, with
+    values cached at construction time
+    """
+    __slots__ = (
+        'contig',
+
+        'query_name',
+        'reference_name',
+        'reference_id',
+        'reference_start',
+        'reference_end',
+        'is_reverse',
+        'mapq',
+        'query_length',
+        'query_sequence',
+        'cigartuples',
+
+        'ctg_len_with_hc',      # contig length including hardclipped bases
+        'left_hc',
+        'right_hc',
+        'is_hardclipped',
+        'tail_side',            # 'left', 'right' or None
+        'seq_with_hc',          # sequence with hardclipped bases restored
+
+        'clvs',                 # ContigClvs assigned by contig_catalog
+        'offset_map',           # GenomeOffsetMap, built lazily
+        'cigar_blocks',         # CigarBlocks, built lazily
+        'windows',              # upstream windows extracted by xseq
+        'ref_hexamers',         # PAS hexamers searched on reference genome
+        'identical_spans',      # see ref_identity, built lazily
+    )
+
+    def __init__(self, contig):
+        """:param contig: a pysam.libcalignedsegment.AlignedSegment instance"""
+        self.contig = contig
+
+        self.query_name = contig.query_name
+        self.reference_name = contig.reference_name
+        self.reference_id = contig.reference_id
+        self.reference_start = contig.reference_start
+        self.reference_end = contig.reference_end
+        self.is_reverse = contig.is_reverse
+        self.mapq = contig.mapping_quality
+        self.query_length = contig.query_length
+        self.query_sequence = contig.query_sequence
+        self.cigartuples = tuple(contig.cigartuples)
+
+        self.ctg_len_with_hc = contig.infer_query_length(always=True)
+        self.left_hc, self.right_hc = apautils.calc_hardclips(self.cigartuples)
+        self.is_hardclipped = self.left_hc > 0 or self.right_hc > 0
+        self.tail_side = apautils.has_tail(self)
+        if self.is_hardclipped:
+            self.seq_with_hc = apautils.infer_query_sequence(contig, always=True)
+        else:
+            self.seq_with_hc = self.query_sequence
+
+        self.clvs = None
+        self.offset_map = None
+        self.cigar_blocks = None
+        self.windows = {}
+        self.ref_hexamers = {}
+        self.identical_spans = None
+
+    def infer_query_length(self, always=False):
+        if always:
+            return self.ctg_len_with_hc
+        return self.ctg_len_with_hc - self.left_hc - self.right_hc
+
+    def get_tag(self, tag):
+        return self.contig.get_tag(tag)
+
+    def has_tag(self, tag):
+        return self.contig.has_tag(tag)
+
+    def __repr__(self):
+        return 'ContigGeometry({0})'.format(self.query_name)
+
+
+"""
+Below are accessors that use the cached value when passed a ContigGeometry
+and fall back to computing it from a plain (pysam or mock) segment
+"""
+
+
+def get_tail_side(segment):
+    if isinstance(segment, ContigGeometry):
+        return segment.tail_side
+    return apautils.has_tail(segment)
+
+
+def get_hardclips(contig, reverse=False):
+    """
+    :param reverse: if True, return hardclips of the reversed contig, i.e.
+    (right_hc, left_hc) wst. the contig-to-genome alignment
+    """
+    if isinstance(contig, ContigGeometry):
+        left_hc, right_hc = contig.left_hc, contig.right_hc
+    else:
+        left_hc, right_hc = apautils.calc_hardclips(contig.cigartuples)
+    if reverse:
+        return right_hc, left_hc
+    return left_hc, right_hc
+
+
+def get_is_hardclipped(contig):
+    if isinstance(contig, ContigGeometry):
+        return contig.is_hardclipped
+    return apautils.is_hardclipped(contig)
+
+
+def get_genome_offset_map(contig):
+    """the GenomeOffsetMap of a contig, only built once for a ContigGeometry"""
+    if isinstance(contig, ContigGeometry):
+        if contig.offset_map is None:
+            contig.offset_map = build_genome_offset_map(contig.cigartuples)
+        return contig.offset_map
+    return build_genome_offset_map(contig.cigartuples)
+
+
+def get_cigar_blocks(contig):
+    """the CigarBlocks of a contig, only built once for a ContigGeometry"""
+    if isinstance(contig, ContigGeometry):
+        if contig.cigar_blocks is None:
+            contig.cigar_blocks = build_cigar_blocks(contig.cigartuples)
+        return contig.cigar_blocks
+    return build_cigar_blocks(contig.cigartuples)
+
+
+def get_identical_spans(contig):
+    """spans identical to reference genome, only built once for a ContigGeometry"""
+    if isinstance(contig, ContigGeometry):
+        if contig.identical_spans is None:
+            contig.identical_spans = build_identical_spans(contig)
+        return contig.identical_spans
+    return build_identical_spans(contig)
+
+
+def get_ref_hexamer_cache(contig):
+    """a dict for caching reference hexamer tuples of a ContigGeometry"""
+    if isinstance(contig, ContigGeometry):
+        return contig.ref_hexamers
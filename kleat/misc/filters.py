@@ -0,0 +1,130 @@
+"""
+Filters applied as early as possible when reading alignments, i.e. before any
+sequence is decoded. Numbers of dropped alignments are counted per reason in
+a collections.Counter, which is returned by each work unit and summed up for
+reporting.
+"""
+
+from collections import namedtuple, Counter
+
+import kleat.misc.settings as S
+
+
+ReadFilter = namedtuple('ReadFilter', [
+    'flag_mask',                # drop reads with any of these flag bits set
+    'min_mapq',
+    'min_aligned_len',
+])
+
+
+def gen_read_filter(flag_mask=0, min_mapq=0, min_aligned_len=0):
+    """return None if nothing would be filtered"""
+    if flag_mask == 0 and min_mapq <= 0 and min_aligned_len <= 0:
+        return None
+    return ReadFilter(flag_mask, min_mapq, min_aligned_len)
+
+
+def filter_reads(aligned_reads, read_filter, counter):
+    """
+    MAPQ and aligned length are only checked for mapped reads, since unmapped
+    reads placed next to their mates are needed by link evidence
+
+    :param aligned_reads: an iterable of pysam.libcalignedsegment.AlignedSegment
+    :param counter: a collections.Counter for dropped reads, None to not count
+    """
+    if counter is None:
+        counter = Counter()
+    flag_mask, min_mapq, min_aligned_len = read_filter
+    for read in aligned_reads:
+        if read.flag & flag_mask:
+            counter['reads_dropped_by_flag'] += 1
+            continue
+        if not read.is_unmapped:
+            if read.mapping_quality < min_mapq:
+                counter['reads_dropped_by_mapq'] += 1
+                continue
+            if min_aligned_len > 0 and read.query_alignment_length < min_aligned_len:
+                counter['reads_dropped_by_aligned_len'] += 1
+                continue
+        yield read
+
+
+class FilteredAlignmentFile(object):
+    """
+    wraps a pysam.libcalignmentfile.AlignmentFile so that reads from every
+    fetch are filtered.
+
+    Reads fetched in a region of a contig (e.g. at the suffix clv) are fetched
+    again with the whole contig for bridge and link evidence, so to count
+    each dropped read once, only fetches of whole contigs are counted, unless
+    count_regions is True, e.g. when no whole contig is fetched
+    """
+    def __init__(self, bam, read_filter, counter, count_regions=False):
+        self.bam = bam
+        self.read_filter = read_filter
+        self.counter = counter
+        self.count_regions = count_regions
+
+    def fetch(self, contig, *args, **kwargs):
+        is_region = bool(args or kwargs)
+        counter = self.counter if self.count_regions or not is_region else None
+        return filter_reads(
+            self.bam.fetch(contig, *args, **kwargs), self.read_filter, counter)
+
+
+ContigFilter = namedtuple('ContigFilter', [
+    'flag_mask',                # e.g. 0x900 for secondary and supplementary
+    'min_mapq',
+    'min_aligned_len',
+    'max_clip_fraction',        # of clipped bases over the contig length
+])
+
+
+CLIP_CIGARS = {S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP}
+
+
+def gen_contig_filter(flag_mask=0, min_mapq=0, min_aligned_len=0, max_clip_fraction=1):
+    """return None if nothing would be filtered"""
+    if (flag_mask == 0 and min_mapq <= 0 and min_aligned_len <= 0
+            and max_clip_fraction >= 1):
+        return None
+    return ContigFilter(flag_mask, min_mapq, min_aligned_len, max_clip_fraction)
+
+
+def calc_clip_fraction(cigartuples):
+    """fraction of soft/hard clipped bases, including the polyA tail if any"""
+    clipped, total = 0, 0
+    for key, val in cigartuples:
+        if key in CLIP_CIGARS:
+            clipped += val
+            total += val
+        elif key in (S.BAM_CMATCH, S.BAM_CINS):
+            total += val
+    return clipped / total if total > 0 else 0
+
+
+def filter_contigs(contigs, contig_filter, counter):
+    """
+    :param contigs: an iterable of mapped pysam.libcalignedsegment.AlignedSegment
+    from the contig-to-genome alignment
+    :param counter: a collections.Counter for dropped contigs
+    """
+    flag_mask, min_mapq, min_aligned_len, max_clip_fraction = contig_filter
+    for contig in contigs:
+        if contig.flag & flag_mask:
+            counter['contigs_dropped_by_flag'] += 1
+            continue
+        if contig.mapping_quality < min_mapq:
+            counter['contigs_dropped_by_mapq'] += 1
+            continue
+        if min_aligned_len > 0 and contig.query_alignment_length < min_aligned_len:
+            counter['contigs_dropped_by_aligned_len'] += 1
+            continue
+        if max_clip_fraction < 1 and calc_clip_fraction(contig.cigartuples) > max_clip_fraction:
+            counter['contigs_dropped_by_clip_fraction'] += 1
+            continue
+        yield contig
+
+
+def format_counter(counter):
+    return ', '.join('{0}: {1}'.format(key, counter[key]) for key in sorted(counter))
@@ -0,0 +1,35 @@
+"""
+I/O locality ordering of the contigs in a work unit.
+
+c2g_bam.fetch(seqname) yields contigs in genome order, while their reads sit
+at unrelated places in the r2c BAM, which is sorted by contig, so every
+r2c_bam.fetch(contig.query_name) seeks somewhere else. Processing contigs in
+the order of where their reads start in the r2c BAM makes disk access close
+to sequential.
+"""
+
+import sys
+
+
+def calc_r2c_rank(r2c_bam, contig_name):
+    """
+    rank of where reads of a contig start in the r2c BAM.
+
+    As r2c is sorted by contig (i.e. reference id) first, reads of contigs are
+    laid out in the order of their reference ids, which is monotonic with the
+    virtual file offsets of their first bins in the index, and it's only a
+    lookup in the header. Contigs unknown to r2c go last
+
+    :param r2c_bam: a pysam.libcalignmentfile.AlignmentFile
+    """
+    tid = r2c_bam.get_tid(contig_name)
+    return tid if tid >= 0 else sys.maxsize
+
+
+def sort_by_r2c_rank(r2c_bam, contig_names):
+    """
+    :returns: indices of contig_names in the order of their reads in the r2c
+    BAM, ties keep their original order
+    """
+    ranks = [calc_r2c_rank(r2c_bam, _) for _ in contig_names]
+    return sorted(range(len(contig_names)), key=ranks.__getitem__)
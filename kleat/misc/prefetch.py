@@ -0,0 +1,144 @@
+"""
+Decoupled decode stage for reads of the read-to-contig BAM.
+
+Without it, a worker decompresses the BGZF blocks of a contig's reads on the
+same thread that runs the evidence logic, so its CPU time alternates between
+zlib and the interpreter. A ReadPrefetcher runs a producer thread with its own
+handle of the BAM, which fetches reads of the upcoming contigs (htslib
+releases the GIL while decoding) into a bounded queue, so that decoding
+overlaps with analysis of the current contig.
+
+Reads are queued in batches of a fixed size rather than per contig, so at
+most QUEUE_SIZE * BATCH_SIZE decoded reads are held ahead of the analysis,
+however deep a contig is. When the analysis stops consuming the reads of a
+contig early, e.g. at the deadline of a read_budget, the producer skips the
+rest of them.
+
+The number of threads is a global budget split across pool workers to avoid
+oversubscribing cores: per worker, one thread is the producer and the rest
+are htslib decompression threads of its BAM handle.
+"""
+
+import queue
+import threading
+from itertools import islice
+
+import pysam
+
+from kleat.misc.filters import filter_reads
+
+
+# number of read batches decoded ahead of the analysis
+QUEUE_SIZE = 8
+
+# number of reads per batch
+BATCH_SIZE = 1024
+
+
+def split_thread_budget(total_threads, num_workers):
+    """:returns: the number of io threads per pool worker"""
+    if total_threads <= 0 or num_workers <= 0:
+        return 0
+    return total_threads // num_workers
+
+
+class ReadPrefetcher(object):
+    """
+    fetches reads of contigs in the order they are going to be analyzed, see
+    get. Reads are filtered on the consumer side so that counters aren't
+    shared between threads
+    """
+    def __init__(self, bam_file, contig_names, threads=1, read_filter=None,
+                 counter=None, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        """
+        :param contig_names: in the order of calls to get, one per call
+        :param threads: the io thread budget of the worker, including the
+        producer thread itself
+        """
+        self.contig_names = list(contig_names)
+        self.read_filter = read_filter
+        self.counter = counter
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        # index of the next contig to get, contigs before it are no longer
+        # consumed, so the producer skips their remaining reads
+        self.num_gets = 0
+        self.current_reads = None
+        self.thread = threading.Thread(
+            target=self.produce, args=(bam_file, threads - 1))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def produce(self, bam_file, decompression_threads):
+        """
+        puts (idx, batch) items, where idx is the index of a contig in
+        contig_names, and a batch of None marks the end of its reads
+        """
+        try:
+            with pysam.AlignmentFile(bam_file, threads=max(decompression_threads, 1)) as bam:
+                for idx, name in enumerate(self.contig_names):
+                    reads = bam.fetch(name)
+                    while idx >= self.num_gets - 1:
+                        if self.stopped.is_set():
+                            return
+                        batch = list(islice(reads, self.batch_size))
+                        if not batch:
+                            break
+                        self.put((idx, batch))
+                    self.put((idx, None))
+        except Exception as e:
+            self.put((None, e))
+
+    def put(self, item):
+        # don't block forever if the consumer has stopped
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def gen_reads(self, idx):
+        while True:
+            item_idx, batch = self.queue.get()
+            if item_idx is None:
+                raise batch
+            if batch is None:
+                return
+            for read in batch:
+                yield read
+
+    def skip_current_reads(self):
+        """skip reads of the last contig that are not consumed"""
+        if self.current_reads is not None:
+            for _ in self.current_reads:
+                pass
+            self.current_reads = None
+
+    def get(self, contig_name):
+        """
+        :returns: an iterator of reads aligned to the contig, which may be
+        left partially consumed before the next call
+        """
+        idx = self.num_gets
+        name = self.contig_names[idx] if idx < len(self.contig_names) else None
+        if name != contig_name:
+            raise ValueError('expected reads of {0}, but got those of {1}'.format(
+                contig_name, name))
+        self.num_gets += 1
+        self.skip_current_reads()
+        self.current_reads = self.gen_reads(idx)
+        if self.read_filter is not None:
+            return filter_reads(self.current_reads, self.read_filter, self.counter)
+        return self.current_reads
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
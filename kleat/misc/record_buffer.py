@@ -0,0 +1,158 @@
+"""
+Columnar buffer of clv records.
+
+Evidence modules append the fields of a clv record straight into one column
+per field of S.HEADER, instead of building a ClvRecord and writing it with a
+writerow call per record. Read and contig count columns are preallocated
+typed arrays of zeros, so only the counts of the evidence type at hand are set
+per record. Records are written in blocks, formatted one column at a time.
+"""
+
+import csv
+import re
+from array import array
+
+import kleat.misc.settings as S
+
+
+# columns set for every record, in the order of S.HEADER
+RECORD_COLS = S.HEADER[:S.HEADER.index('num_suffix_reads')]
+# columns specific to evidence types, 0 unless set
+COUNT_COLS = S.HEADER[len(RECORD_COLS):S.HEADER.index('reads_subsampled')]
+COUNT_IDX_DD = {col: idx for idx, col in enumerate(COUNT_COLS)}
+
+# columns that may contain characters csv.writer would quote, e.g. from contig
+# names
+STR_COLS_IDXES = [RECORD_COLS.index(_) for _ in ['seqname', 'contig_id_at_pos']]
+QUOTED_CHARS = re.compile('[\t"\r\n]')
+
+BLOCK_SIZE = 4096
+
+
+def init_counts(size):
+    return array('q', bytes(8 * size))
+
+
+def format_column(col):
+    """
+    str() of the values of a column, done once if they are all the same, e.g.
+    counts of other evidence types
+    """
+    first = col[0]
+    if col.count(first) == len(col):
+        return [str(first)] * len(col)
+    return list(map(str, col))
+
+
+def needs_csv(columns):
+    """whether csv.writer would write any field other than as str() does"""
+    return (any(None in _ for _ in columns[:len(RECORD_COLS)])
+            or any(QUOTED_CHARS.search(' '.join(columns[_])) for _ in STR_COLS_IDXES))
+
+
+class ClvRecordBuffer(object):
+    """
+    :param opf: a file object opened for writing the tsv of a work unit
+    :param block_size: number of records written at a time by maybe_flush
+    """
+    def __init__(self, opf, block_size=BLOCK_SIZE):
+        self.opf = opf
+        self.csvwriter = csv.writer(opf, delimiter='\t')
+        self.block_size = block_size
+        self.reset()
+
+    def reset(self):
+        self.columns = [[] for _ in RECORD_COLS]
+        self.appends = [_.append for _ in self.columns]
+        self.counts = [init_counts(self.block_size) for _ in COUNT_COLS]
+        self.reads_subsampled = [False] * self.block_size
+        self.num_records = 0
+
+    def reserve(self):
+        """index of the next record, count columns are grown if full"""
+        idx = self.num_records
+        if idx == len(self.reads_subsampled):
+            for col in self.counts:
+                col.extend(init_counts(self.block_size))
+            self.reads_subsampled.extend([False] * self.block_size)
+        self.num_records += 1
+        return idx
+
+    def append(self, seqname, strand, clv, ctg_hex_tuple, ref_hex_tuple,
+               evidence_type, contig_id_at_pos, contig_is_hardclipped,
+               contig_len, contig_mapq, reads_subsampled=False, **counts):
+        """
+        :param ctg_hex_tuple: a tuple of (ctg_hex, ctg_hex_id, ctg_hex_pos)
+        :param ref_hex_tuple: a tuple of (ref_hex, ref_hex_id, ref_hex_pos)
+        :param counts: values of COUNT_COLS of the evidence type
+        """
+        idx = self.reserve()
+        ap = self.appends
+        ap[0](seqname)
+        ap[1](strand)
+        ap[2](clv)
+        ap[3](ctg_hex_tuple[0])
+        ap[4](ctg_hex_tuple[1])
+        ap[5](ctg_hex_tuple[2])
+        ap[6](ref_hex_tuple[0])
+        ap[7](ref_hex_tuple[1])
+        ap[8](ref_hex_tuple[2])
+        ap[9](evidence_type)
+        ap[10](contig_id_at_pos)
+        ap[11](contig_is_hardclipped)
+        ap[12](contig_len)
+        ap[13](contig_mapq)
+        for col, val in counts.items():
+            self.counts[COUNT_IDX_DD[col]][idx] = val
+        if reads_subsampled:
+            self.reads_subsampled[idx] = True
+
+    def writerow(self, row):
+        """:param row: a ClvRecord or any sequence in the order of S.HEADER"""
+        idx = self.reserve()
+        num_record_cols = len(RECORD_COLS)
+        for append, val in zip(self.appends, row[:num_record_cols]):
+            append(val)
+        for col, val in zip(self.counts, row[num_record_cols:-1]):
+            col[idx] = val
+        self.reads_subsampled[idx] = row[-1]
+
+    def gen_columns(self, beg=0):
+        num = self.num_records
+        return ([_[beg:] for _ in self.columns]
+                + [_[beg:num].tolist() for _ in self.counts]
+                + [self.reads_subsampled[beg:num]])
+
+    def take_rows(self, beg):
+        """
+        remove the records from beg on, e.g. to fold or reorder them before
+        they are written back with writerow
+
+        :returns: a list of tuples in the order of S.HEADER
+        """
+        rows = list(zip(*self.gen_columns(beg)))
+        num = self.num_records
+        for col in self.columns:
+            del col[beg:]
+        for col in self.counts:
+            col[beg:num] = init_counts(num - beg)
+        self.reads_subsampled[beg:num] = [False] * (num - beg)
+        self.num_records = beg
+        return rows
+
+    def maybe_flush(self):
+        """flush if at least a block of records is buffered"""
+        if self.num_records >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.num_records == 0:
+            return
+        columns = self.gen_columns()
+        if needs_csv(columns):
+            self.csvwriter.writerows(zip(*columns))
+        else:
+            # the same as csv.writer when no field is quoted or None
+            str_columns = [format_column(_) for _ in columns]
+            self.opf.write('\r\n'.join(map('\t'.join, zip(*str_columns))) + '\r\n')
+        self.reset()
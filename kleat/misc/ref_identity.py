@@ -0,0 +1,127 @@
+"""
+Reference identity of contig alignments.
+
+For most contigs, the upstream window of a clv has no mismatches, indels or
+clips relative to the genome, so the PAS hexamer searched in the contig
+window is the same as that searched in the reference window. Identical spans
+are the aligned blocks of the cigar split at mismatches, which are known from
+the MD tag, or absent if the NM tag is 0. Without either tag, no span is
+known to be identical.
+"""
+
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+import kleat.misc.settings as S
+
+
+MD_REGEX = re.compile(r'(\d+)|(\^[A-Za-z]+)|([A-Za-z])')
+
+ALIGNED_CIGARS = {S.BAM_CMATCH, S.BAM_CEQUAL}
+# other cigars that consume the reference genome, all but N are in MD, too
+MD_CIGARS = {S.BAM_CDEL, S.BAM_CDIFF}
+CTG_ONLY_CIGARS = {S.BAM_CINS, S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP}
+
+
+IdenticalSpans = namedtuple('IdenticalSpans', [
+    'starts',                   # [start, end) of spans in genome coordinate
+    'ends',
+    'ctg_starts',               # in contig coordinate, with hardclipped bases
+    'ins_before',               # number of insertions before each span
+    'num_ins',                  # number of insertions of the contig
+])
+
+
+def parse_md_mismatches(md):
+    """
+    :returns: a list of offsets of mismatched bases from the reference start
+    of the alignment, not counting skipped regions (N), which aren't in MD
+    """
+    res = []
+    offset = 0
+    for num, deletion, base in MD_REGEX.findall(md):
+        if num:
+            offset += int(num)
+        elif deletion:
+            offset += len(deletion) - 1
+        else:
+            res.append(offset)
+            offset += 1
+    return res
+
+
+def get_mismatches(contig):
+    """
+    :returns: a list of offsets of mismatches, see parse_md_mismatches, or
+    None if unknown
+    """
+    if contig.has_tag('MD'):
+        return parse_md_mismatches(contig.get_tag('MD'))
+    if contig.has_tag('NM') and contig.get_tag('NM') == 0:
+        return []
+    return None
+
+
+def build_identical_spans(contig):
+    """:returns: an IdenticalSpans"""
+    mismatches = get_mismatches(contig)
+    if mismatches is None:
+        return IdenticalSpans((), (), (), (), 0)
+
+    starts, ends, ctg_starts, ins_before = [], [], [], []
+    ref_offset, md_offset, ctg_offset = contig.reference_start, 0, 0
+    num_ins = 0
+
+    def add_span(beg, end):
+        starts.append(ref_offset + beg - md_offset)
+        ends.append(ref_offset + end - md_offset)
+        ctg_starts.append(ctg_offset + beg - md_offset)
+        ins_before.append(num_ins)
+
+    k = 0
+    for key, val in contig.cigartuples:
+        if key in ALIGNED_CIGARS:
+            beg, end = md_offset, md_offset + val
+            while k < len(mismatches) and mismatches[k] < end:
+                if mismatches[k] > beg:
+                    add_span(beg, mismatches[k])
+                beg = mismatches[k] + 1
+                k += 1
+            if end > beg:
+                add_span(beg, end)
+            ref_offset += val
+            md_offset += val
+            ctg_offset += val
+        elif key in MD_CIGARS:
+            ref_offset += val
+            md_offset += val
+            if key == S.BAM_CDIFF:
+                ctg_offset += val
+        elif key == S.BAM_CREF_SKIP:
+            ref_offset += val
+        elif key in CTG_ONLY_CIGARS:
+            ctg_offset += val
+            if key == S.BAM_CINS:
+                num_ins += 1
+    return IdenticalSpans(
+        tuple(starts), tuple(ends), tuple(ctg_starts), tuple(ins_before), num_ins)
+
+
+def is_ref_identical(spans, strand, beg, end, ref_pos, ctg_pos):
+    """
+    :param spans: an IdenticalSpans
+    :returns: True if the upstream window extracted from the contig at
+    ctg_pos, see xseq, is the same as that of the reference genome at
+    ref_pos, i.e. [beg, end) is within one identical span where ctg_pos is
+    aligned to ref_pos, and no inserted bases are collected into the window,
+    which xseq does for insertions downstream of the clv
+    """
+    idx = bisect_right(spans.starts, beg) - 1
+    if idx < 0 or end > spans.ends[idx]:
+        return False
+    if ref_pos - spans.starts[idx] != ctg_pos - spans.ctg_starts[idx]:
+        return False
+    if strand == '+':
+        return spans.ins_before[idx] == spans.num_ins
+    return spans.ins_before[idx] == 0
@@ -49,8 +49,13 @@ HEADER = [
     'num_link_contigs',
 
     'num_blank_contigs',
+
+    'reads_subsampled',         # read counts are estimated, see read_budget
 ]
 
+# columns only output with a read budget, see read_budget
+READ_BUDGET_COLS = ['reads_subsampled']
+
 
 # A dictionary for renaming some of the columns in the header after aggregating
 # polyA evidence to be more sensible, and less confusing
@@ -77,6 +82,7 @@ FORMAT_OUTPUT_HEADER_DD = {     # dd just means dict
 
     'num_blank_contigs': 'num_contigs_blank',
 
+    'reads_subsampled': 'any_reads_subsampled',
 }
 
 # header in the output sorted in a intuitive way.
@@ -124,10 +130,17 @@ OUTPUT_HEADER = [
     'ref_hex_dist',
 ]
 
+OUTPUT_READ_BUDGET_COLS = ['any_reads_subsampled']
+
 
 ClvRecord = namedtuple('ClvRecord', HEADER)
 
 
+# integer codes of tail sides used in array-wise computations, corresponding
+# to None, 'left' and 'right' returned by apautils.has_tail
+NO_TAIL, LEFT_TAIL, RIGHT_TAIL = 0, 1, 2
+
+
 CANDIDATE_HEXAMERS = [
     ('AATAAA', 16),
     ('ATTAAA', 15),
@@ -204,6 +217,7 @@ COLS_TO_MAX = [
 
 COLS_TO_ANY = [                 # any(), if any is True, then True
     'contig_is_hardclipped',
+    'reads_subsampled',
 ]
 
 COLS_TO_JOIN = [
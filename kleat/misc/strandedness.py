@@ -0,0 +1,30 @@
+"""
+Library strandedness.
+
+With a stranded library and a strand-aware assembly, the orientation of a
+contig tells the strand of the transcript it's assembled from, so clv
+candidates on the other strand are impossible and pruned before any upstream
+window extraction or hexamer search.
+"""
+
+UNSTRANDED = 'unstranded'
+FORWARD = 'forward'             # contig sequences are in transcript orientation
+REVERSE = 'reverse'             # contig sequences are reverse complemented
+
+STRANDEDNESS_CHOICES = [UNSTRANDED, FORWARD, REVERSE]
+
+
+def calc_transcript_strand(contig, strandedness):
+    """
+    :returns: '+' or '-', or None if the library is unstranded
+    """
+    if strandedness is None or strandedness == UNSTRANDED:
+        return None
+    if strandedness not in STRANDEDNESS_CHOICES:
+        raise ValueError('unknown strandedness: {0}'.format(strandedness))
+    is_sense = (strandedness == FORWARD) != contig.is_reverse
+    return '+' if is_sense else '-'
+
+
+def is_on_strand(strand, transcript_strand):
+    return transcript_strand is None or strand == transcript_strand
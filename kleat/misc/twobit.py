@@ -0,0 +1,149 @@
+"""
+Packed 2-bit reference genome format, prepared by `kleat prepare-reference`.
+
+A reference loaded as Python strings costs gigabytes per worker, while every
+pysam.FastaFile.fetch costs syscalls. Here, bases are packed 4 per byte, with
+runs of N (and any other non-ACGT base) kept in a separate mask, and the file
+is read through a read-only mmap, so all workers share one page-cached copy
+and a fetch only decodes the bytes of the requested window.
+
+Note sequences are fetched in upper case, i.e. soft-masking is dropped, which
+doesn't matter to the case-insensitive PAS hexamer search.
+
+Layout, all integers are little-endian:
+
+    MAGIC | uint64 offset of the index | per sequence: packed bases, padded to
+    8 bytes, then int64 starts and int64 ends of N runs | index in JSON
+"""
+
+import json
+import mmap
+import struct
+from collections import namedtuple
+
+import numpy as np
+import pysam
+
+
+MAGIC = b'KLEAT2B1'
+HEADER_SIZE = len(MAGIC) + 8
+BASES = b'ACGT'
+N = ord('N')
+
+# ascii code => 2-bit code, non-ACGT bases are encoded as A and masked
+ENCODE_TABLE = np.zeros(256, dtype=np.uint8)
+for code, base in enumerate(BASES):
+    ENCODE_TABLE[base] = code
+    ENCODE_TABLE[ord(chr(base).lower())] = code
+IS_ACGT = np.zeros(256, dtype=bool)
+IS_ACGT[list(BASES + BASES.lower())] = True
+
+# packed byte => 4 ascii codes, the first base is in the highest bits
+DECODE_TABLE = np.array(
+    [[BASES[(byte >> shift) & 3] for shift in (6, 4, 2, 0)] for byte in range(256)],
+    dtype=np.uint8)
+
+
+TwoBitEntry = namedtuple('TwoBitEntry', [
+    'length',
+    'seq_offset',               # of the packed bases
+    'n_offset',                 # of the starts of N runs, followed by ends
+    'num_n_runs',
+])
+
+
+def encode_seq(seq):
+    """
+    :param seq: a str
+    :returns: a tuple of (packed bases, starts of N runs, ends of N runs)
+    """
+    codes = np.frombuffer(seq.encode('ascii'), dtype=np.uint8)
+    is_n = ~IS_ACGT[codes]
+    two_bits = ENCODE_TABLE[codes]
+    two_bits = np.concatenate([two_bits, np.zeros(-len(two_bits) % 4, dtype=np.uint8)])
+    two_bits = two_bits.reshape(-1, 4)
+    packed = (two_bits[:, 0] << 6) | (two_bits[:, 1] << 4) | (two_bits[:, 2] << 2) | two_bits[:, 3]
+
+    edges = np.diff(np.concatenate([[False], is_n, [False]]).astype(np.int8))
+    n_starts = (edges == 1).nonzero()[0].astype(np.int64)
+    n_ends = (edges == -1).nonzero()[0].astype(np.int64)
+    return packed.astype(np.uint8), n_starts, n_ends
+
+
+def write_padded(opf, data):
+    opf.write(data)
+    opf.write(b'\0' * (-len(data) % 8))
+
+
+def convert_fasta(fasta_file, output):
+    """convert a FASTA file into the 2-bit format, one sequence at a time"""
+    index = {}
+    with open(output, 'wb') as opf:
+        opf.write(MAGIC)
+        opf.write(struct.pack('<Q', 0))
+        with pysam.FastxFile(fasta_file) as fasta:
+            for rec in fasta:
+                packed, n_starts, n_ends = encode_seq(rec.sequence)
+                seq_offset = opf.tell()
+                write_padded(opf, packed.tobytes())
+                n_offset = opf.tell()
+                opf.write(n_starts.tobytes())
+                opf.write(n_ends.tobytes())
+                index[rec.name] = TwoBitEntry(
+                    len(rec.sequence), seq_offset, n_offset, len(n_starts))
+        index_offset = opf.tell()
+        opf.write(json.dumps(index).encode('ascii'))
+        opf.seek(len(MAGIC))
+        opf.write(struct.pack('<Q', index_offset))
+    return index
+
+
+def is_twobit_file(path):
+    with open(path, 'rb') as inf:
+        return inf.read(len(MAGIC)) == MAGIC
+
+
+class TwoBitFile(object):
+    """
+    Follows duck typing with the methods of pysam.FastaFile used by kleat,
+    i.e. fetch and get_reference_length
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as inf:
+            # the mapping stays valid after the file is closed
+            self.mm = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('{0} is not a 2-bit reference file'.format(path))
+        index_offset, = struct.unpack_from('<Q', self.mm, len(MAGIC))
+        index = json.loads(self.mm[index_offset:].decode('ascii'))
+        self.index = {key: TwoBitEntry(*val) for key, val in index.items()}
+        self.references = list(self.index)
+        self.lengths = [_.length for _ in self.index.values()]
+
+    def get_reference_length(self, reference):
+        return self.index[reference].length
+
+    def fetch(self, reference, start=None, end=None):
+        entry = self.index[reference]
+        start = 0 if start is None else start
+        end = entry.length if end is None else min(end, entry.length)
+        if start >= end:
+            return ''
+
+        byte_beg, byte_end = start // 4, (end + 3) // 4
+        # a view into the mmap, only the bytes of the window are decoded
+        packed = np.frombuffer(self.mm, dtype=np.uint8, count=byte_end - byte_beg,
+                               offset=entry.seq_offset + byte_beg)
+        skip = byte_beg * 4
+        bases = DECODE_TABLE[packed].ravel()[start - skip: end - skip]
+
+        if entry.num_n_runs > 0:
+            n_starts = np.frombuffer(self.mm, dtype=np.int64, count=entry.num_n_runs,
+                                     offset=entry.n_offset)
+            n_ends = np.frombuffer(self.mm, dtype=np.int64, count=entry.num_n_runs,
+                                   offset=entry.n_offset + 8 * entry.num_n_runs)
+            k_beg = np.searchsorted(n_ends, start, side='right')
+            k_end = np.searchsorted(n_starts, end, side='left')
+            for k in range(k_beg, k_end):
+                bases[max(n_starts[k], start) - start: min(n_ends[k], end) - start] = N
+        return bases.tobytes().decode('ascii')
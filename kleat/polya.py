@@ -2,12 +2,25 @@ import os
 import csv
 import logging
 import tempfile
+from collections import Counter
 
 import pysam
 from tqdm import tqdm
 
-from kleat.misc import apautils
-from kleat.proc import process_suffix, process_bridge_and_link, process_blank
+from kleat.misc.contig_catalog import assign_contig_clvs, gen_contig_chunks
+from kleat.misc.prefetch import ReadPrefetcher
+from kleat.misc.locality import sort_by_r2c_rank
+from kleat.misc.chrom_cache import open_reference
+from kleat.misc.strandedness import calc_transcript_strand
+from kleat.misc.filters import FilteredAlignmentFile, filter_contigs, format_counter
+from kleat.misc.contig_dedup import (
+    group_contigs_by_alignment, share_contig_caches, fold_clv_rows
+)
+from kleat.misc.record_buffer import ClvRecordBuffer
+from kleat.proc import extract_bridge_and_link, EvidenceContext
+from kleat.evidence import registry as R
+from kleat.evidence.mate_index import build_mate_index, gen_work_unit_reads
+from kleat.hexamer.memo import add_hexamer_stats
 from kleat.misc import utils as U
 from kleat.misc import settings as S
 
@@ -40,42 +53,216 @@ def prepare_args_for_collect_polya_evidence(num_cpus, output, c2g_bam_file, *arg
 
 
 def collect_polya_evidence(seqname, tmp_output_file, c2g_bam_file,
-                           r2c_bam_file, ref_fa_file, bridge_skip_check_size):
-    """loop through each contig and collect polyA evidence"""
+                           r2c_bam_file, ref_fa_file, bridge_skip_check_size,
+                           dedup_contigs=False, read_filter=None, contig_filter=None,
+                           read_budget=None, evidence_types=None, strandedness=None,
+                           with_mate_index=False, io_threads=0, locality_order=False,
+                           cache_chromosome=False):
+    """
+    loop through each contig and collect polyA evidence
+
+    :param dedup_contigs: if True, collect evidence per group of contigs with
+    identical alignments, see contig_dedup
+    :param read_filter: a filters.ReadFilter applied to reads in r2c_bam
+    :param contig_filter: a filters.ContigFilter applied to contigs in
+    c2g_bam before any other work is done on them
+    :param read_budget: a read_budget.ReadBudget per contig for bridge and
+    link evidence
+    :param evidence_types: names of selected evidence types, None for all
+    :param strandedness: see strandedness.STRANDEDNESS_CHOICES
+    :param with_mate_index: if True, build a mate_index of the work unit for
+    link evidence
+    :param io_threads: if positive, reads for bridge and link evidence are
+    decoded ahead by a prefetch.ReadPrefetcher with this many threads
+    :param locality_order: if True, contigs of a chunk are processed in the
+    order of their reads in r2c_bam, see locality, and results are written in
+    the original order
+    :param cache_chromosome: if True, the chromosome of seqname is loaded into
+    memory once for all reference fetches, see chrom_cache
+    :returns: the tmp output file, a collections.Counter of dropped
+    alignments, and a collections.Counter of per evidence type stats
+    """
     logging.info('collecting polyA evidence for {0} to {1} ...'.format(seqname, tmp_output_file))
 
+    counter = Counter()
+    stats = Counter()
+    if evidence_types is None:
+        evidence_types = R.parse_evidence_types()
     c2g_bam = pysam.AlignmentFile(c2g_bam_file)
-    r2c_bam = pysam.AlignmentFile(r2c_bam_file)
-    ref_fa = pysam.FastaFile(ref_fa_file)
+    r2c_bam = raw_r2c_bam = pysam.AlignmentFile(r2c_bam_file)
+    if read_filter is not None:
+        # without bridge and link evidence, whole contigs aren't fetched, so
+        # dropped reads are counted in the suffix fetches instead
+        r2c_bam = FilteredAlignmentFile(
+            r2c_bam, read_filter, counter,
+            count_regions=not R.needs(evidence_types, R.ALL_READS))
+    ref_fa = open_reference(ref_fa_file, cache_chromosome)
 
-    with open(tmp_output_file, 'wt') as opf:
-        csvwriter = csv.writer(opf, delimiter='\t')
-        csvwriter.writerow(S.HEADER)
-        for contig in c2g_bam.fetch(seqname):
-            if contig.is_unmapped:
-                continue
+    mate_index = None
+    if with_mate_index and 'link' in evidence_types:
+        # contig names are streamed in a separate pass, so that the index
+        # covers all contigs of the work unit, not only those of a chunk
+        names = dict.fromkeys(_.query_name for _ in fetch_contigs(
+            c2g_bam, seqname, contig_filter, Counter()))
+        # dropped reads are counted when fetched again for evidence
+        index_bam = raw_r2c_bam
+        if read_filter is not None:
+            index_bam = FilteredAlignmentFile(raw_r2c_bam, read_filter, Counter())
+        mate_index = build_mate_index(gen_work_unit_reads(index_bam, names))
+        logging.info('{0} polyA/T reads in the mate index for {1}'.format(
+            len(mate_index), seqname))
 
-            do_collection(contig, r2c_bam, ref_fa, csvwriter, bridge_skip_check_size)
+    with open(tmp_output_file, 'wt') as opf:
+        csv.writer(opf, delimiter='\t').writerow(S.HEADER)
+        buf = ClvRecordBuffer(opf)
+        contigs = fetch_contigs(c2g_bam, seqname, contig_filter, counter)
+        # only a chunk of contigs is held in memory at a time
+        for chunk in gen_contig_chunks(contigs):
+            # clvs that only depend on contig geometry are calculated for all
+            # contigs of the chunk at once
+            assign_contig_clvs(chunk)
+            collect_chunk(chunk, r2c_bam, raw_r2c_bam, r2c_bam_file, ref_fa, buf,
+                          bridge_skip_check_size, dedup_contigs, read_filter,
+                          read_budget, counter, evidence_types, stats,
+                          strandedness, mate_index, io_threads, locality_order)
+        buf.flush()
+    add_hexamer_stats(stats)
 
+    if counter:
+        logging.info('dropped for {0}: {1}'.format(seqname, format_counter(counter)))
     logging.info('collecting polyA evidence for {0} to {1} is done'.format(seqname, tmp_output_file))
-    return tmp_output_file
+    return tmp_output_file, counter, stats
+
+
+def fetch_contigs(c2g_bam, seqname, contig_filter=None, counter=None):
+    """mapped contigs of a seqname, see filters.filter_contigs"""
+    contigs = (_ for _ in c2g_bam.fetch(seqname) if not _.is_unmapped)
+    if contig_filter is not None:
+        contigs = filter_contigs(contigs, contig_filter, counter)
+    return contigs
+
+
+def collect_chunk(contigs, r2c_bam, raw_r2c_bam, r2c_bam_file, ref_fa, buf,
+                  bridge_skip_check_size, dedup_contigs=False, read_filter=None,
+                  read_budget=None, counter=None, evidence_types=None, stats=None,
+                  strandedness=None, mate_index=None, io_threads=0,
+                  locality_order=False):
+    """
+    collect polyA evidence of a chunk of contigs, see collect_polya_evidence
+    for the parameters
+
+    :param contigs: a list of ContigGeometry instances
+    :param raw_r2c_bam: r2c_bam without read filter, for locality ordering
+    :param buf: a record_buffer.ClvRecordBuffer
+    """
+    groups = group_contigs_by_alignment(contigs) if dedup_contigs else None
+    units = contigs if groups is None else groups
+    # indices of units (contigs or groups) in the order they are processed
+    order = list(range(len(units)))
+    if locality_order:
+        order = sort_by_r2c_rank(raw_r2c_bam, [
+            (units[_] if groups is None else units[_][0]).query_name for _ in order])
+    prefetcher = None
+    if io_threads > 0 and R.needs(evidence_types, R.ALL_READS):
+        names = [_.query_name for k in order
+                 for _ in ([units[k]] if groups is None else units[k])]
+        prefetcher = ReadPrefetcher(r2c_bam_file, names, io_threads, read_filter, counter)
+    unit_rows = {}
+    try:
+        for k in order:
+            beg = buf.num_records
+            if groups is not None:
+                do_group_collection(units[k], r2c_bam, ref_fa, buf,
+                                    bridge_skip_check_size, read_budget, counter,
+                                    evidence_types, stats, strandedness, mate_index,
+                                    prefetcher)
+            else:
+                do_collection(units[k], r2c_bam, ref_fa, buf,
+                              bridge_skip_check_size, read_budget, counter,
+                              evidence_types, stats, strandedness, mate_index,
+                              prefetcher)
+            # with locality_order, rows are held back so that they are
+            # written in the original order
+            if locality_order:
+                unit_rows[k] = buf.take_rows(beg)
+            else:
+                buf.maybe_flush()
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+    for k in sorted(unit_rows):
+        for row in unit_rows[k]:
+            buf.writerow(row)
+    buf.maybe_flush()
+
+
+def do_collection(contig, r2c_bam, ref_fa, buf, bridge_skip_check_size,
+                  read_budget=None, counter=None, evidence_types=None, stats=None,
+                  strandedness=None, mate_index=None, prefetcher=None):
+    """
+    :param contig: a ContigGeometry instance, built once per contig so that
+    its geometry and sequence are not re-queried for every read
+    :param buf: a record_buffer.ClvRecordBuffer clv records are appended to
+    :param evidence_types: names of selected evidence types, None for all
+    :param stats: a collections.Counter for seconds spent and records written
+    per evidence type
+    :param strandedness: if stranded, clv candidates not on the transcript
+    strand implied by the contig orientation are pruned
+    :param mate_index: see mate_index.build_mate_index
+    :param prefetcher: a prefetch.ReadPrefetcher, if provided, reads of the
+    contig for bridge and link evidence are taken from it instead of r2c_bam
+    """
+    if evidence_types is None:
+        evidence_types = R.parse_evidence_types()
+    transcript_strand = calc_transcript_strand(contig, strandedness)
+    ctx = EvidenceContext(r2c_bam, ref_fa, buf, transcript_strand, counter)
 
+    # bridge and link reads are analyzed first so that all upstream windows of
+    # the contig are extracted in one go, evidence is still written in the
+    # order of suffix, bridge, link and blank
+    if R.needs(evidence_types, R.ALL_READS):
+        with R.timed(stats, R.ALL_READS):
+            if prefetcher is not None:
+                aligned_reads = prefetcher.get(contig.query_name)
+            else:
+                aligned_reads = r2c_bam.fetch(contig.query_name)
+            ctx.dd_bridge, ctx.dd_link, ctx.reads_subsampled = extract_bridge_and_link(
+                contig, aligned_reads, ref_fa,
+                bridge_skip_check_size, read_budget, counter, evidence_types,
+                transcript_strand, mate_index)
 
-def do_collection(contig, r2c_bam, ref_fa, csvwriter, bridge_skip_check_size):
-    gen_key = apautils.gen_clv_key_tuple_from_clv_record
+    for name in evidence_types:
+        with R.timed(stats, name):
+            clv_keys = R.EVIDENCE_TYPES[name].analyse(contig, ctx)
+        # TODO: with either bridge or link, they probably won't support clv
+        # of the other strand
+        ctx.asc_keys.extend(clv_keys)
+        if stats is not None:
+            stats['records_{0}'.format(name)] += len(clv_keys)
 
-    ascs = []                   # already supported clvs
-    rec = process_suffix(contig, r2c_bam, ref_fa, csvwriter)
-    if rec is not None:
-        ascs.append(gen_key(rec))
 
-    for rec in process_bridge_and_link(contig, r2c_bam, ref_fa, csvwriter, bridge_skip_check_size):
-        # TODO: with either bridge or link, they probably won't support
-        # clv of the other strand
-        ascs.append(gen_key(rec))
+def do_group_collection(group, r2c_bam, ref_fa, buf, bridge_skip_check_size,
+                        read_budget=None, counter=None, evidence_types=None,
+                        stats=None, strandedness=None, mate_index=None,
+                        prefetcher=None):
+    """
+    do_collection for a group of contigs with identical alignments, their clv
+    records are folded before written
+    """
+    if len(group) == 1:
+        do_collection(group[0], r2c_bam, ref_fa, buf, bridge_skip_check_size,
+                      read_budget, counter, evidence_types, stats, strandedness,
+                      mate_index, prefetcher)
+        return
 
-    if not apautils.has_tail(contig):
-        process_blank(contig, ref_fa, csvwriter, ascs)
+    share_contig_caches(group)
+    beg = buf.num_records
+    for contig in group:
+        do_collection(contig, r2c_bam, ref_fa, buf, bridge_skip_check_size,
+                      read_budget, counter, evidence_types, stats, strandedness,
+                      mate_index, prefetcher)
+    for row in fold_clv_rows(buf.take_rows(beg)):
+        buf.writerow(row)
 
 
 def collect_polya_evidence_wrapper(args):
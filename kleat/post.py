@@ -17,12 +17,16 @@ from tqdm import tqdm
 from kleat.misc import utils as U
 from kleat.misc import settings as S
 from kleat.misc.cluster import cluster_clv_sites
+from kleat.misc.chrom_cache import open_reference
+from kleat.hexamer.hexamer import search_ref_hexamers, search_ref_hexamer_profiles
+from kleat.hexamer.scan import best_in_window
 
 logger = logging.getLogger(__name__)
 
 
 def set_sort_join_strs(vals):
-    return '|'.join(sorted(set(vals)))
+    # values may have already been joined, e.g. by contig_dedup.fold_clv_rows
+    return '|'.join(sorted({_ for val in vals for _ in val.split('|')}))
 
 
 # TODO: this is a common pattern to parallelize groupby -> apply operation,
@@ -93,7 +97,8 @@ def aggregate_polya_evidence(df_clv, num_cpus, chunksize=10000):
 def agg_polya_evidence_per(grp):
     sum_cols = grp[S.COLS_TO_SUM].sum().astype(int)
     max_cols = grp[S.COLS_TO_MAX].max().astype(int)
-    any_cols = grp[S.COLS_TO_ANY].any()
+    # READ_BUDGET_COLS are dropped without a read budget
+    any_cols = grp[[_ for _ in S.COLS_TO_ANY if _ in grp.columns]].any()
     str_cols = grp[S.COLS_TO_JOIN].apply(set_sort_join_strs)
     # pick the strongest PAS hexamer
     hex_cols = grp[S.COLS_CONTIG_HEXAMERS].loc[grp.ctg_hex_id.astype(int).idxmax()]
@@ -102,6 +107,79 @@ def agg_polya_evidence_per(grp):
                       str_cols, hex_cols, one_cols])
 
 
+def add_ref_hexamers(df_clv, ref_fa_file):
+    """
+    search PAS hexamers on reference genome once per unique (seqname, strand,
+    clv), used when workers defer the search, see
+    hexamer.defer_ref_hexamers. Sites are searched in one batch per seqname,
+    with its chromosome loaded into memory once
+
+    :returns: df_clv with S.COLS_PICK_ONE replaced
+    """
+    clv_id_cols = ['seqname', 'strand', 'clv']
+    sites = df_clv[clv_id_cols].drop_duplicates()
+    ref_fa = open_reference(ref_fa_file, cache_chromosome=True)
+    dfs = []
+    for seqname, grp in sites.groupby('seqname', sort=False):
+        clvs = grp.clv.astype(int).tolist()
+        hex_tuples = search_ref_hexamers(ref_fa, seqname, list(zip(grp.strand, clvs)))
+        _df = pd.DataFrame(hex_tuples, columns=S.COLS_PICK_ONE)
+        _df['seqname'] = seqname
+        _df['strand'] = grp.strand.values
+        _df['clv'] = clvs
+        dfs.append(_df)
+    df_ref_hex = pd.concat(dfs)
+    ndf_clv = df_clv.drop(S.COLS_PICK_ONE, axis=1)
+    ndf_clv['clv'] = ndf_clv.clv.astype(int)
+    return ndf_clv.merge(df_ref_hex, on=clv_id_cols, how='left')
+
+
+def gen_profile_cols(windows):
+    """columns added by add_ref_hexamer_profiles"""
+    cols = ['ref_hex_mask', 'ref_hex_nearest']
+    for window in windows:
+        cols.extend('{0}_{1}'.format(_, window) for _ in S.COLS_PICK_ONE)
+    return cols
+
+
+def add_ref_hexamer_profiles(df_clv, ref_fa_file, windows):
+    """
+    add a PAS hexamer profile of the reference genome per unique (seqname,
+    strand, clv), i.e. the largest window is fetched and scanned once, and
+    the strongest hexamer of each window is derived from the profile:
+
+    - ref_hex_mask: bit k is set if the k-th hexamer of the table, from the
+      strongest, is found in the largest window
+    - ref_hex_nearest: positions of found hexamers closest to the clv, in the
+      order of set bits, joined by '|'
+    - ref_hex_<window>, ref_hex_id_<window>, ref_hex_pos_<window>: see
+      S.COLS_PICK_ONE
+
+    :param windows: a list of window sizes
+    """
+    clv_id_cols = ['seqname', 'strand', 'clv']
+    sites = df_clv[clv_id_cols].drop_duplicates()
+    ref_fa = open_reference(ref_fa_file, cache_chromosome=True)
+    cols = gen_profile_cols(windows)
+    rows = []
+    for seqname, grp in sites.groupby('seqname', sort=False):
+        clvs = grp.clv.astype(int).tolist()
+        strands = grp.strand.tolist()
+        profiles = search_ref_hexamer_profiles(
+            ref_fa, seqname, list(zip(strands, clvs)), max(windows))
+        for strand, clv, profile in zip(strands, clvs, profiles):
+            row = [seqname, strand, clv, profile.mask,
+                   '|'.join(str(_) for _ in profile.nearest)]
+            for window in windows:
+                hex_tuple = best_in_window(profile, strand, clv, window)
+                row.extend(('NA', -1, -1) if hex_tuple is None else hex_tuple)
+            rows.append(row)
+    df_profile = pd.DataFrame(rows, columns=clv_id_cols + cols)
+    ndf_clv = df_clv.copy()
+    ndf_clv['clv'] = ndf_clv.clv.astype(int)
+    return ndf_clv.merge(df_profile, on=clv_id_cols, how='left')
+
+
 def calc_dist_to_aclv(grp, annot_clvs):
     aclvs = annot_clvs.loc[grp.name]  # grp.name holds the group key
     bcast = np.broadcast_to(grp.clv.values, (aclvs.shape[0], grp.shape[0])).T
@@ -1,57 +1,181 @@
-from kleat.evidence import suffix, bridge, link, blank
-from kleat.misc import apautils
+import numpy as np
 
+from kleat.evidence import suffix, bridge, link, blank, read_batch, read_budget as rb
+from kleat.evidence import registry as R
+from kleat.evidence import mate_index as mi
+from kleat.hexamer import xseq
+from kleat.misc import clv_key as CK
+from kleat.misc.strandedness import is_on_strand
 
-def process_suffix(contig, r2c_bam, ref_fa, csvwriter):
-    tail_side = apautils.has_tail(contig)
-    if tail_side is not None:
-        clv_record = suffix.gen_clv_record(contig, r2c_bam, tail_side, ref_fa)
-        apautils.write_row(clv_record, csvwriter)
-        return clv_record
+
+def process_suffix(contig, r2c_bam, ref_fa, buf):
+    """
+    :param contig: a ContigGeometry instance
+    :returns: a list of clv keys written
+    """
+    tail_side = contig.tail_side
+    if tail_side is None:
+        return []
+    strand, ref_clv = suffix.append_clv_record(buf, contig, r2c_bam, tail_side, ref_fa)
+    return [CK.encode_clv_key(contig.reference_id, strand, ref_clv)]
+
+
+def process_blank(contig, ref_fa, buf, asp_clv_keys, transcript_strand=None,
+                  pruned=None):
+    """
+    :param asp_clv_keys: list of already supported clv keys (ints)
+    :param pruned: see blank.write_two_clv_records
+    :returns: a list of clv keys written
+    """
+    return blank.write_two_clv_records(
+        contig, ref_fa, set(asp_clv_keys), buf, transcript_strand, pruned)
+
+
+class EvidenceContext(object):
+    """inputs and intermediate results of a contig shared by evidence types"""
+    def __init__(self, r2c_bam, ref_fa, buf, transcript_strand=None, counter=None):
+        self.r2c_bam = r2c_bam
+        self.ref_fa = ref_fa
+        self.buf = buf                  # a record_buffer.ClvRecordBuffer
+        self.transcript_strand = transcript_strand  # see strandedness
+        self.counter = counter
+
+        # set by extract_bridge_and_link
+        self.dd_bridge = bridge.init_evidence_holder()
+        self.dd_link = link.init_evidence_holder()
+        self.reads_subsampled = False
+
+        self.asc_keys = []      # keys of already supported clvs
+
+
+@R.register('suffix')
+def analyse_suffix(contig, ctx):
+    if (contig.tail_side is not None and not is_on_strand(
+            suffix.calc_strand(contig.tail_side), ctx.transcript_strand)):
+        count_pruned(ctx.counter)
+        return []
+    return process_suffix(contig, ctx.r2c_bam, ctx.ref_fa, ctx.buf)
 
 
-def process_bridge_and_link(contig, r2c_bam, ref_fa, csvwriter, bridge_skip_check_size):
-    # bridge & link
-    aligned_reads = r2c_bam.fetch(contig.query_name)
-    dd_bridge, dd_link = extract_bridge_and_link(
-        contig, aligned_reads, ref_fa, bridge_skip_check_size)
-    bdg_clvs, lnk_clvs = [], []
-    if len(dd_bridge['num_reads']) > 0:
-        bdg_clvs.extend(
-            bridge.write_evidence(dd_bridge, contig, ref_fa, csvwriter))
-    if len(dd_link['num_reads']) > 0:
-        lnk_clvs.extend(
-            link.write_evidence(dd_link, contig, ref_fa, csvwriter))
-    return bdg_clvs + lnk_clvs
+@R.register('bridge')
+def analyse_bridge(contig, ctx):
+    if len(ctx.dd_bridge['num_reads']) == 0:
+        return []
+    return bridge.write_evidence(
+        ctx.dd_bridge, contig, ctx.ref_fa, ctx.buf, ctx.reads_subsampled)
 
 
-def process_blank(contig, ref_fa, csvwriter, asp_clv_keys):
-    """:param asp_clv_keys: list of already supported clv key tuples"""
-    asp_clv_keys = set(asp_clv_keys)
-    for clv_rec in blank.gen_two_clv_records(contig, ref_fa, asp_clv_keys):
-        apautils.write_row(clv_rec, csvwriter)
+@R.register('link')
+def analyse_link(contig, ctx):
+    if len(ctx.dd_link['num_reads']) == 0:
+        return []
+    return link.write_evidence(
+        ctx.dd_link, contig, ctx.ref_fa, ctx.buf, ctx.reads_subsampled)
 
 
-def extract_bridge_and_link(contig, aligned_reads, ref_fa, bridge_skip_check_size):
+@R.register('blank')
+def analyse_blank(contig, ctx):
     """
-    bridge and link are processed together by looping throught reads aligned to
-    the contig
+    only clvs supported by the other selected evidence types are excluded
+    """
+    if contig.tail_side is not None:
+        return []
+    pruned = []
+    res = process_blank(contig, ctx.ref_fa, ctx.buf, ctx.asc_keys,
+                        ctx.transcript_strand, pruned)
+    count_pruned(ctx.counter, len(pruned))
+    return res
+
+
+def count_pruned(counter, num=1):
+    if counter is not None and num:
+        counter['clvs_pruned_by_strand'] += num
+
+
+def extract_bridge_and_link(contig, aligned_reads, ref_fa, bridge_skip_check_size,
+                            read_budget=None, counter=None, evidence_types=None,
+                            transcript_strand=None, mate_index=None):
+    """
+    bridge and link are processed together by loading reads aligned to the
+    contig into a ReadBatch and classifying them array-wise
 
-    :param contig: a pysam.libcalignedsegment.AlignedSegment instance
+    :param contig: a ContigGeometry instance
     :param aligned_reads: a pysam.libcalignmentfile.IteratorRowRegion instance
+    :param read_budget: a read_budget.ReadBudget, past which read counts are
+    estimated from a sample of aligned_reads
+    :param counter: a collections.Counter for reads skipped by the budget
+    :param evidence_types: names of selected evidence types, None for all.
+    Bridge or link reads are only analyzed if selected
+    :param transcript_strand: if known, bridge and link clvs on the other
+    strand are pruned before any upstream window is extracted
+    :param mate_index: if provided, mapped reads whose polyA/T mates are
+    found in it are counted as link reads, too, see mate_index
+    :returns: a tuple of (dd_bridge, dd_link, reads_subsampled)
     """
+    if evidence_types is None:
+        evidence_types = R.parse_evidence_types()
     dd_bridge = bridge.init_evidence_holder()
     dd_link = link.init_evidence_holder()
-    for read in aligned_reads:
-        if bridge.is_a_bridge_read(read):
-            bdg_evid = bridge.analyze_bridge(
-                contig, read, ref_fa, dd_bridge, bridge_skip_check_size)
-            if bdg_evid is not None:
-                bridge.update_evidence(bdg_evid, dd_bridge)
-            # else: if bdg_evid is None, the bridge read is likely to be be
-            # aligned to a chimeric contig, depending on which part of the
-            # chimeric contig, it may or may not support a bridge clv
-        elif link.is_a_link_read(read):
-            link_evid = link.analyze_link(contig, read)
-            link.update_evidence(link_evid, dd_link)
-    return dd_bridge, dd_link
+
+    reads_subsampled, scale = False, 1
+    if read_budget is not None:
+        aligned_reads, num_seen, is_timed_out = rb.sample_reads(
+            aligned_reads, read_budget, rb.gen_seed(contig.query_name))
+        is_over_budget = num_seen > len(aligned_reads)
+        reads_subsampled = is_timed_out or is_over_budget
+        if reads_subsampled and counter is not None:
+            if is_over_budget:
+                counter['reads_skipped_by_budget'] += num_seen - len(aligned_reads)
+                counter['contigs_over_read_budget'] += 1
+            if is_timed_out:
+                counter['contigs_over_time_budget'] += 1
+        if len(aligned_reads) > 0:
+            scale = num_seen / len(aligned_reads)
+
+    with_mates = mate_index is not None and 'link' in evidence_types
+    batch = read_batch.load_read_batch(aligned_reads, with_names=with_mates)
+    tail_sides = read_batch.calc_tail_sides(batch)
+    # bridge reads are never link reads, so is_bridge is needed by both
+    is_bridge = bridge.is_a_bridge_read_batch(batch, tail_sides)
+    if 'link' in evidence_types:
+        is_link = ~is_bridge & link.is_a_link_read_batch(batch)
+    else:
+        is_link = np.zeros_like(is_bridge)
+
+    # bridge reads whose clv can't be derived are likely to be aligned to a
+    # chimeric contig, depending on which part of the chimeric contig, it may
+    # or may not support a bridge clv
+    if 'bridge' in evidence_types:
+        bdg_groups = bridge.group_bridge_reads(contig, batch, tail_sides, is_bridge)
+    else:
+        bdg_groups = []
+    mate_polyT = []
+    if with_mates:
+        mate_polyT = mi.lookup_mates(
+            batch, mi.gen_mate_candidates(batch, is_bridge | is_link), mate_index)
+
+    if transcript_strand is not None:
+        num_groups = len(bdg_groups)
+        bdg_groups = [_ for _ in bdg_groups if _[0] == transcript_strand]
+        count_pruned(counter, num_groups - len(bdg_groups))
+
+    # all upstream windows of the contig (suffix, bridge, link and blank) are
+    # extracted together with one walk of the cigar per strand
+    with_ends = (('blank' in evidence_types and contig.tail_side is None)
+                 or bool(is_link.any()) or len(mate_polyT) > 0)
+    queries = xseq.gen_contig_window_queries(
+        contig, with_ends, with_suffix='suffix' in evidence_types)
+    queries.extend((strand, ctg_clv, ref_clv)
+                   for strand, ref_clv, ctg_clv, _, _ in bdg_groups)
+    queries = [_ for _ in queries if is_on_strand(_[0], transcript_strand)]
+    xseq.prefetch_windows(contig, ref_fa, queries)
+
+    bridge.analyze_bridge_groups(contig, bdg_groups, ref_fa, dd_bridge)
+    count_pruned(counter, link.analyze_link_batch(
+        contig, batch, is_link, dd_link, transcript_strand))
+    count_pruned(counter, link.update_link_evidence(
+        contig, mate_polyT, dd_link, transcript_strand))
+    if scale != 1:
+        rb.scale_counts(dd_bridge['num_reads'], scale)
+        rb.scale_counts(dd_link['num_reads'], scale)
+    return dd_bridge, dd_link, reads_subsampled
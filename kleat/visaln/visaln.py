@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 
 import kleat.misc.settings as S
+from kleat.misc.cigar_engine import build_cigar_blocks, calc_genome_coords
 
 
 """
@@ -234,25 +235,6 @@ def convert_contig2genome_coord(target_ctg_pos, contig_aln):
     """
     :param ctg_pos: target position in contig coordinate
     """
-    ref_pos = get_abs_start(contig_aln)
-    ctg_pos = 0
-    for k, (key, val) in enumerate(contig_aln.cigartuples):
-        if key in [S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP]:
-            ctg_pos += val
-            ref_pos += val
-        elif key == S.BAM_CMATCH:
-            ctg_pos += val
-            ref_pos += val
-        elif key == S.BAM_CREF_SKIP:
-            ref_pos += val
-        elif key == S.BAM_CDEL:
-            ref_pos += val
-        elif key == S.BAM_CINS:
-            ctg_pos += val
-        else:
-            raise ValueError('unknown cigar key: {0}'.format(key))
-
-        if ctg_pos >= target_ctg_pos:
-            target_ref_pos = ref_pos - (ctg_pos - target_ctg_pos)
-            return target_ref_pos
-    raise ValueError('position is outside of the contig?')
+    blocks = build_cigar_blocks(contig_aln.cigartuples)
+    ref_pos = calc_genome_coords(blocks, [target_ctg_pos], get_abs_start(contig_aln))
+    return int(ref_pos[0])
@@ -0,0 +1,37 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from kleat.evidence import blank
+from kleat.misc.record_buffer import ClvRecordBuffer
+
+
+@pytest.mark.parametrize('transcript_strand, expected_strands, expected_pruned', [
+    [None, ['+', '-'], []],
+    ['+', ['+'], [('-', 10)]],
+    ['-', ['-'], [('+', 19)]],
+])
+@patch('kleat.evidence.blank.gen_contig_reference_hexamer_tuple')
+@patch('kleat.evidence.blank.gen_contig_hexamer_tuple')
+@patch('kleat.evidence.blank.get_is_hardclipped')
+@patch('kleat.evidence.blank.get_contig_clvs')
+def test_write_two_clv_records_reports_pruned_candidates(
+        mock_get_contig_clvs, mock_get_is_hardclipped, mock_gen_ctg_hex,
+        mock_gen_ref_hex, transcript_strand, expected_strands, expected_pruned):
+    clvs = mock_get_contig_clvs.return_value
+    clvs.plus_ref_clv, clvs.plus_ctg_clv = 19, 9
+    clvs.minus_ref_clv, clvs.minus_ctg_clv = 10, 0
+    mock_get_is_hardclipped.return_value = False
+    mock_gen_ctg_hex.return_value = ('NA', -1, -1)
+    mock_gen_ref_hex.return_value = ('NA', -1, -1)
+    contig = MagicMock()
+    contig.reference_id = 0
+
+    buf = ClvRecordBuffer(io.StringIO())
+    pruned = []
+    clv_keys = blank.write_two_clv_records(
+        contig, None, set(), buf, transcript_strand, pruned)
+    assert len(clv_keys) == len(expected_strands)
+    assert [_[1] for _ in buf.take_rows(0)] == expected_strands
+    assert pruned == expected_pruned
@@ -0,0 +1,86 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from kleat.evidence import mate_index as mi
+from kleat.evidence.read_batch import load_read_batch
+
+
+def get_mock_read(name, seq, ref_id, next_ref_id, is_read1=True,
+                  is_unmapped=False, ref_beg=10, is_reverse=False):
+    r = MagicMock()
+    r.query_name = name
+    r.query_sequence = seq
+    r.reference_id = ref_id
+    r.next_reference_id = next_ref_id
+    r.reference_start = ref_beg
+    r.reference_end = None if is_unmapped else ref_beg + len(seq)
+    r.is_read1 = is_read1
+    r.is_unmapped = is_unmapped
+    r.is_reverse = is_reverse
+    r.mate_is_unmapped = False
+    r.cigartuples = None if is_unmapped else [(0, len(seq))]
+    return r
+
+
+def test_build_mate_index():
+    reads = [
+        # unplaced polyT read
+        get_mock_read('r0', 'TTTTT', -1, -1, is_read1=False, is_unmapped=True, ref_beg=-1),
+        # polyA read placed on another contig
+        get_mock_read('r1', 'AAAAA', 3, 0, is_read1=True, is_unmapped=True),
+        # placed with its mate, handled as a link read already
+        get_mock_read('r2', 'AAAAA', 0, 0, is_unmapped=True),
+        # not polyA/T
+        get_mock_read('r3', 'AAAAC', -1, -1, is_unmapped=True, ref_beg=-1),
+        get_mock_read('r4', '', -1, -1, is_unmapped=True, ref_beg=-1),
+    ]
+    assert mi.build_mate_index(reads) == {
+        ('r0', False): (-1, -1, True),
+        ('r1', True): (3, 10, False),
+    }
+
+
+def test_build_mate_index_with_reverse_mapped_reads():
+    reads = [
+        # polyA read aligned in reverse, stored as TTTTT
+        get_mock_read('r0', 'TTTTT', 3, 0, is_reverse=True),
+        # polyT read aligned in reverse, stored as AAAAA
+        get_mock_read('r1', 'AAAAA', 3, 0, is_read1=False, is_reverse=True),
+    ]
+    assert mi.build_mate_index(reads) == {
+        ('r0', True): (3, 10, False),
+        ('r1', False): (3, 10, True),
+    }
+
+
+def test_gen_work_unit_reads():
+    r2c_bam = MagicMock()
+    r2c_bam.fetch.side_effect = lambda name: iter([name + '_read'])
+    assert list(mi.gen_work_unit_reads(r2c_bam, ['c0', 'c1'])) == [
+        'c0_read', 'c1_read']
+
+
+def test_lookup_mates():
+    mate_index = {
+        ('r0', False): mi.MateInfo(-1, -1, True),
+        ('r1', False): mi.MateInfo(3, 10, False),
+        ('r2', True): mi.MateInfo(-1, -1, True),     # r2 itself, not its mate
+        ('r3', False): mi.MateInfo(0, 10, False),    # placed on the same contig
+    }
+    reads = [
+        get_mock_read('r0', 'ACGTA', 0, -1),
+        get_mock_read('r1', 'ACGTA', 0, 3),
+        get_mock_read('r2', 'ACGTA', 0, -1),
+        get_mock_read('r3', 'ACGTA', 0, 1),
+        get_mock_read('r4', 'ACGTA', 0, -1),
+        get_mock_read('r5', 'ACGTA', 0, 0),          # mate on the same contig
+    ]
+    batch = load_read_batch(reads, with_names=True)
+    is_candidate = mi.gen_mate_candidates(batch, np.zeros(len(reads), dtype=bool))
+    assert is_candidate.tolist() == [True, True, True, True, True, False]
+    assert mi.lookup_mates(batch, is_candidate, mate_index) == [True, False]
+
+    exclude = np.array([True, False, False, False, False, False])
+    is_candidate = mi.gen_mate_candidates(batch, exclude)
+    assert mi.lookup_mates(batch, is_candidate, mate_index) == [False]
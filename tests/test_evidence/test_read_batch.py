@@ -0,0 +1,146 @@
+import random
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+import kleat.misc.settings as S
+from kleat.evidence import read_batch as RB
+from kleat.evidence import bridge, link, suffix
+from kleat.evidence.do_bridge import do_bridge, do_bridge_batch
+from kleat.misc import apautils
+
+
+def get_mock_read(seq, ref_beg, cigartuples, mate_is_unmapped=False,
+                  reference_id=0, next_reference_id=0, is_unmapped=False):
+    r = MagicMock()
+    r.query_sequence = seq
+    r.reference_start = ref_beg
+    r.reference_end = ref_beg + sum(
+        val for key, val in cigartuples if key == S.BAM_CMATCH)
+    r.cigartuples = cigartuples
+    r.is_unmapped = is_unmapped
+    r.mate_is_unmapped = mate_is_unmapped
+    r.reference_id = reference_id
+    r.next_reference_id = next_reference_id
+    return r
+
+
+def gen_random_reads(num, seed=0):
+    rng = random.Random(seed)
+    reads = []
+    for _ in range(num):
+        kind = rng.choice(['plain', 'left', 'right', 'polyA', 'polyT', 'almost'])
+        mlen = rng.randint(1, 8)
+        body = ''.join(rng.choice('ACGT') for _ in range(mlen))
+        tlen = rng.randint(1, 5)
+        if kind == 'left':
+            seq, cgts = 'T' * tlen + body, [(S.BAM_CSOFT_CLIP, tlen), (S.BAM_CMATCH, mlen)]
+        elif kind == 'right':
+            seq, cgts = body + 'A' * tlen, [(S.BAM_CMATCH, mlen), (S.BAM_CSOFT_CLIP, tlen)]
+        elif kind == 'polyA':
+            seq, cgts = 'A' * mlen, [(S.BAM_CMATCH, mlen)]
+        elif kind == 'polyT':
+            seq, cgts = 'T' * mlen, [(S.BAM_CMATCH, mlen)]
+        elif kind == 'almost':
+            seq, cgts = 'TTGT' + body + 'AACA', [
+                (S.BAM_CSOFT_CLIP, 4), (S.BAM_CMATCH, mlen), (S.BAM_CSOFT_CLIP, 4)]
+        else:
+            seq, cgts = body, [(S.BAM_CMATCH, mlen)]
+        reads.append(get_mock_read(
+            seq, rng.randint(0, 20), cgts,
+            mate_is_unmapped=rng.random() < 0.2,
+            next_reference_id=rng.choice([0, 0, 0, 1])))
+    return reads
+
+
+@pytest.mark.parametrize("seqs", [
+    [],
+    ['TTTACG', 'ACGAAA', 'AAAA', 'TTTT', 'ACGT', 'T', 'A', 'C'],
+    ['TATA', 'ATAT', 'TTAA', 'AATT'],
+])
+def test_calc_homopolymer_runs(seqs):
+    offsets = np.cumsum([0] + [len(_) for _ in seqs])
+    buf = np.frombuffer(''.join(seqs).encode('ascii'), dtype=np.uint8)
+    lead_T, trail_A = RB.calc_homopolymer_runs(buf, offsets)
+    assert lead_T.tolist() == [len(s) - len(s.lstrip('T')) for s in seqs]
+    assert trail_A.tolist() == [len(s) - len(s.rstrip('A')) for s in seqs]
+
+
+def test_calc_tail_sides_is_consistent_with_has_tail():
+    reads = gen_random_reads(200)
+    batch = RB.load_read_batch(reads)
+    side_dd = {None: RB.NO_TAIL, 'left': RB.LEFT_TAIL, 'right': RB.RIGHT_TAIL}
+    expected = [side_dd[apautils.has_tail(r)] for r in reads]
+    assert RB.calc_tail_sides(batch).tolist() == expected
+
+
+@pytest.mark.parametrize('n', [-10, -3, -1, 0, 1, 2, 3, 10])
+def test_match_leading_T_and_trailing_A_follow_python_slicing(n):
+    seqs = ['TTTACGAAA', 'TTT', 'AAA', 'ACG', 'T', 'A']
+    batch = RB.load_read_batch(
+        [get_mock_read(s, 0, [(S.BAM_CMATCH, len(s))]) for s in seqs])
+    ns = np.full(len(seqs), n)
+    assert RB.match_leading_T(batch, ns).tolist() == [set(s[0:n]) == {'T'} for s in seqs]
+    assert RB.match_trailing_A(batch, ns).tolist() == [set(s[-n:]) == {'A'} for s in seqs]
+
+
+def test_is_a_link_read_batch_is_consistent_with_is_a_link_read():
+    reads = gen_random_reads(200, seed=1)
+    batch = RB.load_read_batch(reads)
+    expected = [bool(link.is_a_link_read(r)) for r in reads]
+    assert link.is_a_link_read_batch(batch).tolist() == expected
+
+
+@pytest.mark.parametrize('is_reverse', [True, False])
+@pytest.mark.parametrize('cigartuples', [
+    ((S.BAM_CMATCH, 30),),
+    ((S.BAM_CHARD_CLIP, 3), (S.BAM_CMATCH, 27)),
+    ((S.BAM_CMATCH, 25), (S.BAM_CHARD_CLIP, 5)),
+])
+def test_do_bridge_batch_is_consistent_with_do_bridge(is_reverse, cigartuples):
+    contig = MagicMock()
+    contig.is_reverse = is_reverse
+    contig.infer_query_length.return_value = 30
+    contig.cigartuples = cigartuples
+
+    reads = gen_random_reads(200, seed=2)
+    batch = RB.load_read_batch(reads)
+    tail_sides = RB.calc_tail_sides(batch)
+    is_bridge = bridge.is_a_bridge_read_batch(batch, tail_sides)
+    is_valid, is_plus, ctg_clvs, tail_lens, is_left = do_bridge_batch(
+        contig, batch, tail_sides, is_bridge)
+
+    for k, read in enumerate(reads):
+        res = do_bridge(contig, read) if bridge.is_a_bridge_read(read) else None
+        if res is None:
+            assert not is_valid[k]
+        else:
+            assert is_valid[k]
+            assert res == ('+' if is_plus[k] else '-', ctg_clvs[k], tail_lens[k],
+                           'left' if is_left[k] else 'right')
+
+
+@pytest.mark.parametrize('is_reverse', [True, False])
+@pytest.mark.parametrize('contig_seq, cigartuples', [
+    ['TTTATCGC', [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 5)]],
+    ['ATCGCAAA', [(S.BAM_CMATCH, 5), (S.BAM_CSOFT_CLIP, 3)]],
+    ['ATCGCATC', [(S.BAM_CMATCH, 8)]],
+])
+def test_is_a_suffix_read_batch_is_consistent_with_is_a_suffix_read(
+        is_reverse, contig_seq, cigartuples):
+    contig = MagicMock()
+    contig.is_reverse = is_reverse
+    contig.query_sequence = contig_seq
+    contig.cigartuples = cigartuples
+    contig.infer_query_length.return_value = len(contig_seq)
+
+    reads = gen_random_reads(200, seed=3)
+    batch = RB.load_read_batch(reads)
+    for ctg_clv in range(len(contig_seq)):
+        is_suffix, tail_lens = suffix.is_a_suffix_read_batch(batch, contig, ctg_clv)
+        for k, read in enumerate(reads):
+            tail_len = suffix.is_a_suffix_read(read, contig, ctg_clv)
+            assert is_suffix[k] == (tail_len is not None)
+            if tail_len is not None:
+                assert tail_lens[k] == tail_len
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from unittest.mock import patch
+
+from kleat.evidence import read_budget as rb
+
+
+def test_gen_read_budget_returns_none_if_there_is_no_budget():
+    assert rb.gen_read_budget() is None
+    assert rb.gen_read_budget(0, 0) is None
+    assert rb.gen_read_budget(100) == (100, 0)
+    assert rb.gen_read_budget(max_seconds=1.5) == (0, 1.5)
+
+
+def test_sample_reads_within_budget():
+    reads = list(range(10))
+    res = rb.sample_reads(iter(reads), rb.gen_read_budget(10), seed=1)
+    assert res == (reads, 10, False)
+
+
+def test_sample_reads_over_budget_is_deterministic():
+    reads = list(range(1000))
+    budget = rb.gen_read_budget(50)
+    sampled, num_seen, is_timed_out = rb.sample_reads(
+        iter(reads), budget, rb.gen_seed('contig1'))
+    assert len(sampled) == 50
+    assert len(set(sampled)) == 50
+    assert num_seen == 1000
+    assert not is_timed_out
+    assert rb.sample_reads(iter(reads), budget, rb.gen_seed('contig1'))[0] == sampled
+    assert rb.sample_reads(iter(reads), budget, rb.gen_seed('contig2'))[0] != sampled
+
+
+@patch('kleat.evidence.read_budget.time')
+def test_sample_reads_stops_after_time_limit(mock_time):
+    # the clock is read for the deadline, then checked before the first read
+    # and every TIME_CHECK_INTERVAL reads
+    mock_time.monotonic.side_effect = [0, 0, 0.5, 2]
+    reads = range(rb.TIME_CHECK_INTERVAL * 10)
+    sampled, num_seen, is_timed_out = rb.sample_reads(
+        iter(reads), rb.gen_read_budget(max_seconds=1), seed=1)
+    assert num_seen == rb.TIME_CHECK_INTERVAL * 2
+    assert sampled == list(range(num_seen))
+    assert is_timed_out
+
+
+@patch('kleat.evidence.read_budget.time')
+def test_sample_reads_stops_before_the_first_read(mock_time):
+    mock_time.monotonic.side_effect = [0, 2]
+    res = rb.sample_reads(iter(range(10)), rb.gen_read_budget(max_seconds=1), seed=1)
+    assert res == ([], 0, True)
+
+
+def test_scale_counts():
+    dd = defaultdict(int, {('chr1', '+', 10): 3, ('chr1', '-', 20): 1})
+    rb.scale_counts(dd, 2.5)
+    assert dd == {('chr1', '+', 10): 8, ('chr1', '-', 20): 2}
@@ -0,0 +1,79 @@
+import argparse
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+
+import kleat.proc                # noqa: F401, registers the evidence types
+from kleat.evidence import registry as R
+from kleat.args import evidence_types
+
+
+def test_evidence_types_are_registered_in_the_order_written():
+    assert list(R.EVIDENCE_TYPES) == ['suffix', 'bridge', 'link', 'blank']
+    assert R.parse_evidence_types() == ('suffix', 'bridge', 'link', 'blank')
+    assert [_.data_needs for _ in R.EVIDENCE_TYPES.values()] == [
+        R.CLV_READS, R.ALL_READS, R.ALL_READS, R.CONTIG_ONLY]
+    assert all(_.analyse is not None for _ in R.EVIDENCE_TYPES.values())
+
+
+def test_parsing_args_does_not_import_proc():
+    code = ('import sys; from kleat.args import evidence_types; '
+            'assert evidence_types("blank") == ("blank",); '
+            'assert "kleat.proc" not in sys.modules')
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+@pytest.mark.parametrize('names, expected', [
+    ['blank,suffix', ('suffix', 'blank')],
+    [' link , bridge,', ('bridge', 'link')],
+    ['suffix,suffix', ('suffix',)],
+])
+def test_parse_evidence_types(names, expected):
+    assert R.parse_evidence_types(names) == expected
+
+
+def test_parse_evidence_types_raises_for_unknown_types():
+    with pytest.raises(ValueError, match='unknown evidence type'):
+        R.parse_evidence_types('suffix,tail')
+
+
+def test_evidence_types_is_an_argparse_type():
+    assert evidence_types('blank,suffix') == ('suffix', 'blank')
+    with pytest.raises(argparse.ArgumentTypeError, match='unknown evidence type'):
+        evidence_types('suffix,tail')
+
+
+@pytest.mark.parametrize('evidence_types, data_need, expected', [
+    [('suffix', 'bridge', 'link', 'blank'), R.ALL_READS, True],
+    [('suffix', 'blank'), R.ALL_READS, False],
+    [('suffix', 'blank'), R.CLV_READS, True],
+    [('link',), R.ALL_READS, True],
+    [('link',), R.CONTIG_ONLY, False],
+])
+def test_needs(evidence_types, data_need, expected):
+    assert R.needs(evidence_types, data_need) == expected
+
+
+def test_timed():
+    stats = Counter()
+    with R.timed(stats, 'suffix'):
+        pass
+    with R.timed(None, 'suffix'):
+        pass
+    assert list(stats) == ['seconds_suffix']
+    assert stats['seconds_suffix'] >= 0
+
+
+def test_format_stats():
+    stats = Counter({'records_bridge': 3, 'seconds_bridge': 0.123})
+    assert R.format_stats(stats) == 'records_bridge: 3, bridge: 0.12s'
+
+
+def test_format_stats_with_cache_hit_rates():
+    stats = Counter({'cache_hits_ref_hexamer': 3, 'cache_misses_ref_hexamer': 1,
+                     'cache_hits_ctg_hexamer': 0, 'cache_misses_ctg_hexamer': 0})
+    assert R.format_stats(stats) == (
+        'ctg_hexamer cache hit rate: 0/0 (0.0%), '
+        'ref_hexamer cache hit rate: 3/4 (75.0%)')
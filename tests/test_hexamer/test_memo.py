@@ -0,0 +1,62 @@
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+
+from kleat.hexamer import memo as M
+from kleat.hexamer.hexamer import gen_reference_hexamer_tuple, search_contig_window
+
+
+@pytest.fixture
+def caches():
+    M.init_hexamer_caches(2)
+    yield M.CACHES
+    M.init_hexamer_caches()
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = M.LRUCache(2)
+    func = MagicMock(side_effect=lambda k: k * 10)
+    assert cache.get(1, func, 1) == 10
+    assert cache.get(2, func, 2) == 20
+    assert cache.get(1, func, 1) == 10
+    assert cache.get(3, func, 3) == 30
+    assert list(cache.data) == [1, 3]
+    assert cache.get(2, func, 2) == 20
+    assert func.call_count == 4
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_caches_are_disabled_by_default():
+    assert M.get_cache('ref_hexamer') is None
+    assert M.get_cache('ctg_hexamer') is None
+    stats = Counter()
+    M.add_hexamer_stats(stats)
+    assert stats == Counter()
+
+
+def test_gen_reference_hexamer_tuple_with_worker_cache(caches):
+    ref_fa = MagicMock()
+    ref_fa.get_reference_length.return_value = 100
+    ref_fa.fetch.return_value = 'CCAATAAACCCCCCCCCCCCCCCCC'
+    res = gen_reference_hexamer_tuple(ref_fa, 'chr1', '+', 30)
+    assert res == ('AATAAA', 16, 8)
+    # shared across contigs, i.e. their per-contig caches
+    assert gen_reference_hexamer_tuple(ref_fa, 'chr1', '+', 30, cache={}) == res
+    assert ref_fa.fetch.call_count == 1
+
+    stats = Counter()
+    M.add_hexamer_stats(stats)
+    assert stats == Counter({'cache_hits_ref_hexamer': 1, 'cache_misses_ref_hexamer': 1})
+    # counters are reset once added
+    M.add_hexamer_stats(stats)
+    assert stats['cache_misses_ref_hexamer'] == 1
+
+
+def test_search_contig_window_with_worker_cache(caches):
+    seq = 'CCAATAAACCCCCCCCCCCCCCCCC'
+    assert search_contig_window('+', 30, seq) == ('AATAAA', 16, 8)
+    # the same window at another clv isn't the same result
+    assert search_contig_window('+', 31, seq) == ('AATAAA', 16, 9)
+    assert search_contig_window('+', 30, seq) == ('AATAAA', 16, 8)
+    assert (caches['ctg_hexamer'].hits, caches['ctg_hexamer'].misses) == (1, 2)
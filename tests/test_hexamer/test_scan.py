@@ -0,0 +1,190 @@
+import random
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.misc.apautils import reverse_complement
+from kleat.hexamer import scan as SC
+
+
+def rfind_plus_search(seq, right_coord):
+    """the previous implementation of search.plus_search"""
+    seq = seq.upper()
+    left_coord = right_coord - len(seq) + 1
+    for (hmr, hid) in S.CANDIDATE_HEXAMERS:
+        idx = seq.rfind(hmr)
+        if idx > -1:
+            return hmr, hid, idx + left_coord
+
+
+def rfind_minus_search(seq, left_coord):
+    """the previous implementation of search.minus_search"""
+    seq = reverse_complement(seq.upper())
+    for (hmr, hid) in S.CANDIDATE_HEXAMERS:
+        idx = seq.rfind(hmr)
+        if idx > -1:
+            return hmr, hid, len(seq) - idx + left_coord - 1
+
+
+def gen_random_seqs(num, seed=0):
+    rng = random.Random(seed)
+    # biased to A/T so that hexamers are found often
+    alphabet = 'AAAATTTCGNatcgR'
+    res = []
+    for _ in range(num):
+        seq = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        # plant a few candidate hexamers
+        for _ in range(rng.randint(0, 3)):
+            hmr = rng.choice(S.CANDIDATE_HEXAMERS)[0]
+            if rng.random() < 0.5:
+                hmr = reverse_complement(hmr)
+            idx = rng.randint(0, len(seq))
+            seq = seq[:idx] + hmr + seq[idx:]
+        res.append(seq)
+    return res
+
+
+SEQS = gen_random_seqs(2000)
+
+# the default table is searched with str.rfind, this one is scanned
+SCANNED_TABLE = SC.compile_hexamer_table(max_find_hexamers=0)
+
+
+@pytest.mark.parametrize('kmer, code', [
+    ['AAAAAA', 0],
+    ['TTTTTT', 4095],
+    ['AATAAA', 0b000011000000],
+    ['aataaa', 0b000011000000],
+])
+def test_encode_kmer(kmer, code):
+    assert SC.encode_kmer(kmer) == code
+
+
+def test_encode_kmer_raises_for_non_acgt():
+    with pytest.raises(ValueError):
+        SC.encode_kmer('AATNAA')
+
+
+def test_reverse_complement_code():
+    for hmr, _ in S.CANDIDATE_HEXAMERS:
+        assert (SC.reverse_complement_code(SC.encode_kmer(hmr))
+                == SC.encode_kmer(reverse_complement(hmr)))
+
+
+def test_compile_hexamer_table():
+    table = SC.DEFAULT_TABLE
+    assert len(table.plus_ranks) == len(table.minus_ranks) == 4096
+    assert table.plus_ranks[SC.encode_kmer('AATAAA')] == 0
+    assert table.minus_ranks[SC.encode_kmer('TTTATT')] == 0
+    assert table.plus_ranks[SC.encode_kmer('GGGGCT')] == 15
+    assert table.plus_ranks[SC.encode_kmer('CCCCCC')] == 16
+
+
+@pytest.mark.parametrize('table', [SC.DEFAULT_TABLE, SCANNED_TABLE])
+def test_scan_plus_is_the_same_as_rfind(table):
+    for seq in SEQS:
+        assert SC.scan_plus(seq, 100, table) == rfind_plus_search(seq, 100), seq
+
+
+@pytest.mark.parametrize('table', [SC.DEFAULT_TABLE, SCANNED_TABLE])
+def test_scan_minus_is_the_same_as_rfind(table):
+    for seq in SEQS:
+        assert SC.scan_minus(seq, 100, table) == rfind_minus_search(seq, 100), seq
+
+
+@pytest.mark.parametrize('hexamers, max_find_hexamers, is_found', [
+    [None, 24, True],
+    [None, 15, False],
+    [[('AATAAA', 1)], 24, True],
+    [[('AATAAA', 2), ('AWTAAA', 1)], 24, False],
+])
+def test_compile_hexamer_table_find_hexamers(hexamers, max_find_hexamers, is_found):
+    table = SC.compile_hexamer_table(hexamers, max_find_hexamers)
+    assert (table.find_hexamers is not None) == is_found
+    if is_found:
+        assert table.find_hexamers[0] == ('AATAAA', 'TTTATT')
+
+
+def test_decode_kmer():
+    for hmr, _ in S.CANDIDATE_HEXAMERS:
+        assert SC.decode_kmer(SC.encode_kmer(hmr)) == hmr
+
+
+def test_scan_batch_is_the_same_as_rfind():
+    rng = random.Random(1)
+    strands = [rng.choice('+-') for _ in SEQS]
+    coords = [rng.randint(0, 1000) for _ in SEQS]
+    expected = [
+        rfind_plus_search(seq, coord) if strand == '+' else rfind_minus_search(seq, coord)
+        for seq, strand, coord in zip(SEQS, strands, coords)]
+    assert SC.scan_batch(SEQS, strands, coords) == expected
+
+
+@pytest.mark.parametrize('seqs, strands, expected', [
+    [[], [], []],
+    [[''], ['+'], [None]],
+    [['AATAA', 'AATAAA'], ['+', '+'], [None, ('AATAAA', 16, 5)]],
+    [['AATAAN', 'TTTATT'], ['-', '-'], [None, ('AATAAA', 16, 15)]],
+])
+def test_scan_batch_edge_cases(seqs, strands, expected):
+    assert SC.scan_batch(seqs, strands, [10] * len(seqs)) == expected
+
+
+def test_scan_batch_raises_for_unknown_strand():
+    with pytest.raises(ValueError):
+        SC.scan_batch(['AATAAA'], ['.'], [10])
+
+
+@pytest.mark.parametrize('motif, expected', [
+    ('AATAAA', ['AATAAA']),
+    ('AWTAAA', ['AATAAA', 'ATTAAA']),
+    ('aataar', ['AATAAA', 'AATAAG']),
+    ('NATAAA', ['AATAAA', 'CATAAA', 'GATAAA', 'TATAAA']),
+])
+def test_expand_iupac(motif, expected):
+    assert SC.expand_iupac(motif) == expected
+
+
+@pytest.mark.parametrize('motif', ['AATAA', 'AATAAAA', 'AATAAX'])
+def test_expand_iupac_raises_for_invalid_motifs(motif):
+    with pytest.raises(ValueError):
+        SC.expand_iupac(motif)
+
+
+def test_degenerate_motif_takes_the_rank_of_the_strongest():
+    table = SC.compile_hexamer_table([('ATTAAA', 2), ('AWTAAA', 1)])
+    assert SC.scan_plus('AATAAAGATTAAA', 12, table) == ('ATTAAA', 2, 7)
+    assert SC.scan_plus('ATTAAAGAATAAA', 12, table) == ('ATTAAA', 2, 0)
+    assert SC.scan_minus('TTTATTCTTTAAT', 0, table) == ('ATTAAA', 2, 12)
+
+
+def test_scan_profile_batch_finds_every_hexamer():
+    rng = random.Random(2)
+    strands = [rng.choice('+-') for _ in SEQS]
+    coords = [rng.randint(0, 1000) for _ in SEQS]
+    profiles = SC.scan_profile_batch(SEQS, strands, coords)
+    # results of tables with only one hexamer each
+    per_hexamer = [
+        SC.scan_batch(SEQS, strands, coords, SC.compile_hexamer_table([_]))
+        for _ in S.CANDIDATE_HEXAMERS]
+    for k, profile in enumerate(profiles):
+        expected = [(rank, res[k][2]) for rank, res in enumerate(per_hexamer)
+                    if res[k] is not None]
+        assert profile.mask == sum(1 << rank for rank, _ in expected)
+        assert profile.nearest == tuple(pos for _, pos in expected)
+
+
+@pytest.mark.parametrize('window', [6, 20, 30, 50, 60])
+def test_best_in_window_is_the_same_as_scanning_the_window(window):
+    rng = random.Random(3)
+    strands = [rng.choice('+-') for _ in SEQS]
+    coords = [rng.randint(0, 1000) for _ in SEQS]
+    profiles = SC.scan_profile_batch(SEQS, strands, coords)
+    for seq, strand, coord, profile in zip(SEQS, strands, coords, profiles):
+        # smaller windows are the ends of larger ones closest to the clv,
+        # see xseq, and coord is the clv itself
+        if strand == '+':
+            expected = SC.scan_plus(seq[-window:], coord)
+        else:
+            expected = SC.scan_minus(seq[:window], coord)
+        assert SC.best_in_window(profile, strand, coord, window) == expected
@@ -1,6 +1,6 @@
 import unittest
 
-from kleat.hexamer.search import plus_search, minus_search, search
+from kleat.hexamer.search import plus_search, minus_search, search, search_batch
 from kleat.hexamer.hexamer import extract_seq
 
 
@@ -82,6 +82,16 @@ class TestSearch(unittest.TestCase):
         clv = 1
         self.assertEqual(search('-', clv, seq, 50), ('AATAAA', 16, 8))
 
+    def test_search_batch(self):
+        queries = [
+            ('+', 9, 'CaataaaGT'),
+            ('-', 1, 'GGTTTATT'),
+            ('+', 9, 'CaataaaGT'),
+            ('+', 9, 'CGGGGGGGT'),
+        ]
+        self.assertEqual(search_batch(queries, 50), [
+            ('AATAAA', 16, 2), ('AATAAA', 16, 8), ('AATAAA', 16, 2), None])
+
 
 
 # Good drawing example, utilize them later
@@ -0,0 +1,80 @@
+import pytest
+
+import kleat.misc.settings as S
+from kleat.hexamer import scan as SC
+from kleat.hexamer import table as TB
+from kleat.hexamer.search import plus_search, minus_search
+
+
+@pytest.fixture
+def hexamer_file(tmp_path):
+    path = tmp_path / 'hexamers.tsv'
+    path.write_text(
+        '# motif\tstrength\n'
+        'AWTAAA\t10\n'
+        '\n'
+        'AATAAA 16  # the canonical one\n'
+        'TTTAAA\t10\n'
+    )
+    return str(path)
+
+
+@pytest.fixture
+def restore_table():
+    yield
+    SC.set_hexamer_table(SC.DEFAULT_TABLE)
+
+
+def test_read_hexamer_file(hexamer_file):
+    assert TB.read_hexamer_file(hexamer_file) == [
+        ('AATAAA', 16),
+        ('AWTAAA', 10),
+        ('TTTAAA', 10),
+    ]
+
+
+@pytest.mark.parametrize('content', [
+    'AATAAA\n',
+    'AATAAA\t1\t2\n',
+    'AATAAA\t-1\n',
+    '# nothing\n',
+])
+def test_read_hexamer_file_raises_for_malformed_files(tmp_path, content):
+    path = tmp_path / 'hexamers.tsv'
+    path.write_text(content)
+    with pytest.raises(ValueError):
+        TB.read_hexamer_file(str(path))
+
+
+def test_load_hexamer_table_is_used_by_search(hexamer_file, restore_table):
+    assert plus_search('GGATTAAAGG', 9) == ('ATTAAA', 15, 2)
+
+    table = TB.load_hexamer_table(hexamer_file)
+    assert SC.get_hexamer_table() is table
+    # ATTAAA matches the degenerate AWTAAA
+    assert plus_search('GGATTAAAGG', 9) == ('AWTAAA', 10, 2)
+    assert minus_search('CCTTTAATCC', 0) == ('AWTAAA', 10, 7)
+    # AGTAAA isn't in the table any more
+    assert plus_search('GGAGTAAAGG', 9) is None
+
+
+def test_load_hexamer_table_default(restore_table):
+    table = TB.load_hexamer_table()
+    assert table.hexamers == S.CANDIDATE_HEXAMERS
+
+
+def test_compile_hexamer_file_is_not_used_by_search(hexamer_file):
+    table = TB.compile_hexamer_file(hexamer_file)
+    assert table.hexamers == TB.read_hexamer_file(hexamer_file)
+    assert SC.get_hexamer_table() is SC.DEFAULT_TABLE
+
+
+def test_gen_hexamer_dummy_cols(hexamer_file):
+    table = TB.compile_hexamer_file(hexamer_file)
+    assert TB.gen_hexamer_dummy_cols('ctg', table) == [
+        'ctg_AATAAA', 'ctg_AWTAAA', 'ctg_TTTAAA', 'ctg_NA']
+
+
+def test_gen_hexamer_dummy_cols_default():
+    assert TB.gen_hexamer_dummy_cols('ref') == [
+        'ref_{0}'.format(_[0]) for _ in S.CANDIDATE_HEXAMERS_WITH_NA]
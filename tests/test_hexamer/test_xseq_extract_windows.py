@@ -0,0 +1,133 @@
+import random
+from unittest.mock import MagicMock
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.hexamer import xseq
+from kleat.hexamer.hexamer import extract_seq
+from kleat.misc.calc_genome_offset import calc_genome_offset
+from kleat.misc.contig_geometry import ContigGeometry
+
+
+def get_mock_ref_fa(genome):
+    ref_fa = MagicMock()
+    ref_fa.get_reference_length.return_value = len(genome)
+    ref_fa.fetch.side_effect = lambda seqname, beg, end: genome[beg:end]
+    return ref_fa
+
+
+def gen_random_case(seed):
+    rng = random.Random(seed)
+    cgts = []
+    if rng.random() < 0.5:
+        cgts.append((rng.choice([S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP]), rng.randint(1, 5)))
+    for k in range(rng.randint(1, 4)):
+        cgts.append((S.BAM_CMATCH, rng.randint(1, 10)))
+        if rng.random() < 0.8:
+            cgts.append((rng.choice([S.BAM_CREF_SKIP, S.BAM_CDEL, S.BAM_CINS]),
+                         rng.randint(1, 20)))
+    cgts.append((S.BAM_CMATCH, rng.randint(1, 10)))
+    if rng.random() < 0.5:
+        cgts.append((rng.choice([S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP]), rng.randint(1, 5)))
+
+    ctg_len = sum(val for key, val in cgts
+                  if key in [S.BAM_CMATCH, S.BAM_CINS, S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP])
+    ctg_seq = ''.join(rng.choice('ACGT') for _ in range(ctg_len))
+    genome = ''.join(rng.choice('acgt') for _ in range(200))
+    ref_start = rng.randint(-10, 120)   # may be near either end of the genome
+
+    queries = []
+    for ctg_clv in range(ctg_len):
+        offset = calc_genome_offset(cgts, ctg_clv, 'left')
+        for strand in ['+', '-']:
+            queries.append((strand, ctg_clv, ref_start + offset))
+    return cgts, ctg_seq, genome, queries
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('seqname', ['chr1', 'chrM'])
+@pytest.mark.parametrize('window', [5, 50])
+def test_batched_extraction_is_consistent_with_extraction_one_by_one(seed, seqname, window):
+    cgts, ctg_seq, genome, queries = gen_random_case(seed)
+    expected = [
+        xseq.extract_windows(cgts, ctg_seq, seqname, [q], get_mock_ref_fa(genome),
+                             window, batch_fetch=False)[0]
+        for q in queries
+    ]
+    assert xseq.extract_windows(
+        cgts, ctg_seq, seqname, queries, get_mock_ref_fa(genome), window) == expected
+
+
+def test_extract_windows_for_both_strands():
+    """
+       AATTCC__GGTTAA     <-contig
+       012345  678901     <-contig coord
+         |        |1
+         ^cc      ^cc
+    ...AATTCCgcGGTTAA...  <-genome
+       0123456789012345   <-genome coord
+         |        |1
+         ^rc      ^rc
+    """
+    cgts = ((S.BAM_CMATCH, 6), (S.BAM_CREF_SKIP, 2), (S.BAM_CMATCH, 6))
+    ref_fa = get_mock_ref_fa('AATTCCgcGGTTAAAAAAAAAA')
+    queries = [('+', 9, 11), ('-', 2, 2), ('-', 9, 11)]
+    res = xseq.extract_windows(cgts, 'AATTCCGGTTAA', 'chr1', queries, ref_fa, 50)
+    assert res == ['AATTCCgcGGTT', 'TTCCgcGGTTAA', 'TAA']
+    # the intron is fetched only once for both windows
+    ref_fa.fetch.assert_called_once_with('chr1', 6, 8)
+
+
+def test_resolve_deferred_pieces_fetches_nearby_pieces_together():
+    ref_fa = get_mock_ref_fa('ACGT' * 1000)
+    pieces_list = [
+        ['AA', (0, 2), (5, 8)],
+        [(5, 8), 'C', (3000, 3004)],
+    ]
+    res = xseq.resolve_deferred_pieces(pieces_list, ref_fa, 'chr1')
+    assert res == [['AA', 'AC', 'CGT'], ['CGT', 'C', 'ACGT']]
+    assert ref_fa.fetch.call_count == 2
+
+
+def test_extract_windows_raises_for_unknown_strand():
+    ref_fa = get_mock_ref_fa('ACGT')
+    with pytest.raises(ValueError):
+        xseq.extract_windows(((S.BAM_CMATCH, 4),), 'ACGT', 'chr1', [('x', 1, 1)], ref_fa, 50)
+
+
+def get_mock_contig(ctg_seq, cgts, reference_start):
+    contig = MagicMock()
+    contig.query_name = 'c0'
+    contig.reference_name = 'chr1'
+    contig.reference_start = reference_start
+    contig.query_sequence = ctg_seq
+    contig.query_length = len(ctg_seq)
+    contig.cigartuples = cgts
+    contig.infer_query_length.return_value = len(ctg_seq)
+    return contig
+
+
+def test_extract_seq_uses_prefetched_windows_of_a_contig_geometry():
+    cgts, ctg_seq, genome, queries = gen_random_case(1)
+    contig = get_mock_contig(ctg_seq, [(S.BAM_CMATCH, _[1]) if _[0] == S.BAM_CHARD_CLIP else _
+                                       for _ in cgts], 10)
+    geom = ContigGeometry(contig)
+
+    ref_fa = get_mock_ref_fa(genome)
+    xseq.prefetch_windows(geom, ref_fa, queries)
+    num_fetches = ref_fa.fetch.call_count
+    for strand, ctg_clv, ref_clv in queries:
+        expected = extract_seq(contig, strand, ref_clv, get_mock_ref_fa(genome), ctg_clv)
+        assert extract_seq(geom, strand, ref_clv, ref_fa, ctg_clv) == expected
+    assert ref_fa.fetch.call_count == num_fetches
+
+
+def test_gen_contig_window_queries():
+    # right-tailed suffix contig
+    contig = get_mock_contig('ACGTAAA', [(S.BAM_CMATCH, 4), (S.BAM_CSOFT_CLIP, 3)], 10)
+    contig.is_reverse = False
+    contig.reference_end = 14
+    assert xseq.gen_contig_window_queries(contig, with_ends=False) == [('+', 3, 13)]
+    assert xseq.gen_contig_window_queries(contig, with_ends=True) == [
+        ('+', 3, 13), ('+', 6, 13), ('-', 0, 10)]
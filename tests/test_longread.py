@@ -0,0 +1,129 @@
+from unittest.mock import MagicMock
+
+import pysam
+import pytest
+
+import kleat.misc.settings as S
+from kleat import longread as LR
+from kleat.misc import clv_key as CK
+from kleat.misc.contig_catalog import assign_contig_clvs
+from kleat.hexamer.search import search_ref_genome
+
+
+def get_mock_read(name, seq, ref_beg, cigartuples, mapq=60, is_reverse=False):
+    r = MagicMock()
+    r.query_name = name
+    r.reference_name = 'chr1'
+    r.reference_id = 0
+    r.query_sequence = seq
+    r.query_length = len(seq)
+    r.mapping_quality = mapq
+    r.reference_start = ref_beg
+    r.reference_end = ref_beg + sum(
+        val for key, val in cigartuples if key in [S.BAM_CMATCH, S.BAM_CDEL])
+    r.is_reverse = is_reverse
+    r.cigartuples = cigartuples
+    r.infer_query_length.return_value = len(seq)
+    return r
+
+
+@pytest.mark.parametrize('seq, cigartuples, expected', [
+    ['AAATTTAAAA', [(S.BAM_CMATCH, 6), (S.BAM_CSOFT_CLIP, 4)], True],
+    ['TTTTAAATTT', [(S.BAM_CSOFT_CLIP, 4), (S.BAM_CMATCH, 6)], True],
+    ['AAATTTAAAA', [(S.BAM_CMATCH, 10)], False],
+    ['', [(S.BAM_CMATCH, 10)], False],
+])
+def test_may_have_tail(seq, cigartuples, expected):
+    assert LR.may_have_tail(get_mock_read('r0', seq, 0, cigartuples)) == expected
+
+
+def test_load_tailed_reads():
+    reads = [
+        get_mock_read('r0', 'CGAATAAAGCAAAA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 4)]),
+        # clipped but not a tail
+        get_mock_read('r1', 'CGAATAAAGCAAGA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 4)]),
+        get_mock_read('r2', 'CGAATAAAGC', 10, [(S.BAM_CMATCH, 10)]),
+    ]
+    assert [_.query_name for _ in LR.load_tailed_reads(reads)] == ['r0']
+
+
+def test_gen_chunks():
+    assert list(LR.gen_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(LR.gen_chunks([], 2)) == []
+
+
+def test_tally_chunk():
+    """
+    r0 and r1 support the same clv on + strand, r2 supports one on - strand
+
+    CGAATAAAGC|AAAA
+    0123456789       <- offset from 10
+    """
+    reads = LR.load_tailed_reads([
+        get_mock_read('r0', 'CGAATAAAGCAAAA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 4)]),
+        get_mock_read('r1', 'CGGGGGGAGCAAAAAA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 6)],
+                      mapq=3),
+        get_mock_read('r2', 'TTTCGCGCG', 30, [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 6)]),
+    ])
+    assign_contig_clvs(reads)
+    tallies = {}
+    LR.tally_chunk(reads, MagicMock(), tallies)
+
+    plus_tally = tallies[CK.encode_clv_key(0, '+', 19)]
+    assert plus_tally.num_reads == 2
+    assert plus_tally.max_tail_len == 6
+    assert plus_tally.max_read_len == 16
+    assert plus_tally.max_mapq == 60
+    assert plus_tally.hex_tuple == ('AATAAA', 16, 12)
+    assert plus_tally.read_id_at_pos == 'r0@9'
+
+    minus_tally = tallies[CK.encode_clv_key(0, '-', 30)]
+    assert minus_tally.num_reads == 1
+    assert minus_tally.hex_tuple == LR.NA_HEX_TUPLE
+
+    final = LR.pop_final_tallies(tallies, before=30)
+    assert [CK.decode_clv_key(_)[1:] for _, __ in final] == [('+', 19)]
+    assert list(tallies) == [CK.encode_clv_key(0, '-', 30)]
+
+
+def test_tally_chunk_prunes_reads_on_the_other_strand():
+    reads = LR.load_tailed_reads([
+        get_mock_read('r0', 'CGAATAAAGCAAAA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 4)]),
+        get_mock_read('r1', 'CGAATAAAGCAAAA', 10, [(S.BAM_CMATCH, 10), (S.BAM_CSOFT_CLIP, 4)],
+                      is_reverse=True),
+    ])
+    assign_contig_clvs(reads)
+    tallies, counter = {}, {'clvs_pruned_by_strand': 0}
+    LR.tally_chunk(reads, MagicMock(), tallies, 'forward', counter)
+    assert [_.num_reads for _ in tallies.values()] == [1]
+    assert counter['clvs_pruned_by_strand'] == 1
+
+
+def test_pop_final_tallies_pops_all_without_position():
+    tallies = {CK.encode_clv_key(0, '+', 5): 'a', CK.encode_clv_key(0, '-', 2): 'b'}
+    assert [_[1] for _ in LR.pop_final_tallies(tallies)] == ['b', 'a']
+    assert tallies == {}
+
+
+@pytest.fixture
+def ref_fa(tmp_path):
+    fa = tmp_path / 'ref.fa'
+    fa.write_text(
+        '>chr1\nCCAATAAAGGGCCCTTTATTGGCCATTAAAGGCCC\n'
+        '>chrM\nAAAGCCCCCCCCCCCAAT\n')
+    pysam.faidx(str(fa))
+    return pysam.FastaFile(str(fa))
+
+
+@pytest.mark.parametrize('seqname, sites', [
+    ['chr1', [('+', 10), ('+', 31), ('-', 14), ('-', 20), ('+', 2), ('-', 30)]],
+    # wrapping around the ends of circular DNA
+    ['chrM', [('+', 2), ('-', 12)]],
+])
+def test_search_ref_hexamers_is_the_same_as_search_ref_genome(ref_fa, seqname, sites):
+    expected = []
+    for strand, clv in sites:
+        res = search_ref_genome(ref_fa, seqname, clv, strand, window=10)
+        expected.append(LR.NA_HEX_TUPLE if res is None else res)
+    assert LR.search_ref_hexamers(ref_fa, seqname, sites, window=10) == expected
+    assert expected != [LR.NA_HEX_TUPLE] * len(sites)
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from kleat.misc.calc_genome_offset import (
+    calc_genome_offset, build_genome_offset_map, calc_genome_offsets
+)
+import kleat.misc.settings as S
+
+"""
+The batch API should return exactly what calc_genome_offset returns for every
+ctg_clv, see the other test cases in this directory for the semantics
+"""
+
+
+def gen_random_cigartuples(rng):
+    cgts = []
+    if rng.random() < 0.5:
+        cgts.append((rng.choice([S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP]), rng.randint(1, 5)))
+    for k in range(rng.randint(1, 4)):
+        cgts.append((S.BAM_CMATCH, rng.randint(1, 10)))
+        if rng.random() < 0.7:
+            cgts.append((rng.choice([S.BAM_CREF_SKIP, S.BAM_CDEL, S.BAM_CINS]),
+                         rng.randint(1, 6)))
+    cgts.append((S.BAM_CMATCH, rng.randint(1, 10)))
+    if rng.random() < 0.5:
+        cgts.append((rng.choice([S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP]), rng.randint(1, 5)))
+    return cgts
+
+
+@pytest.mark.parametrize('seed', range(50))
+@pytest.mark.parametrize('tail_side', ['left', 'right'])
+@pytest.mark.parametrize('skip_check_size', [None, 0, 3, 10])
+def test_calc_genome_offsets_is_consistent_with_calc_genome_offset(
+        seed, tail_side, skip_check_size):
+    rng = random.Random(seed)
+    cgts = gen_random_cigartuples(rng)
+    ctg_len = sum(val for key, val in cgts
+                  if key in [S.BAM_CMATCH, S.BAM_CINS, S.BAM_CSOFT_CLIP, S.BAM_CHARD_CLIP])
+    ctg_clvs = list(range(-3, ctg_len + 3))
+
+    offset_map = build_genome_offset_map(cgts)
+    expected = [calc_genome_offset(cgts, c, tail_side, skip_check_size) for c in ctg_clvs]
+    assert calc_genome_offsets(offset_map, ctg_clvs, tail_side, skip_check_size).tolist() == expected
+
+
+@pytest.mark.parametrize("ctg_cigartuples, ctg_clv, gnm_offset", [
+    [((S.BAM_CMATCH, 4),), 1, 1],
+    [((S.BAM_CMATCH, 6), (S.BAM_CREF_SKIP, 2), (S.BAM_CMATCH, 4)), 2, 2],
+    [((S.BAM_CSOFT_CLIP, 2), (S.BAM_CMATCH, 4), (S.BAM_CINS, 2), (S.BAM_CMATCH, 4)), 7, 3],
+])
+def test_calc_genome_offsets_for_a_single_clv(ctg_cigartuples, ctg_clv, gnm_offset):
+    offset_map = build_genome_offset_map(ctg_cigartuples)
+    assert calc_genome_offset(ctg_cigartuples, ctg_clv, 'left') == gnm_offset
+    assert calc_genome_offsets(offset_map, [ctg_clv], 'left').tolist() == [gnm_offset]
+
+
+def test_calc_genome_offsets_raises_for_unsupported_cigar_before_clv():
+    cgts = ((S.BAM_CMATCH, 4), (S.BAM_CEQUAL, 2), (S.BAM_CMATCH, 4))
+    offset_map = build_genome_offset_map(cgts)
+    # the clv is before the unsupported cigar
+    assert calc_genome_offsets(offset_map, [2], 'right').tolist() == [2]
+    with pytest.raises(NotImplementedError):
+        calc_genome_offsets(offset_map, [2, 6], 'right')
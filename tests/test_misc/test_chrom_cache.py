@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+import pysam
+import pytest
+
+from kleat.misc.apautils import fetch_seq
+from kleat.misc.chrom_cache import ChromosomeCache, open_reference
+
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    fa = tmp_path / 'ref.fa'
+    fa.write_text(
+        '>chr1\nAATTCCGGaattccggAC\n'
+        '>chrM\nACGTACGTTT\n')
+    pysam.faidx(str(fa))
+    return str(fa)
+
+
+def test_chromosome_cache(fasta_file):
+    cache = ChromosomeCache(fasta_file)
+    assert cache.get_reference_length('chr1') == 18
+    assert cache.get_reference_length('chrM') == 10
+    assert cache.fetch('chr1', 6, 10) == 'GGaa'
+    assert cache.fetch('chr1', 16, 30) == 'AC'
+    assert cache.fetch('chrM') == 'ACGTACGTTT'
+    assert cache.seqname == 'chrM'
+
+
+def test_chromosome_cache_loads_a_chromosome_once(fasta_file):
+    cache = ChromosomeCache(fasta_file)
+    with patch.object(cache, 'fasta', wraps=cache.fasta) as fasta:
+        for beg in range(10):
+            cache.fetch('chr1', beg, beg + 3)
+    fasta.fetch.assert_called_once_with('chr1')
+
+
+@pytest.mark.parametrize('seqname, beg, end', [
+    ['chr1', 0, 5],
+    ['chr1', 14, 20],
+    ['chr1', -3, 4],
+    ['chr1', 20, 23],
+    ['chrM', 8, 13],
+    ['chrM', -3, 2],
+    ['chrM', -5, -1],
+    ['chrM', 12, 15],
+    ['chrM', 7, 3],
+])
+def test_fetch_seq_with_chromosome_cache_is_the_same(fasta_file, seqname, beg, end):
+    expected = fetch_seq(pysam.FastaFile(fasta_file), seqname, beg, end)
+    assert fetch_seq(ChromosomeCache(fasta_file), seqname, beg, end) == expected
+
+
+def test_open_reference(fasta_file):
+    assert isinstance(open_reference(fasta_file, cache_chromosome=True), ChromosomeCache)
+    assert isinstance(open_reference(fasta_file), pysam.FastaFile)
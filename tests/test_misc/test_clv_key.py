@@ -0,0 +1,31 @@
+import pytest
+
+from kleat.misc import clv_key as CK
+from kleat.misc.settings import ClvRecord
+
+
+@pytest.mark.parametrize('reference_id, strand, clv', [
+    [0, '+', 0],
+    [0, '-', 0],
+    [1, '+', 12345],
+    [24, '-', 248956421],
+    [3000, '+', 2 ** 32 - 1],
+])
+def test_encode_and_decode_clv_key(reference_id, strand, clv):
+    clv_key = CK.encode_clv_key(reference_id, strand, clv)
+    assert CK.decode_clv_key(clv_key) == (reference_id, strand, clv)
+
+    for ctg_clv in [0, 1, 99999]:
+        bdg_key = CK.encode_bridge_key(clv_key, ctg_clv)
+        assert CK.decode_bridge_key(bdg_key) == (clv_key, ctg_clv)
+
+
+def test_clv_keys_are_unique():
+    keys = {CK.encode_clv_key(ref_id, strand, clv)
+            for ref_id in range(3) for strand in '+-' for clv in range(100)}
+    assert len(keys) == 3 * 2 * 100
+
+
+def test_encode_clv_record_key():
+    rec = ClvRecord(*(['chr2', '-', 10] + [None] * 22))
+    assert CK.encode_clv_record_key(1, rec) == CK.encode_clv_key(1, '-', 10)
@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.evidence import suffix, link
+from kleat.misc import apautils
+from kleat.misc.contig_geometry import ContigGeometry
+from kleat.misc.contig_catalog import (
+    build_contig_catalog, gen_contig_clvs, assign_contig_clvs, get_contig_clvs,
+    gen_contig_chunks
+)
+
+
+def get_mock_contig(name, seq, ref_beg, cigartuples, is_reverse=False):
+    c = MagicMock()
+    c.query_name = name
+    c.reference_name = 'chr1'
+    c.query_sequence = seq
+    c.query_length = len(seq)
+    c.reference_start = ref_beg
+    c.reference_end = ref_beg + sum(
+        val for key, val in cigartuples
+        if key in [S.BAM_CMATCH, S.BAM_CREF_SKIP, S.BAM_CDEL])
+    c.is_reverse = is_reverse
+    c.cigartuples = cigartuples
+    c.infer_query_length.return_value = len(seq) + sum(
+        val for key, val in cigartuples if key == S.BAM_CHARD_CLIP)
+    return c
+
+
+MOCK_CONTIGS = [
+    # left-tailed suffix contig: TTT|ATCGC
+    get_mock_contig('c0', 'TTTATCGC', 10, [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 5)]),
+    # right-tailed suffix contig with a skip: AT--CGC|AAAA
+    get_mock_contig('c1', 'ATCGCAAAA', 20, [
+        (S.BAM_CMATCH, 2), (S.BAM_CREF_SKIP, 2), (S.BAM_CMATCH, 3), (S.BAM_CSOFT_CLIP, 4)],
+        is_reverse=True),
+    # tailless contig with hardclip
+    get_mock_contig('c2', 'ACGT', 30, [(S.BAM_CHARD_CLIP, 2), (S.BAM_CMATCH, 4)]),
+    # tailless contig
+    get_mock_contig('c3', 'ACGTAC', 40, [(S.BAM_CMATCH, 6)], is_reverse=True),
+]
+
+
+def test_build_contig_catalog():
+    cat = build_contig_catalog(MOCK_CONTIGS)
+    assert cat.names == ['c0', 'c1', 'c2', 'c3']
+    assert cat.name_ids.tolist() == [0, 1, 2, 3]
+    assert cat.reference_start.tolist() == [10, 20, 30, 40]
+    assert cat.reference_end.tolist() == [15, 27, 34, 46]
+    assert cat.is_reverse.tolist() == [False, True, False, True]
+    assert cat.ctg_len_with_hc.tolist() == [8, 9, 6, 6]
+    assert cat.tail_side.tolist() == [S.LEFT_TAIL, S.RIGHT_TAIL, S.NO_TAIL, S.NO_TAIL]
+    assert cat.first_op.tolist() == [S.BAM_CSOFT_CLIP, S.BAM_CMATCH, S.BAM_CHARD_CLIP, S.BAM_CMATCH]
+    assert cat.last_len.tolist() == [5, 4, 4, 6]
+
+
+@pytest.mark.parametrize('contig, clvs', list(zip(
+    MOCK_CONTIGS, gen_contig_clvs(build_contig_catalog(MOCK_CONTIGS)))))
+def test_contig_clvs_are_consistent_with_per_contig_functions(contig, clvs):
+    tail_side = apautils.has_tail(contig)
+    ctg_seq_len = contig.infer_query_length(always=True)
+    if tail_side is None:
+        assert clvs.suffix_strand is None
+    else:
+        strand = suffix.calc_strand(tail_side)
+        ctg_tail_len = apautils.calc_tail_length(contig, tail_side)
+        assert clvs.suffix_strand == strand
+        assert clvs.suffix_ref_clv == suffix.calc_ref_clv(contig, tail_side)
+        assert clvs.suffix_ctg_tail_len == ctg_tail_len
+        assert clvs.suffix_ctg_clv == suffix.calc_ctg_clv(strand, ctg_seq_len, ctg_tail_len)
+
+    for seq in ['TTT', 'AAA']:
+        read = MagicMock()
+        read.query_sequence = seq
+        if contig.is_reverse:
+            strand, ref_clv = link.analyze_reverse_link(contig, read)
+        else:
+            strand, ref_clv = link.analyze_forward_link(contig, read)
+        prefix = 'plus' if strand == '+' else 'minus'
+        assert getattr(clvs, prefix + '_ref_clv') == ref_clv
+        assert getattr(clvs, prefix + '_ctg_clv') == link.calc_ctg_clv(strand, ctg_seq_len)
+
+
+def test_assign_contig_clvs_to_contig_geometries():
+    geoms = []
+    for c in MOCK_CONTIGS:
+        c.mapping_quality = 60
+        c.get_tag.return_value = 'GG'
+        geoms.append(ContigGeometry(c))
+    assign_contig_clvs(geoms)
+    for c, g in zip(MOCK_CONTIGS, geoms):
+        assert g.clvs is not None
+        assert get_contig_clvs(g) is g.clvs
+        # falls back to a catalog of a single contig
+        assert get_contig_clvs(c) == g.clvs
+
+
+@pytest.mark.parametrize('starts, chunk_size, expected', [
+    ([10, 20, 30, 40], 2, [[10, 20], [30, 40]]),
+    ([10, 20, 30, 40], 3, [[10, 20, 30], [40]]),
+    ([10, 20, 20, 20, 30], 2, [[10, 20, 20, 20], [30]]),
+    ([10, 10, 10], 1, [[10, 10, 10]]),
+    ([], 2, []),
+])
+def test_gen_contig_chunks(starts, chunk_size, expected):
+    contigs = [get_mock_contig('c{0}'.format(k), 'ACGT', _, [(S.BAM_CMATCH, 4)])
+               for k, _ in enumerate(starts)]
+    chunks = list(gen_contig_chunks(contigs, chunk_size))
+    assert [[_.reference_start for _ in chunk] for chunk in chunks] == expected
+    assert all(isinstance(_, ContigGeometry) for chunk in chunks for _ in chunk)
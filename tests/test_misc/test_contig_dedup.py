@@ -0,0 +1,108 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+import kleat.misc.settings as S
+from kleat.misc.contig_geometry import ContigGeometry
+from kleat.misc.contig_dedup import (
+    group_contigs_by_alignment, share_contig_caches, fold_clv_rows
+)
+from kleat.post import agg_polya_evidence_per
+from kleat.hexamer.hexamer import gen_reference_hexamer_tuple
+
+
+def get_mock_contig(name, seq, ref_beg, cigartuples, is_reverse=False):
+    c = MagicMock()
+    c.query_name = name
+    c.reference_name = 'chr1'
+    c.query_sequence = seq
+    c.query_length = len(seq)
+    c.reference_start = ref_beg
+    c.reference_end = ref_beg + sum(
+        val for key, val in cigartuples if key in [S.BAM_CMATCH, S.BAM_CREF_SKIP])
+    c.is_reverse = is_reverse
+    c.cigartuples = cigartuples
+    c.infer_query_length.return_value = len(seq)
+    return ContigGeometry(c)
+
+
+def test_group_contigs_by_alignment():
+    cgts = [(S.BAM_CMATCH, 4), (S.BAM_CSOFT_CLIP, 3)]
+    contigs = [
+        get_mock_contig('c0', 'ACGTAAA', 10, cgts),
+        get_mock_contig('c1', 'ACGTAAA', 11, cgts),        # different start
+        get_mock_contig('c2', 'ACGTAAA', 10, cgts),
+        get_mock_contig('c3', 'ACGTAAA', 10, cgts, True),  # different strand
+        get_mock_contig('c4', 'ACCTAAA', 10, cgts),        # different seq
+        get_mock_contig('c5', 'ACGTAAA', 10, [(S.BAM_CMATCH, 7)]),
+        get_mock_contig('c6', 'ACGTAAA', 10, cgts),
+    ]
+    groups = group_contigs_by_alignment(contigs)
+    assert [[_.query_name for _ in g] for g in groups] == [
+        ['c0', 'c2', 'c6'], ['c1'], ['c3'], ['c4'], ['c5']]
+
+
+def test_share_contig_caches():
+    cgts = [(S.BAM_CMATCH, 7)]
+    group = [get_mock_contig('c{0}'.format(_), 'ACGTAAA', 10, cgts) for _ in range(3)]
+    share_contig_caches(group)
+    group[0].windows[('+', 6, 16, 50)] = 'ACGTAAA'
+    assert group[2].windows is group[0].windows
+    assert group[1].ref_hexamers is group[0].ref_hexamers
+
+
+def gen_row(**kwargs):
+    row = dict(
+        seqname='chr1', strand='+', clv=20,
+        ctg_hex='AATAAA', ctg_hex_id=16, ctg_hex_pos=5,
+        ref_hex='AATAAA', ref_hex_id=16, ref_hex_pos=5,
+        evidence_type='bridge', contig_id_at_pos='c0@3', contig_is_hardclipped=False,
+        contig_len=30, contig_mapq=60,
+        num_suffix_reads=0, max_suffix_read_tail_len=0,
+        suffix_contig_tail_len=0, num_suffix_contigs=0,
+        num_bridge_reads=2, max_bridge_read_tail_len=5, num_bridge_contigs=1,
+        num_link_reads=0, num_link_contigs=0, num_blank_contigs=0,
+        reads_subsampled=False,
+    )
+    row.update(kwargs)
+    return [row[_] for _ in S.HEADER]
+
+
+def test_fold_clv_rows():
+    rows = [
+        gen_row(),
+        gen_row(evidence_type='blank', num_bridge_reads=0, max_bridge_read_tail_len=0,
+                num_bridge_contigs=0, num_blank_contigs=1),
+        gen_row(contig_id_at_pos='c1@3', contig_mapq=3, num_bridge_reads=1,
+                max_bridge_read_tail_len=8),
+        gen_row(contig_id_at_pos='c2@3', contig_is_hardclipped=True,
+                reads_subsampled=True),
+    ]
+    folded = fold_clv_rows(rows)
+    assert len(folded) == 2
+    res = dict(zip(S.HEADER, folded[0]))
+    assert res['contig_id_at_pos'] == 'c0@3|c1@3|c2@3'
+    assert res['num_bridge_reads'] == 5
+    assert res['max_bridge_read_tail_len'] == 8
+    assert res['num_bridge_contigs'] == 3
+    assert res['contig_mapq'] == 60
+    assert res['contig_is_hardclipped']
+    assert res['reads_subsampled']
+    assert folded[1] == rows[1]
+
+    # aggregation after folding is the same as aggregation without folding
+    expected = agg_polya_evidence_per(pd.DataFrame(rows, columns=S.HEADER))
+    res = agg_polya_evidence_per(pd.DataFrame(folded, columns=S.HEADER))
+    assert res.to_dict() == expected.to_dict()
+
+
+def test_gen_reference_hexamer_tuple_with_cache():
+    ref_fa = MagicMock()
+    ref_fa.get_reference_length.return_value = 100
+    ref_fa.fetch.return_value = 'CCAATAAACCCCCCCCCCCCCCCCC'
+    cache = {}
+    res = gen_reference_hexamer_tuple(ref_fa, 'chr1', '+', 30, cache=cache)
+    assert res == ('AATAAA', 16, 8)
+    assert cache == {('chr1', '+', 30): res}
+    assert gen_reference_hexamer_tuple(ref_fa, 'chr1', '+', 30, cache=cache) == res
+    assert ref_fa.fetch.call_count == 1
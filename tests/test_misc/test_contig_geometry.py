@@ -0,0 +1,108 @@
+from unittest.mock import MagicMock
+
+import kleat.misc.settings as S
+from kleat.misc.contig_geometry import (
+    ContigGeometry, get_hardclips, get_tail_side, get_is_hardclipped
+)
+from kleat.evidence.suffix import is_a_suffix_read
+from kleat.hexamer.hexamer import extract_seq
+
+
+def get_mock_contig(query_sequence, cigartuples, xh=None, is_reverse=False):
+    ctg = MagicMock()
+    ctg.query_name = 'ctg1'
+    ctg.reference_name = 'chr1'
+    ctg.reference_start = 10
+    ctg.reference_end = 10 + sum(val for key, val in cigartuples
+                                 if key == S.BAM_CMATCH)
+    ctg.is_reverse = is_reverse
+    ctg.mapping_quality = 60
+    ctg.query_sequence = query_sequence
+    ctg.query_length = len(query_sequence)
+    ctg.cigartuples = cigartuples
+    ctg.infer_query_length.return_value = len(query_sequence) + sum(
+        val for key, val in cigartuples if key == S.BAM_CHARD_CLIP)
+    ctg.get_tag.return_value = xh
+    return ctg
+
+
+def test_contig_geometry_caches_values_for_a_left_tailed_contig():
+    """
+    TTT
+     |└ATCGC   <-suffix contig
+    """
+    ctg = get_mock_contig('TTTATCGC', [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 5)])
+    geom = ContigGeometry(ctg)
+    assert geom.cigartuples == ((S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 5))
+    assert geom.tail_side == 'left'
+    assert geom.is_hardclipped is False
+    assert (geom.left_hc, geom.right_hc) == (0, 0)
+    assert geom.infer_query_length(always=True) == 8
+    assert geom.seq_with_hc == 'TTTATCGC'
+    assert geom.mapq == 60
+
+    # accessing the cached attributes again doesn't touch the pysam contig
+    ctg.reset_mock()
+    get_tail_side(geom)
+    geom.infer_query_length(always=True)
+    ctg.infer_query_length.assert_not_called()
+
+
+def test_contig_geometry_restores_hardclipped_sequence():
+    """
+    CGATT    <-contig
+       //    <-hardclip mask
+    """
+    ctg = get_mock_contig('CGA', [(S.BAM_CMATCH, 3), (S.BAM_CHARD_CLIP, 2)], xh='TT')
+    geom = ContigGeometry(ctg)
+    assert geom.tail_side is None
+    assert geom.is_hardclipped is True
+    assert (geom.left_hc, geom.right_hc) == (0, 2)
+    assert geom.infer_query_length(always=True) == 5
+    assert geom.infer_query_length() == 3
+    assert geom.seq_with_hc == 'CGATT'
+
+
+def test_accessors_work_on_both_contig_geometry_and_plain_segment():
+    ctg = get_mock_contig('CGAT', [(S.BAM_CHARD_CLIP, 2), (S.BAM_CMATCH, 4)], xh='GG')
+    geom = ContigGeometry(ctg)
+    for c in [ctg, geom]:
+        assert get_hardclips(c) == (2, 0)
+        assert get_hardclips(c, reverse=True) == (0, 2)
+        assert get_is_hardclipped(c) is True
+        assert get_tail_side(c) is None
+
+
+def test_is_a_suffix_read_with_contig_geometry():
+    """
+     TTATC                      # suffix read
+    TTT
+     |└ATCGC                    # suffix contig
+    012345678                   # contig coord
+       ^ctg_clv
+    """
+    read = MagicMock()
+    read.query_sequence = 'TTATC'
+    read.reference_start = 1
+    read.cigartuples = [(S.BAM_CMATCH, 5)]
+
+    ctg = get_mock_contig('TTTATCGC', [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 5)])
+    assert is_a_suffix_read(read, ContigGeometry(ctg), ctg_clv=3) == 2
+
+
+def test_extract_seq_uses_cached_sequence_with_hardclip():
+    r"""
+           AA
+         TC┘         <-bridge read
+    CGCATTCGTCG      <-bridge contig
+    \\\|  |          <-hardclip mask
+    012345678901      <-contig coord
+       |cc^
+    """
+    ctg = get_mock_contig('ATTCGTCG', [(S.BAM_CHARD_CLIP, 3), (S.BAM_CMATCH, 8)], xh='CGC')
+    geom = ContigGeometry(ctg)
+    ref_fa = MagicMock()
+    ref_fa.get_reference_length.return_value = 100
+    kw = dict(contig=geom, strand='+', ref_clv=8, ref_fa=ref_fa, ctg_clv=6)
+    assert extract_seq(**kw) == 'CGCATTC'
+    assert extract_seq(window=3, **kw) == 'TTC'
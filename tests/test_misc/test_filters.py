@@ -0,0 +1,123 @@
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.misc.filters import (
+    gen_read_filter, filter_reads, FilteredAlignmentFile,
+    gen_contig_filter, filter_contigs, calc_clip_fraction
+)
+
+
+def get_mock_read(name, flag=0, mapq=60, aligned_len=50, is_unmapped=False):
+    r = MagicMock()
+    r.query_name = name
+    r.flag = flag
+    r.mapping_quality = mapq
+    r.query_alignment_length = aligned_len
+    r.is_unmapped = is_unmapped
+    return r
+
+
+MOCK_READS = [
+    get_mock_read('ok'),
+    get_mock_read('secondary', flag=0x100),
+    get_mock_read('duplicate', flag=0x400),
+    get_mock_read('low_mapq', mapq=0),
+    get_mock_read('short', aligned_len=5),
+    # unmapped reads have no MAPQ or aligned length to check
+    get_mock_read('unmapped', flag=0x4, mapq=0, aligned_len=0, is_unmapped=True),
+]
+
+
+def test_gen_read_filter_returns_none_if_nothing_is_filtered():
+    assert gen_read_filter() is None
+    assert gen_read_filter(0, 0, 0) is None
+    assert gen_read_filter(0xF00, 0, 0) == (0xF00, 0, 0)
+
+
+@pytest.mark.parametrize('read_filter, expected_names, expected_counter', [
+    [(0xF00, 0, 0), ['ok', 'low_mapq', 'short', 'unmapped'],
+     {'reads_dropped_by_flag': 2}],
+    [(0, 1, 0), ['ok', 'secondary', 'duplicate', 'short', 'unmapped'],
+     {'reads_dropped_by_mapq': 1}],
+    [(0, 0, 10), ['ok', 'secondary', 'duplicate', 'low_mapq', 'unmapped'],
+     {'reads_dropped_by_aligned_len': 1}],
+    [(0xF04, 1, 10), ['ok'],
+     {'reads_dropped_by_flag': 3, 'reads_dropped_by_mapq': 1,
+      'reads_dropped_by_aligned_len': 1}],
+])
+def test_filter_reads(read_filter, expected_names, expected_counter):
+    counter = Counter()
+    res = filter_reads(MOCK_READS, gen_read_filter(*read_filter), counter)
+    assert [_.query_name for _ in res] == expected_names
+    assert counter == expected_counter
+
+
+@pytest.mark.parametrize('args, count_regions, expected_counter', [
+    [('contig1',), False, {'reads_dropped_by_flag': 2}],
+    # reads in a region are fetched again with the whole contig
+    [('contig1', 10, 11), False, {}],
+    [('contig1', 10, 11), True, {'reads_dropped_by_flag': 2}],
+])
+def test_filtered_alignment_file(args, count_regions, expected_counter):
+    bam = MagicMock()
+    bam.fetch.return_value = iter(MOCK_READS)
+    counter = Counter()
+    fbam = FilteredAlignmentFile(bam, gen_read_filter(0xF00), counter, count_regions)
+    assert len(list(fbam.fetch(*args))) == 4
+    bam.fetch.assert_called_once_with(*args)
+    assert counter == expected_counter
+
+
+def test_filter_reads_without_counter():
+    res = filter_reads(MOCK_READS, gen_read_filter(0xF00), None)
+    assert len(list(res)) == 4
+
+
+def get_mock_contig(name, flag=0, mapq=60, aligned_len=100,
+                    cigartuples=((S.BAM_CMATCH, 100),)):
+    c = get_mock_read(name, flag=flag, mapq=mapq, aligned_len=aligned_len)
+    c.cigartuples = cigartuples
+    return c
+
+
+MOCK_CONTIGS = [
+    get_mock_contig('ok'),
+    get_mock_contig('secondary', flag=0x100),
+    get_mock_contig('supplementary', flag=0x800),
+    get_mock_contig('multimapper', mapq=0),
+    get_mock_contig('tiny', aligned_len=20, cigartuples=((S.BAM_CMATCH, 20),)),
+    get_mock_contig('clipped', cigartuples=(
+        (S.BAM_CHARD_CLIP, 60), (S.BAM_CMATCH, 30), (S.BAM_CSOFT_CLIP, 10))),
+]
+
+
+@pytest.mark.parametrize('cigartuples, fraction', [
+    [((S.BAM_CMATCH, 10),), 0],
+    [((S.BAM_CSOFT_CLIP, 5), (S.BAM_CMATCH, 15)), 0.25],
+    [((S.BAM_CHARD_CLIP, 5), (S.BAM_CMATCH, 10), (S.BAM_CREF_SKIP, 100),
+      (S.BAM_CINS, 5), (S.BAM_CSOFT_CLIP, 5)), 0.4],
+])
+def test_calc_clip_fraction(cigartuples, fraction):
+    assert calc_clip_fraction(cigartuples) == fraction
+
+
+def test_gen_contig_filter_returns_none_if_nothing_is_filtered():
+    assert gen_contig_filter() is None
+    assert gen_contig_filter(0, 0, 0, 1) is None
+    assert gen_contig_filter(max_clip_fraction=0.5) == (0, 0, 0, 0.5)
+
+
+def test_filter_contigs():
+    counter = Counter()
+    contig_filter = gen_contig_filter(0x900, 1, 50, 0.5)
+    res = filter_contigs(MOCK_CONTIGS, contig_filter, counter)
+    assert [_.query_name for _ in res] == ['ok']
+    assert counter == {
+        'contigs_dropped_by_flag': 2,
+        'contigs_dropped_by_mapq': 1,
+        'contigs_dropped_by_aligned_len': 1,
+        'contigs_dropped_by_clip_fraction': 1,
+    }
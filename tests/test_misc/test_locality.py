@@ -0,0 +1,31 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from kleat.misc.locality import calc_r2c_rank, sort_by_r2c_rank
+
+
+def get_mock_r2c_bam(references):
+    bam = MagicMock()
+    tids = {name: tid for tid, name in enumerate(references)}
+    bam.get_tid.side_effect = lambda name: tids.get(name, -1)
+    return bam
+
+
+@pytest.mark.parametrize('contig_name, expected', [
+    ['c0', 0],
+    ['c2', 2],
+])
+def test_calc_r2c_rank(contig_name, expected):
+    assert calc_r2c_rank(get_mock_r2c_bam(['c0', 'c1', 'c2']), contig_name) == expected
+
+
+def test_calc_r2c_rank_puts_unknown_contigs_last():
+    bam = get_mock_r2c_bam(['c0', 'c1', 'c2'])
+    assert calc_r2c_rank(bam, 'c3') > calc_r2c_rank(bam, 'c2')
+
+
+def test_sort_by_r2c_rank():
+    bam = get_mock_r2c_bam(['c0', 'c1', 'c2', 'c3'])
+    names = ['c3', 'x', 'c0', 'c2', 'c0', 'y']
+    assert sort_by_r2c_rank(bam, names) == [2, 4, 3, 0, 1, 5]
@@ -0,0 +1,105 @@
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from kleat.misc.filters import ReadFilter
+from kleat.misc.prefetch import split_thread_budget, ReadPrefetcher
+
+
+@pytest.mark.parametrize('total_threads, num_workers, expected', [
+    [0, 4, 0],
+    [8, 4, 2],
+    [9, 4, 2],
+    [3, 4, 0],
+    [4, 0, 0],
+])
+def test_split_thread_budget(total_threads, num_workers, expected):
+    assert split_thread_budget(total_threads, num_workers) == expected
+
+
+def get_mock_read(name, flag=0):
+    r = MagicMock()
+    r.name = name
+    r.flag = flag
+    r.is_unmapped = False
+    r.mapping_quality = 60
+    return r
+
+
+def get_mock_bam(reads_dd):
+    bam = MagicMock()
+    bam.__enter__.return_value = bam
+    bam.fetch.side_effect = lambda name: iter(reads_dd[name])
+    return bam
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher(mock_alignment_file):
+    reads_dd = {
+        'c0': [get_mock_read('r0'), get_mock_read('r1', flag=0x400)],
+        'c1': [],
+    }
+    mock_alignment_file.return_value = get_mock_bam(reads_dd)
+    counter = Counter()
+    with ReadPrefetcher('r2c.bam', ['c0', 'c1', 'c0'], threads=3,
+                        read_filter=ReadFilter(0x400, 0, 0), counter=counter) as pf:
+        assert [_.name for _ in pf.get('c0')] == ['r0']
+        assert list(pf.get('c1')) == []
+        assert [_.name for _ in pf.get('c0')] == ['r0']
+    mock_alignment_file.assert_called_once_with('r2c.bam', threads=2)
+    assert counter == Counter({'reads_dropped_by_flag': 2})
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher_raises_for_out_of_order_get(mock_alignment_file):
+    mock_alignment_file.return_value = get_mock_bam({'c0': [], 'c1': []})
+    with ReadPrefetcher('r2c.bam', ['c0', 'c1']) as pf:
+        with pytest.raises(ValueError, match='expected reads of c1'):
+            pf.get('c1')
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher_reraises_producer_errors(mock_alignment_file):
+    mock_alignment_file.side_effect = IOError('no such file')
+    with ReadPrefetcher('r2c.bam', ['c0']) as pf:
+        with pytest.raises(IOError, match='no such file'):
+            list(pf.get('c0'))
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher_closes_without_consuming_all(mock_alignment_file):
+    mock_alignment_file.return_value = get_mock_bam({'c{0}'.format(_): [] for _ in range(5)})
+    pf = ReadPrefetcher('r2c.bam', ['c{0}'.format(_) for _ in range(5)], queue_size=1)
+    assert list(pf.get('c0')) == []
+    pf.close()
+    assert not pf.thread.is_alive()
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher_queues_reads_in_batches(mock_alignment_file):
+    reads = [get_mock_read('r{0}'.format(_)) for _ in range(7)]
+    mock_alignment_file.return_value = get_mock_bam({'c0': reads, 'c1': []})
+    with ReadPrefetcher('r2c.bam', ['c0', 'c1'], queue_size=1, batch_size=3) as pf:
+        assert list(pf.get('c0')) == reads
+        assert list(pf.get('c1')) == []
+
+
+@patch('kleat.misc.prefetch.pysam.AlignmentFile')
+def test_read_prefetcher_skips_reads_left_unconsumed(mock_alignment_file):
+    num_fetched = Counter()
+
+    def fetch(name):
+        for k in range(100):
+            num_fetched[name] += 1
+            yield get_mock_read('{0}_r{1}'.format(name, k))
+
+    bam = get_mock_bam({})
+    bam.fetch.side_effect = fetch
+    mock_alignment_file.return_value = bam
+    with ReadPrefetcher('r2c.bam', ['c0', 'c1'], queue_size=1, batch_size=3) as pf:
+        # e.g. a read budget times out after two reads
+        reads = pf.get('c0')
+        assert [next(reads).name, next(reads).name] == ['c0_r0', 'c0_r1']
+        assert [_.name for _ in pf.get('c1')] == ['c1_r{0}'.format(_) for _ in range(100)]
+    assert num_fetched['c0'] < 100
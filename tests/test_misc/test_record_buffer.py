@@ -0,0 +1,100 @@
+import csv
+import io
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.misc.record_buffer import ClvRecordBuffer
+
+
+def gen_record(clv, **kwargs):
+    vals = {_: 0 for _ in S.HEADER}
+    vals.update(
+        seqname='chr1', strand='+', clv=clv,
+        ctg_hex='AATAAA', ctg_hex_id=16, ctg_hex_pos=clv - 20,
+        ref_hex='NA', ref_hex_id=-1, ref_hex_pos=-1,
+        evidence_type='bridge', contig_id_at_pos='c0@{0}'.format(clv),
+        contig_is_hardclipped=False, contig_len=100, contig_mapq=60,
+        num_bridge_reads=clv % 3, max_bridge_read_tail_len=5, num_bridge_contigs=1,
+        reads_subsampled=False,
+    )
+    vals.update(kwargs)
+    return S.ClvRecord(**vals)
+
+
+def append_record(buf, rec):
+    buf.append(
+        rec.seqname, rec.strand, rec.clv,
+        (rec.ctg_hex, rec.ctg_hex_id, rec.ctg_hex_pos),
+        (rec.ref_hex, rec.ref_hex_id, rec.ref_hex_pos),
+        evidence_type=rec.evidence_type,
+        contig_id_at_pos=rec.contig_id_at_pos,
+        contig_is_hardclipped=rec.contig_is_hardclipped,
+        contig_len=rec.contig_len,
+        contig_mapq=rec.contig_mapq,
+        reads_subsampled=rec.reads_subsampled,
+        num_bridge_reads=rec.num_bridge_reads,
+        max_bridge_read_tail_len=rec.max_bridge_read_tail_len,
+        num_bridge_contigs=rec.num_bridge_contigs,
+    )
+
+
+def write_with_csv_writer(records):
+    opf = io.StringIO()
+    csvwriter = csv.writer(opf, delimiter='\t')
+    for rec in records:
+        csvwriter.writerow(rec)
+    return opf.getvalue()
+
+
+@pytest.mark.parametrize('contig_name', ['c0', 'c"0'])
+def test_clv_record_buffer_writes_the_same_as_csv_writer(contig_name):
+    records = [gen_record(_, contig_id_at_pos='{0}@{1}'.format(contig_name, _),
+                          contig_is_hardclipped=_ % 2 == 0, reads_subsampled=_ == 102)
+               for _ in range(100, 107)]
+
+    opf = io.StringIO()
+    buf = ClvRecordBuffer(opf, block_size=2)
+    for rec in records[:5]:
+        append_record(buf, rec)
+        buf.maybe_flush()
+    for rec in records[5:]:
+        buf.writerow(rec)
+    buf.flush()
+    assert opf.getvalue() == write_with_csv_writer(records)
+
+
+def test_clv_record_buffer_grows_past_a_block():
+    opf = io.StringIO()
+    buf = ClvRecordBuffer(opf, block_size=2)
+    records = [gen_record(_) for _ in range(5)]
+    for rec in records:
+        append_record(buf, rec)
+    assert buf.num_records == 5
+    assert opf.getvalue() == ''
+    buf.flush()
+    buf.flush()                 # nothing left to write
+    assert opf.getvalue() == write_with_csv_writer(records)
+
+
+def test_clv_record_buffer_take_rows():
+    opf = io.StringIO()
+    buf = ClvRecordBuffer(opf, block_size=4)
+    records = [gen_record(_, reads_subsampled=True) for _ in range(3)]
+    for rec in records:
+        append_record(buf, rec)
+
+    assert buf.take_rows(1) == [tuple(_) for _ in records[1:]]
+    assert buf.num_records == 1
+
+    # counts of the records taken are reset
+    append_record(buf, gen_record(10, num_bridge_reads=0, num_bridge_contigs=0,
+                                  max_bridge_read_tail_len=0))
+    buf.writerow(records[2])
+    buf.flush()
+    assert opf.getvalue() == write_with_csv_writer([
+        records[0],
+        gen_record(10, num_bridge_reads=0, num_bridge_contigs=0,
+                   max_bridge_read_tail_len=0),
+        records[2],
+    ])
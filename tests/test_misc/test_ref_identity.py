@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+import kleat.misc.settings as S
+from kleat.misc import ref_identity as RI
+from kleat.hexamer import hexamer as H
+from kleat.hexamer import memo as M
+
+
+def get_mock_contig(cigartuples, tags, reference_start=100):
+    c = MagicMock()
+    c.reference_name = 'chr1'
+    c.reference_start = reference_start
+    c.cigartuples = cigartuples
+    c.has_tag.side_effect = lambda tag: tag in tags
+    c.get_tag.side_effect = lambda tag: tags[tag]
+    return c
+
+
+@pytest.mark.parametrize('md, expected', [
+    ('50', []),
+    ('10A5', [10]),
+    ('0A0C3', [0, 1]),
+    ('10^AC5T2', [10 + 2 + 5]),
+])
+def test_parse_md_mismatches(md, expected):
+    assert RI.parse_md_mismatches(md) == expected
+
+
+@pytest.mark.parametrize('tags', [{}, {'NM': 2}])
+def test_build_identical_spans_without_known_mismatches(tags):
+    contig = get_mock_contig([(S.BAM_CMATCH, 50)], tags)
+    assert RI.build_identical_spans(contig).starts == ()
+
+
+def test_build_identical_spans():
+    """
+    ref:  100 ... 109 110 ... 119   (N 20)   140 ... 149
+    ctg:    3S  10M  2I   10M(mismatch at 115)   20N  10M
+    """
+    contig = get_mock_contig(
+        [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 10), (S.BAM_CINS, 2),
+         (S.BAM_CMATCH, 10), (S.BAM_CREF_SKIP, 20), (S.BAM_CMATCH, 10)],
+        {'MD': '15A14'})
+    assert RI.build_identical_spans(contig) == RI.IdenticalSpans(
+        starts=(100, 110, 116, 140),
+        ends=(110, 115, 120, 150),
+        ctg_starts=(3, 15, 21, 25),
+        ins_before=(0, 1, 1, 1),
+        num_ins=1,
+    )
+
+
+@pytest.mark.parametrize('strand, beg, end, ref_pos, ctg_pos, expected', [
+    ['+', 140, 145, 144, 29, True],
+    # not aligned to each other
+    ['+', 140, 145, 144, 30, False],
+    # across the mismatch or the skipped region
+    ['+', 112, 118, 117, 22, False],
+    ['-', 116, 145, 116, 21, False],
+    # the insertion is collected into minus windows
+    ['-', 116, 120, 116, 21, False],
+    ['-', 140, 145, 140, 25, False],
+    ['+', 116, 120, 119, 24, True],
+    # the insertion is collected into plus windows
+    ['+', 100, 105, 104, 7, False],
+    ['-', 100, 105, 100, 3, True],
+])
+def test_is_ref_identical(strand, beg, end, ref_pos, ctg_pos, expected):
+    contig = get_mock_contig(
+        [(S.BAM_CSOFT_CLIP, 3), (S.BAM_CMATCH, 10), (S.BAM_CINS, 2),
+         (S.BAM_CMATCH, 10), (S.BAM_CREF_SKIP, 20), (S.BAM_CMATCH, 10)],
+        {'MD': '15A14'})
+    spans = RI.build_identical_spans(contig)
+    assert RI.is_ref_identical(spans, strand, beg, end, ref_pos, ctg_pos) == expected
+
+
+@pytest.fixture
+def reused():
+    H.reuse_identical_windows()
+    yield
+    H.reuse_identical_windows(False)
+    M.COUNTERS.clear()
+
+
+def test_gen_contig_reference_hexamer_tuple_reuses_identical_windows(reused):
+    contig = get_mock_contig([(S.BAM_CMATCH, 100)], {'NM': 0}, reference_start=0)
+    ref_fa = MagicMock()
+    ctg_hex_tuple = ('AATAAA', 16, 60)
+    assert H.gen_contig_reference_hexamer_tuple(
+        contig, '+', 80, ref_fa, 80, ctg_hex_tuple) == ctg_hex_tuple
+    ref_fa.fetch.assert_not_called()
+    assert M.COUNTERS == {'ref_hexamers_from_identical_windows': 1}
+
+
+def test_gen_contig_reference_hexamer_tuple_searches_other_windows(reused):
+    # the window of clv 30 goes beyond the reference start
+    contig = get_mock_contig([(S.BAM_CMATCH, 100)], {'NM': 0}, reference_start=0)
+    ref_fa = MagicMock()
+    ref_fa.get_reference_length.return_value = 100
+    ref_fa.fetch.return_value = 'CCAATAAACCCCCCCCCCCCCCCCCCCCCCC'
+    assert H.gen_contig_reference_hexamer_tuple(
+        contig, '+', 30, ref_fa, 30, ('NA', -1, -1)) == ('AATAAA', 16, 2)
+    assert M.COUNTERS == {}
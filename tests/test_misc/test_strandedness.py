@@ -0,0 +1,34 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from kleat.misc.strandedness import calc_transcript_strand, is_on_strand
+
+
+@pytest.mark.parametrize('strandedness, is_reverse, expected', [
+    [None, False, None],
+    ['unstranded', True, None],
+    ['forward', False, '+'],
+    ['forward', True, '-'],
+    ['reverse', False, '-'],
+    ['reverse', True, '+'],
+])
+def test_calc_transcript_strand(strandedness, is_reverse, expected):
+    contig = MagicMock()
+    contig.is_reverse = is_reverse
+    assert calc_transcript_strand(contig, strandedness) == expected
+
+
+def test_calc_transcript_strand_raises_for_unknown_strandedness():
+    with pytest.raises(ValueError):
+        calc_transcript_strand(MagicMock(), 'fr-firststrand')
+
+
+@pytest.mark.parametrize('strand, transcript_strand, expected', [
+    ['+', None, True],
+    ['-', None, True],
+    ['+', '+', True],
+    ['-', '+', False],
+])
+def test_is_on_strand(strand, transcript_strand, expected):
+    assert is_on_strand(strand, transcript_strand) == expected
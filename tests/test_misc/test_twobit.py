@@ -0,0 +1,101 @@
+import numpy as np
+import pysam
+import pytest
+
+from kleat.misc import twobit as T
+from kleat.misc.apautils import fetch_seq
+from kleat.misc.chrom_cache import ChromosomeCache, open_reference
+
+
+SEQS = {
+    'chr1': 'NNACGTacgtNNNNGGCCRYAATAAAttC',
+    'chr2': 'ACG',
+    'chrM': 'NACGTTTAN',
+}
+
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    fa = tmp_path / 'ref.fa'
+    fa.write_text(''.join('>{0}\n{1}\n'.format(*_) for _ in SEQS.items()))
+    return str(fa)
+
+
+@pytest.fixture
+def twobit_file(fasta_file):
+    output = fasta_file + '.k2bit'
+    T.convert_fasta(fasta_file, output)
+    return output
+
+
+def to_expected(seq):
+    return ''.join(_ if _ in 'ACGT' else 'N' for _ in seq.upper())
+
+
+def test_encode_seq():
+    packed, n_starts, n_ends = T.encode_seq('ACGTtNNgA')
+    assert packed.tolist() == [0b00011011, 0b11000010, 0b00000000]
+    assert n_starts.tolist() == [5]
+    assert n_ends.tolist() == [7]
+
+
+def test_decode_table():
+    assert T.DECODE_TABLE[0b00011011].tobytes() == b'ACGT'
+    assert T.DECODE_TABLE[0b11100100].tobytes() == b'TGCA'
+
+
+def test_is_twobit_file(fasta_file, twobit_file):
+    assert T.is_twobit_file(twobit_file)
+    assert not T.is_twobit_file(fasta_file)
+
+
+def test_twobit_file_raises_for_other_files(fasta_file):
+    with pytest.raises(ValueError, match='not a 2-bit reference file'):
+        T.TwoBitFile(fasta_file)
+
+
+def test_twobit_file_fetches_every_window(twobit_file):
+    tbf = T.TwoBitFile(twobit_file)
+    assert tbf.references == list(SEQS)
+    assert tbf.lengths == [len(_) for _ in SEQS.values()]
+    for seqname, seq in SEQS.items():
+        assert tbf.get_reference_length(seqname) == len(seq)
+        assert tbf.fetch(seqname) == to_expected(seq)
+        for beg in range(len(seq) + 1):
+            for end in range(beg, len(seq) + 3):
+                assert tbf.fetch(seqname, beg, end) == to_expected(seq[beg:end])
+
+
+def test_twobit_file_raises_for_unknown_seqname(twobit_file):
+    with pytest.raises(KeyError):
+        T.TwoBitFile(twobit_file).fetch('chr3', 0, 1)
+
+
+@pytest.mark.parametrize('seqname, beg, end', [
+    ['chr1', -3, 4],
+    ['chr1', 25, 33],
+    ['chrM', 6, 12],
+    ['chrM', -3, 2],
+    ['chrM', 5, 3],
+])
+def test_fetch_seq_with_twobit_file_is_the_same(fasta_file, twobit_file, seqname, beg, end):
+    expected = to_expected(fetch_seq(pysam.FastaFile(fasta_file), seqname, beg, end))
+    assert fetch_seq(T.TwoBitFile(twobit_file), seqname, beg, end) == expected
+
+
+def test_open_reference_with_twobit_file(twobit_file):
+    assert isinstance(open_reference(twobit_file), T.TwoBitFile)
+    cache = open_reference(twobit_file, cache_chromosome=True)
+    assert isinstance(cache, ChromosomeCache)
+    assert cache.fetch('chr1', 0, 6) == 'NNACGT'
+
+
+def test_convert_fasta_handles_long_sequences(tmp_path):
+    rng = np.random.RandomState(0)
+    seq = ''.join(rng.choice(list('ACGTNacgt'), size=10001))
+    fa = tmp_path / 'long.fa'
+    fa.write_text('>chr1\n{0}\n'.format(seq))
+    T.convert_fasta(str(fa), str(fa) + '.k2bit')
+    tbf = T.TwoBitFile(str(fa) + '.k2bit')
+    assert tbf.fetch('chr1') == to_expected(seq)
+    assert tbf.fetch('chr1', 4997, 5050) == to_expected(seq[4997:5050])
@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pysam
+import pytest
+
+import kleat.misc.settings as S
+from kleat.post import (
+    add_ref_hexamers, add_ref_hexamer_profiles, gen_profile_cols, agg_polya_evidence_per
+)
+from kleat.hexamer.search import search_ref_genome
+from kleat.hexamer import hexamer as H
+
+
+@pytest.fixture
+def fasta_file(tmp_path):
+    fa = tmp_path / 'ref.fa'
+    fa.write_text(
+        '>chr1\nCCAATAAACCCCCCCCCCCCCCCCCCCCCTTTATTGG\n'
+        '>chr2\nGGGGGGGGGG\n')
+    pysam.faidx(str(fa))
+    return str(fa)
+
+
+def test_add_ref_hexamers(fasta_file):
+    df = pd.DataFrame([
+        ['chr2', '+', 5, 'NA', -1, -1, 1],
+        ['chr1', '+', 30, 'NA', -1, -1, 2],
+        ['chr1', '-', 5, 'NA', -1, -1, 3],
+    ], columns=['seqname', 'strand', 'clv'] + S.COLS_PICK_ONE + ['num_suffix_reads'])
+    res = add_ref_hexamers(df, fasta_file)
+    expected = {
+        ('chr2', '+', 5): ('NA', -1, -1),
+        ('chr1', '+', 30): ('AATAAA', 16, 2),
+        ('chr1', '-', 5): ('AATAAA', 16, 34),
+    }
+    assert res.shape[0] == 3
+    for _, row in res.iterrows():
+        assert tuple(row[S.COLS_PICK_ONE]) == expected[(row.seqname, row.strand, row.clv)]
+    assert res.num_suffix_reads.sum() == 6
+
+
+def test_add_ref_hexamers_is_the_same_as_gen_reference_hexamer_tuple(fasta_file):
+    sites = [('chr1', '+', 30), ('chr1', '-', 5), ('chr1', '-', 20), ('chr2', '+', 5)]
+    df = pd.DataFrame([list(_) + ['NA', -1, -1] for _ in sites],
+                      columns=['seqname', 'strand', 'clv'] + S.COLS_PICK_ONE)
+    res = add_ref_hexamers(df, fasta_file)
+    ref_fa = pysam.FastaFile(fasta_file)
+    for _, row in res.iterrows():
+        assert tuple(row[S.COLS_PICK_ONE]) == H.gen_reference_hexamer_tuple(
+            ref_fa, row.seqname, row.strand, row.clv)
+
+
+def test_deferred_gen_reference_hexamer_tuple():
+    ref_fa = MagicMock()
+    H.defer_ref_hexamers()
+    try:
+        assert H.gen_reference_hexamer_tuple(ref_fa, 'chr1', '+', 30) == H.NA_HEX_TUPLE
+    finally:
+        H.defer_ref_hexamers(False)
+    ref_fa.fetch.assert_not_called()
+
+
+@pytest.mark.parametrize('windows', [[50], [20, 30, 40]])
+def test_add_ref_hexamer_profiles(fasta_file, windows):
+    sites = [('chr1', '+', 30), ('chr1', '-', 5), ('chr1', '-', 20), ('chr2', '+', 5)]
+    df = pd.DataFrame([list(_) + [k] for k, _ in enumerate(sites)],
+                      columns=['seqname', 'strand', 'clv', 'num_suffix_reads'])
+    res = add_ref_hexamer_profiles(df, fasta_file, windows)
+    assert list(res.columns) == list(df.columns) + gen_profile_cols(windows)
+    ref_fa = pysam.FastaFile(fasta_file)
+    for _, row in res.iterrows():
+        for window in windows:
+            expected = search_ref_genome(ref_fa, row.seqname, row.clv, row.strand, window)
+            cols = ['{0}_{1}'.format(_, window) for _ in S.COLS_PICK_ONE]
+            assert tuple(row[cols]) == (('NA', -1, -1) if expected is None else expected)
+
+
+def test_add_ref_hexamer_profiles_mask(fasta_file):
+    df = pd.DataFrame([['chr1', '-', 5], ['chr1', '+', 36]],
+                      columns=['seqname', 'strand', 'clv'])
+    res = add_ref_hexamer_profiles(df, fasta_file, [10, 40])
+    # AATAAA (rank 0) on the minus strand
+    assert res.ref_hex_mask.tolist() == [1, 1]
+    assert res.ref_hex_nearest.tolist() == ['34', '2']
+    assert res.ref_hex_10.tolist() == ['NA', 'NA']
+    assert res.ref_hex_pos_40.tolist() == [34, 2]
+
+
+@pytest.mark.parametrize('with_read_budget', [True, False])
+def test_agg_polya_evidence_per_with_or_without_read_budget(with_read_budget):
+    row = dict.fromkeys(S.HEADER, 0)
+    row.update(seqname='chr1', strand='+', clv=20, ctg_hex='NA', ctg_hex_id=-1,
+               ref_hex='NA', ref_hex_id=-1, evidence_type='blank',
+               contig_id_at_pos='c0@3', contig_is_hardclipped=False,
+               num_blank_contigs=1, reads_subsampled=True)
+    df = pd.DataFrame([row, row], columns=S.HEADER)
+    if not with_read_budget:
+        df.drop(S.READ_BUDGET_COLS, axis=1, inplace=True)
+    res = agg_polya_evidence_per(df)
+    assert res['num_blank_contigs'] == 2
+    assert ('reads_subsampled' in res.index) == with_read_budget
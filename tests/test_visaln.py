@@ -1,6 +1,8 @@
 from unittest.mock import MagicMock
 
-from kleat.visaln.visaln import calc_xlim
+import pytest
+
+from kleat.visaln.visaln import calc_xlim, convert_contig2genome_coord
 import kleat.misc.settings as S
 
 
@@ -53,3 +55,36 @@ def test_calc_xlim_with_two_skips():
 
     assert calc_xlim(contig, 1, 2, clvs=[4], padding=2) == (3, 10)
     assert calc_xlim(contig, 2, 3, clvs=[12], padding=2) == (10, 21)
+
+
+@pytest.mark.parametrize("target_ctg_pos, target_ref_pos", [
+    [0, -2],
+    [2, 0],
+    [5, 3],
+    [6, 6],
+    [7, 7],
+    [8, 8],
+    [10, 10],
+])
+def test_convert_contig2genome_coord(target_ctg_pos, target_ref_pos):
+    """2S3M2N2M1D1I2M, starting from genome coordinate 0 after the softclip"""
+    contig = MagicMock()
+    contig.reference_start = 0
+    contig.cigartuples = (
+        (S.BAM_CSOFT_CLIP, 2),
+        (S.BAM_CMATCH, 3),
+        (S.BAM_CREF_SKIP, 2),
+        (S.BAM_CMATCH, 2),
+        (S.BAM_CDEL, 1),
+        (S.BAM_CINS, 1),
+        (S.BAM_CMATCH, 2),
+    )
+    assert convert_contig2genome_coord(target_ctg_pos, contig) == target_ref_pos
+
+
+def test_convert_contig2genome_coord_outside_of_the_contig():
+    contig = MagicMock()
+    contig.reference_start = 0
+    contig.cigartuples = ((S.BAM_CMATCH, 3),)
+    with pytest.raises(ValueError):
+        convert_contig2genome_coord(4, contig)